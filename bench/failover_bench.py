@@ -0,0 +1,285 @@
+"""Prueba de la migración de reproductores entre nodos de Lavalink, sin red.
+
+Levanta dos Lavalink falsos (``bench.fakes``) que comparten catálogo y reparte varios
+servidores entre ellos con el cog de música real. Primero reinicia el bot sin cerrar los
+reproductores: los nodos reanudan la sesión y cada servidor debe recuperarse sin volver a
+enviar la pista que Lavalink sigue reproduciendo (ni TrackEnd ``replaced``, ni salto de
+posición, ni canción saltada). Después apaga uno de los nodos a mitad de canción. Comprueba
+que cada reproductor del nodo caído sigue en el otro con la misma pista, en la posición en
+la que iba (con el margen de un ``playerUpdate``) y con la cola intacta, y que al acabar la
+pista suena la siguiente de la cola en el nodo nuevo. Mide el tiempo hasta recuperar el audio.
+
+``_migrate_player`` depende de miembros privados de wavelink: esta prueba es la que hay que
+repetir antes de cambiar de versión (ver ``WAVELINK_FAILOVER_VERSION``).
+
+Uso: python -m bench.failover_bench [--guilds 4] [--queue 5] [--dwell 1500] ...
+Sale con código 1 si alguna comprobación falla.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any
+
+from bench import fakes
+from bench.fakes import FakeLavalink
+from bench.music_bench import EVENT_TIMEOUT, FakeBot, FakeContext, summarize
+
+# playerUpdate frecuentes: la posición guardada por wavelink es la del último que llegó
+PLAYER_UPDATE_INTERVAL = 0.2
+NODE_IDS = ("a", "b")
+
+
+class FailoverBench:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        catalog: dict[str, dict[str, Any]] = {}
+        self.nodes = {
+            identifier: FakeLavalink(latency_ms=args.latency, start_latency_ms=args.start_latency,
+                                     seed=args.seed, catalog=catalog)
+            for identifier in NODE_IDS
+        }
+        for identifier, fake in self.nodes.items():
+            fake.session_id = f"bench-{identifier}"
+        self.bot: FakeBot | None = None
+        self.cog: Any = None
+        self.failures: list[str] = []
+
+    def check(self, ok: bool, message: str):
+        if not ok:
+            self.failures.append(message)
+
+    async def setup(self, cache_dir: str):
+        fakes.PLAYER_UPDATE_INTERVAL = PLAYER_UPDATE_INTERVAL
+        for fake in self.nodes.values():
+            await fake.start()
+        # La configuración del cog se lee de variables de entorno al importarlo
+        os.environ.update({
+            "CACHE_DIR": cache_dir,
+            "LAVALINK_NODES": json.dumps([{"identifier": i, "uri": f.url, "password": "bench"}
+                                          for i, f in self.nodes.items()]),
+            "LAVALINK_HEALTH_INTERVAL": str(self.args.health_interval),
+        })
+        self.bot = FakeBot()
+        await self.bot.http_client.start()
+        self.bot.scheduler.start()
+        await self._start_cog()
+
+    async def _start_cog(self):
+        from cogs.music import Music
+
+        self.cog = self.bot.cog = Music(self.bot)
+        for command in self.cog.get_commands():
+            command.cog = self.cog
+        await self.cog.on_ready()
+        deadline = time.monotonic() + EVENT_TIMEOUT
+        while len(self.cog._connected_nodes()) < len(self.nodes):
+            if time.monotonic() > deadline:
+                raise RuntimeError("Los Lavalink falsos no respondieron")
+            await asyncio.sleep(0.05)
+
+    async def teardown(self):
+        import wavelink
+
+        await self.cog.cog_unload()
+        await self.bot.scheduler.close()
+        await wavelink.Pool.close()
+        await self.bot.http_client.close()
+        for fake in self.nodes.values():
+            await fake.stop()
+
+    async def _wait(self, fut: asyncio.Future) -> float | None:
+        try:
+            return await asyncio.wait_for(fut, EVENT_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+
+    async def start_guilds(self) -> list[FakeContext]:
+        contexts = []
+        for n in range(self.args.guilds):
+            guild = self.bot.guild(2000 + 10 * n)
+            ctx = FakeContext(guild)
+            started = self.bot.expect_start(guild.id)
+            # Playlist falsa: la primera suena y el resto queda en la cola
+            await self.cog.play(ctx, query=f"https://www.youtube.com/playlist?list={self.args.queue + 1}&n={n}")
+            self.check(await self._wait(started) is not None, f"{guild.id}: no empezó a sonar")
+            contexts.append(ctx)
+        return contexts
+
+    async def restart(self, contexts: list[FakeContext]) -> dict[str, Any]:
+        """Reinicia el bot sin avisar a Lavalink y comprueba que cada reproductor se recupera
+        sobre la pista que sigue sonando en el nodo reanudado"""
+        import wavelink
+
+        before = {}
+        for ctx in contexts:
+            player, gid = ctx.guild.voice_client, ctx.guild.id
+            fake = self.nodes[player.node.identifier]
+            before[gid] = {
+                "fake": fake,
+                "identifier": fake.current[gid]["info"]["identifier"],
+                "started": fake.started[gid],
+                "queue": [getattr(item, "identifier", None) for item in player.queue],
+            }
+        replaced = sum(f.replaced for f in self.nodes.values())
+
+        # cog_unload guarda la última instantánea, como haría el guardado periódico antes de una caída
+        await self.cog.cog_unload()
+        # Se corta la conexión sin cerrar los reproductores (Pool.close los destruiría en Lavalink)
+        for node in list(wavelink.Pool.nodes.values()):
+            if node._websocket is not None:
+                await node._websocket.cleanup()
+            await node._session.close()
+        getattr(wavelink.Pool, "_Pool__nodes").clear()
+        for ctx in contexts:
+            ctx.guild.voice_client = None
+
+        t0 = time.perf_counter()
+        await self._start_cog()
+        deadline = time.monotonic() + EVENT_TIMEOUT
+        while self.cog.restore_task is None and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        if self.cog.restore_task is None or not self.cog.resumed_nodes:
+            self.check(False, "los nodos no reanudaron la sesión")
+            return {"restored": 0, "restore_ms": 0.0}
+        await asyncio.wait_for(self.cog.restore_task, EVENT_TIMEOUT)
+        restore_ms = (time.perf_counter() - t0) * 1000
+        # Margen para que llegue cualquier TrackEnd que provoque la restauración
+        await asyncio.sleep(0.3)
+
+        restored = 0
+        for ctx in contexts:
+            gid, state = ctx.guild.id, before[ctx.guild.id]
+            player, fake = ctx.guild.voice_client, state["fake"]
+            if player is None:
+                self.check(False, f"{gid}: no se restauró tras el reinicio")
+                continue
+            restored += 1
+            track = fake.current.get(gid)
+            self.check(bool(track) and track["info"]["identifier"] == state["identifier"],
+                       f"{gid}: la pista que sonaba cambió al restaurar")
+            self.check(getattr(player.current, "identifier", None) == state["identifier"],
+                       f"{gid}: el reproductor local no conoce la pista que suena")
+            drift = abs(fake.started.get(gid, 0) - state["started"]) * 1000
+            self.check(drift <= 100, f"{gid}: la posición saltó {drift:.0f} ms al restaurar")
+            self.check([getattr(item, "identifier", None) for item in player.queue] == state["queue"],
+                       f"{gid}: la cola cambió al restaurar")
+        extra = sum(f.replaced for f in self.nodes.values()) - replaced
+        self.check(extra == 0, f"la restauración reemplazó {extra} pistas que ya sonaban")
+        return {"restored": restored, "restore_ms": restore_ms}
+
+    async def run(self) -> dict[str, Any]:
+        contexts = await self.start_guilds()
+        await asyncio.sleep(self.args.dwell / 1000)
+        restart = await self.restart(contexts)
+        # Deja avanzar la canción y llegar algún playerUpdate antes del corte
+        await asyncio.sleep(self.args.dwell / 1000)
+
+        players = [ctx.guild.voice_client for ctx in contexts]
+        victim = players[0].node.identifier
+        survivor = next(i for i in NODE_IDS if i != victim)
+        dead, alive = self.nodes[victim], self.nodes[survivor]
+        before = {}
+        for player in players:
+            gid = player.guild.id
+            if player.node.identifier != victim:
+                before[gid] = None
+                continue
+            track = dead.current.get(gid)
+            before[gid] = {
+                "identifier": track["info"]["identifier"] if track else None,
+                "position": (time.monotonic() - dead.started[gid]) * 1000 if gid in dead.started else 0,
+                "queue": list(player.queue),
+                "started": self.bot.expect_start(gid),
+            }
+
+        t0 = time.perf_counter()
+        await dead.stop()
+        recovery = []
+        for player in players:
+            gid = player.guild.id
+            state = before[gid]
+            if state is None:
+                # Los reproductores del nodo sano no se tocan
+                self.check(player.node.identifier == survivor, f"{gid}: cambió de nodo sin motivo")
+                continue
+            at = await self._wait(state["started"])
+            if at is None:
+                self.check(False, f"{gid}: no volvió a sonar tras apagar {victim}")
+                continue
+            recovery.append((at - t0) * 1000)
+            self.check(player.node.identifier == survivor, f"{gid}: sigue en el nodo {player.node.identifier}")
+            track = alive.current.get(gid)
+            self.check(bool(track) and track["info"]["identifier"] == state["identifier"],
+                       f"{gid}: la pista actual cambió al migrar")
+            resumed = alive.start_positions.get(gid, 0)
+            # wavelink guarda la posición del último playerUpdate: puede ir hasta un intervalo por detrás
+            lag = state["position"] - resumed
+            self.check(-50 <= lag <= PLAYER_UPDATE_INTERVAL * 1000 + 50,
+                       f"{gid}: retomó en {resumed:.0f} ms en lugar de ~{state['position']:.0f} ms")
+            self.check(list(player.queue) == state["queue"], f"{gid}: la cola cambió al migrar")
+
+        # La siguiente canción de la cola suena ya en el nodo nuevo
+        for player in players:
+            gid = player.guild.id
+            state = before[gid]
+            if state is None or not state["queue"]:
+                continue
+            started = self.bot.expect_start(gid)
+            await alive.finish(gid)
+            self.check(await self._wait(started) is not None, f"{gid}: no sonó la siguiente tras migrar")
+            track = alive.current.get(gid)
+            expected = getattr(state["queue"][0], "identifier", None)
+            self.check(bool(track) and track["info"]["identifier"] == expected,
+                       f"{gid}: no sonó la siguiente canción de la cola")
+
+        return {"victim": victim, "migrated": len(recovery), "recovery_ms": summarize(recovery), **restart}
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.failover_bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=4, help="servidores reproduciendo a la vez")
+    parser.add_argument("--queue", type=int, default=5, help="canciones en cola por servidor")
+    parser.add_argument("--dwell", type=float, default=1500.0, help="tiempo sonando antes del corte (ms)")
+    parser.add_argument("--latency", type=float, default=5.0, help="latencia REST de Lavalink (ms)")
+    parser.add_argument("--start-latency", type=float, default=20.0, help="del PATCH al TrackStartEvent (ms)")
+    parser.add_argument("--health-interval", type=float, default=0.2, help="sondeo de los nodos (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="muestra los mensajes del bot")
+    return parser.parse_args(argv)
+
+
+async def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    bench = FailoverBench(args)
+    with tempfile.TemporaryDirectory(prefix="failover-bench-") as cache_dir:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with quiet:
+            await bench.setup(cache_dir)
+            try:
+                results = await bench.run()
+            finally:
+                await bench.teardown()
+    print(f"Reinicio con sesión reanudada: {results['restored']}/{args.guilds} restaurados "
+          f"en {results['restore_ms']:.2f} ms")
+    s = results["recovery_ms"]
+    print(f"Nodo apagado: {results['victim']}; reproductores migrados: {results['migrated']}/{args.guilds}")
+    print(f"Hasta volver a sonar (ms): p50 {s['p50']:.2f}  p95 {s['p95']:.2f}  p99 {s['p99']:.2f}")
+    if not results["migrated"]:
+        bench.failures.append("ningún reproductor estaba en el nodo apagado")
+    if bench.failures:
+        print("\nFallos:")
+        for line in bench.failures:
+            print(f"  {line}")
+        return 1
+    print("Pista, posición y cola conservadas al reiniciar y al migrar")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
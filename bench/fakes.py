@@ -0,0 +1,347 @@
+"""Servidores locales que imitan a Lavalink v4 y a la API de Spotify para los benchmarks.
+
+Solo implementan lo que usan wavelink y ``SpotifyClient``. Ambos admiten latencia
+configurable (media + variación aleatoria) y una tasa de fallos, para medir el bot sin red.
+"""
+import asyncio
+import hashlib
+import random
+import time
+import urllib.parse
+from typing import Any
+
+from aiohttp import web
+
+# Resultados por búsqueda (como ytsearch) y duración de cada pista falsa (ms)
+SEARCH_RESULTS = 5
+TRACK_LENGTH_MS = 180000
+# Intervalo de los playerUpdate (Lavalink los manda cada 5 s por defecto)
+PLAYER_UPDATE_INTERVAL = 5.0
+
+
+class _FakeServer:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, seed: int | None = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self._runner: web.AppRunner | None = None
+        self.port = 0
+
+    async def _delay(self):
+        self.requests += 1
+        delay = self.latency_ms + self.rng.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def app(self) -> web.Application:
+        raise NotImplementedError
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self, port: int = 0):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class FakeLavalink(_FakeServer):
+    """Nodo de Lavalink v4 en memoria.
+
+    - ``/v4/loadtracks``: las búsquedas (``ytsearch:...``) devuelven ``SEARCH_RESULTS`` pistas
+      deterministas; con probabilidad ``miss_rate`` no devuelven nada. Las URLs con
+      ``list=<n>`` se cargan como playlist de n pistas.
+    - Websocket: ``ready``, ``playerUpdate`` periódicos y los eventos de inicio y fin de pista.
+      Cada pista empieza ``start_latency_ms`` después del PATCH que la reproduce (en la
+      ``position`` pedida); con probabilidad ``load_fail_rate`` termina en ``loadFailed``.
+    - Sesiones reanudables: si el cliente activó ``resuming`` y vuelve con el mismo
+      ``Session-Id``, el ``ready`` llega con ``resumed`` y los reproductores siguen sonando.
+      Un PATCH con ``noReplace=true`` no toca la pista que suena; uno que la sustituye
+      manda el TrackEnd ``replaced`` (contados en ``replaced``).
+
+    Varios nodos pueden compartir ``catalog`` para aceptar las pistas que cargó otro, como
+    hace Lavalink al decodificar cualquier pista codificada.
+    """
+
+    def __init__(self, *, latency_ms: float = 0.0, jitter_ms: float = 0.0, miss_rate: float = 0.0,
+                 start_latency_ms: float = 0.0, load_fail_rate: float = 0.0, seed: int | None = None,
+                 catalog: dict[str, dict[str, Any]] | None = None):
+        super().__init__(latency_ms, jitter_ms, seed)
+        self.miss_rate = miss_rate
+        self.start_latency_ms = start_latency_ms
+        self.load_fail_rate = load_fail_rate
+        self.session_id = "bench-session"
+        self.resuming = False
+        self.replaced = 0
+        self.tracks: dict[str, dict[str, Any]] = catalog if catalog is not None else {}  # encoded -> pista
+        self.current: dict[int, dict[str, Any]] = {}  # servidor -> pista sonando
+        self.started: dict[int, float] = {}  # servidor -> instante del inicio (monotonic)
+        self.start_positions: dict[int, int] = {}  # servidor -> posición pedida al empezar (ms)
+        self.loads = 0
+        self.misses = 0
+        self._sockets: set[web.WebSocketResponse] = set()
+        self._updates: asyncio.Task | None = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v4/websocket", self._websocket)
+        app.router.add_get("/v4/info", self._info)
+        app.router.add_get("/v4/stats", self._stats)
+        app.router.add_get("/v4/loadtracks", self._loadtracks)
+        app.router.add_post("/v4/decodetracks", self._decodetracks)
+        app.router.add_patch("/v4/sessions/{sid}", self._session)
+        app.router.add_get("/v4/sessions/{sid}/players", self._players)
+        app.router.add_get("/v4/sessions/{sid}/players/{gid}", self._player)
+        app.router.add_patch("/v4/sessions/{sid}/players/{gid}", self._update_player)
+        app.router.add_delete("/v4/sessions/{sid}/players/{gid}", self._destroy_player)
+        return app
+
+    def make_track(self, identifier: str, title: str, author: str = "Bench") -> dict[str, Any]:
+        encoded = f"bench:{identifier}"
+        track = self.tracks.get(encoded)
+        if track is None:
+            track = self.tracks[encoded] = {
+                "encoded": encoded,
+                "info": {
+                    "identifier": identifier, "isSeekable": True, "author": author, "length": TRACK_LENGTH_MS,
+                    "isStream": False, "position": 0, "title": title,
+                    "uri": f"https://www.youtube.com/watch?v={identifier}", "sourceName": "youtube",
+                    "artworkUrl": None, "isrc": None,
+                },
+                "pluginInfo": {},
+                "userData": {},
+            }
+        return track
+
+    @staticmethod
+    def _identifier(text: str) -> str:
+        return hashlib.sha1(text.encode()).hexdigest()[:11]
+
+    async def _send(self, payload: dict[str, Any]):
+        for ws in list(self._sockets):
+            try:
+                await ws.send_json(payload)
+            except ConnectionResetError:
+                self._sockets.discard(ws)
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        resumed = self.resuming and request.headers.get("Session-Id") == self.session_id
+        await ws.send_json({"op": "ready", "resumed": resumed, "sessionId": self.session_id})
+        if self._updates is None or self._updates.done():
+            self._updates = asyncio.create_task(self._player_updates())
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self._sockets.discard(ws)
+        return ws
+
+    async def _player_updates(self):
+        while self._sockets:
+            await asyncio.sleep(PLAYER_UPDATE_INTERVAL)
+            now = time.monotonic()
+            for gid, started in list(self.started.items()):
+                state = {"time": int(time.time() * 1000), "position": int((now - started) * 1000),
+                         "connected": True, "ping": 1}
+                await self._send({"op": "playerUpdate", "guildId": str(gid), "state": state})
+
+    async def _info(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "version": {"semver": "4.0.0", "major": 4, "minor": 0, "patch": 0, "preRelease": None, "build": None},
+            "buildTime": 0, "git": {"branch": "bench", "commit": "0", "commitTime": 0},
+            "jvm": "bench", "lavaplayer": "bench", "sourceManagers": ["youtube"], "filters": [], "plugins": [],
+        })
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "players": len(self.current), "playingPlayers": len(self.current), "uptime": 1,
+            "memory": {"free": 1, "used": 1, "allocated": 1, "reservable": 1},
+            "cpu": {"cores": 4, "systemLoad": 0.05, "lavalinkLoad": 0.01}, "frameStats": None,
+        })
+
+    async def _loadtracks(self, request: web.Request) -> web.Response:
+        await self._delay()
+        self.loads += 1
+        identifier = request.query.get("identifier", "")
+        if self.rng.random() < self.miss_rate:
+            self.misses += 1
+            return web.json_response({"loadType": "empty", "data": {}})
+        if identifier.startswith("http"):
+            parsed = urllib.parse.urlparse(identifier)
+            qs = urllib.parse.parse_qs(parsed.query)
+            size = qs.get("list", [""])[0]
+            if size.isdigit():
+                tracks = [self.make_track(self._identifier(f"{identifier}#{i}"), f"Pista {i}") for i in range(int(size))]
+                return web.json_response({
+                    "loadType": "playlist",
+                    "data": {"info": {"name": "Bench", "selectedTrack": -1}, "pluginInfo": {}, "tracks": tracks},
+                })
+            return web.json_response({"loadType": "track", "data": self.make_track(self._identifier(identifier), identifier)})
+        query = identifier.split(":", 1)[-1]
+        tracks = [self.make_track(self._identifier(f"{query}#{i}"), f"{query} ({i})") for i in range(SEARCH_RESULTS)]
+        return web.json_response({"loadType": "search", "data": tracks})
+
+    async def _decodetracks(self, request: web.Request) -> web.Response:
+        encoded = await request.json()
+        return web.json_response([self.tracks[e] for e in encoded if e in self.tracks])
+
+    async def _session(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        self.resuming = bool(data.get("resuming", self.resuming))
+        return web.json_response({"resuming": self.resuming, "timeout": data.get("timeout", 60)})
+
+    def _player_state(self, gid: int) -> dict[str, Any]:
+        started = self.started.get(gid)
+        position = int((time.monotonic() - started) * 1000) if started else 0
+        return {
+            "guildId": str(gid), "track": self.current.get(gid), "volume": 100, "paused": False,
+            "state": {"time": int(time.time() * 1000), "position": position, "connected": True, "ping": 1},
+            "voice": {"token": "", "endpoint": "", "sessionId": ""}, "filters": {},
+        }
+
+    async def _players(self, request: web.Request) -> web.Response:
+        return web.json_response([self._player_state(gid) for gid in self.current])
+
+    async def _player(self, request: web.Request) -> web.Response:
+        return web.json_response(self._player_state(int(request.match_info["gid"])))
+
+    async def _update_player(self, request: web.Request) -> web.Response:
+        await self._delay()
+        gid = int(request.match_info["gid"])
+        data = await request.json()
+        keep = request.query.get("noReplace", "false").lower() == "true" and gid in self.current
+        if keep:
+            # La pista que suena se conserva; solo se aplica la posición pedida
+            if data.get("position") is not None:
+                self.started[gid] = time.monotonic() - data["position"] / 1000
+        elif "track" in data:
+            encoded = (data["track"] or {}).get("encoded")
+            previous = self.current.pop(gid, None)
+            self.started.pop(gid, None)
+            if previous is not None:
+                reason = "replaced" if encoded else "stopped"
+                self.replaced += int(bool(encoded))
+                await self._send({"op": "event", "type": "TrackEndEvent", "guildId": str(gid),
+                                  "track": previous, "reason": reason})
+            if encoded:
+                track = self.tracks.get(encoded)
+                if track is None:
+                    return web.json_response({"timestamp": 0, "status": 400, "error": "Bad Request",
+                                              "message": "Unknown track", "path": request.path}, status=400)
+                asyncio.create_task(self._start(gid, track, data.get("position") or 0))
+        return web.json_response(self._player_state(gid))
+
+    async def _start(self, gid: int, track: dict[str, Any], position: int = 0):
+        if self.start_latency_ms > 0:
+            await asyncio.sleep(self.start_latency_ms / 1000)
+        if self.rng.random() < self.load_fail_rate:
+            await self._send({"op": "event", "type": "TrackEndEvent", "guildId": str(gid),
+                              "track": track, "reason": "loadFailed"})
+            return
+        self.current[gid] = track
+        self.started[gid] = time.monotonic() - position / 1000
+        self.start_positions[gid] = position
+        await self._send({"op": "event", "type": "TrackStartEvent", "guildId": str(gid), "track": track})
+
+    async def finish(self, gid: int) -> bool:
+        """Termina la pista actual del servidor como si hubiera llegado al final"""
+        track = self.current.pop(gid, None)
+        self.started.pop(gid, None)
+        if track is None:
+            return False
+        await self._send({"op": "event", "type": "TrackEndEvent", "guildId": str(gid),
+                          "track": track, "reason": "finished"})
+        return True
+
+    async def _destroy_player(self, request: web.Request) -> web.Response:
+        gid = int(request.match_info["gid"])
+        self.current.pop(gid, None)
+        self.started.pop(gid, None)
+        return web.Response(status=204)
+
+    async def stop(self):
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._updates:
+            self._updates.cancel()
+        await super().stop()
+
+
+class FakeSpotify(_FakeServer):
+    """API de Spotify (token, pista, álbum y playlist) con contenido generado.
+
+    El identificador de un álbum o playlist indica su tamaño: ``<n>`` o ``<n>-<etiqueta>``
+    (la etiqueta sirve para que cada ejecución tenga canciones distintas).
+    """
+
+    def __init__(self, *, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 seed: int | None = None):
+        super().__init__(latency_ms, jitter_ms, seed)
+        self.error_rate = error_rate
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/token", self._token)
+        app.router.add_get("/v1/tracks/{id}", self._track)
+        app.router.add_get("/v1/albums/{id}/tracks", self._album)
+        app.router.add_get("/v1/playlists/{id}/tracks", self._playlist)
+        return app
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.url}/v1"
+
+    @property
+    def auth_url(self) -> str:
+        return f"{self.url}/api/token"
+
+    @staticmethod
+    def _size(item_id: str) -> int:
+        head = item_id.split("-", 1)[0]
+        return int(head) if head.isdigit() else 1
+
+    @staticmethod
+    def _make(item_id: str, i: int) -> dict[str, Any]:
+        return {"id": f"{item_id}x{i}", "name": f"Canción {i} de {item_id}", "type": "track",
+                "artists": [{"name": f"Artista {i % 97}"}]}
+
+    async def _token(self, request: web.Request) -> web.Response:
+        await self._delay()
+        return web.json_response({"access_token": "bench", "token_type": "Bearer", "expires_in": 3600})
+
+    async def _page(self, request: web.Request, wrap: bool) -> web.Response:
+        await self._delay()
+        if self.rng.random() < self.error_rate:
+            return web.json_response({"error": {"status": 503, "message": "bench"}}, status=503)
+        item_id = request.match_info["id"]
+        size = self._size(item_id)
+        offset = int(request.query.get("offset", "0"))
+        limit = int(request.query.get("limit", "50"))
+        tracks = [self._make(item_id, i) for i in range(offset, min(size, offset + limit))]
+        items = [{"track": t} for t in tracks] if wrap else tracks
+        next_url = None
+        if offset + limit < size:
+            next_url = f"{self.url}{request.path}?offset={offset + limit}&limit={limit}"
+        return web.json_response({"items": items, "next": next_url, "total": size})
+
+    async def _track(self, request: web.Request) -> web.Response:
+        await self._delay()
+        return web.json_response(self._make(request.match_info["id"], 0))
+
+    async def _album(self, request: web.Request) -> web.Response:
+        return await self._page(request, wrap=False)
+
+    async def _playlist(self, request: web.Request) -> web.Response:
+        return await self._page(request, wrap=True)
@@ -0,0 +1,451 @@
+"""Benchmark de extremo a extremo del pipeline de música, sin red.
+
+Levanta un Lavalink y una API de Spotify falsos (``bench.fakes``), conecta el cog de
+música real a ellos y, para cada tamaño de playlist, mide:
+
+- ``resolve``: ``_resolve_ordered``/``_search_tracks`` sobre n consultas distintas (pistas/s).
+- ``play``: ``#play`` con una playlist de Spotify de n canciones: latencia del comando,
+  tiempo hasta el primer audio (hasta que llega el TrackStartEvent) y ritmo de importación.
+- ``shuffle`` / ``remove``: latencia de los comandos con la cola resultante.
+- ``track_end``: tiempo desde el TrackEndEvent hasta que empieza la siguiente pista.
+
+Las latencias se dan como p50/p95/p99 en ms. ``--json`` guarda los resultados y
+``--compare`` los contrasta con una ejecución anterior: sale con código 1 si alguna
+métrica empeora más que ``--tolerance``.
+
+Uso: python -m bench.music_bench [--sizes 1,10,100,1000,5000] [--latency 5] [--miss 0.05] ...
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+from typing import Any
+
+from bench.fakes import FakeLavalink, FakeSpotify
+
+DEFAULT_SIZES = [1, 10, 100, 1000, 5000]
+EVENT_TIMEOUT = 10.0
+
+
+def percentile(samples: list[float], p: float) -> float:
+    """Percentil por rango más cercano (0 si no hay muestras)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    return {
+        "n": len(samples),
+        "p50": round(percentile(samples, 50), 2),
+        "p95": round(percentile(samples, 95), 2),
+        "p99": round(percentile(samples, 99), 2),
+    }
+
+
+# --- Lo mínimo de discord.py que usa el cog ---------------------------------------
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel"):
+        self.channel = channel
+        self.id = channel.next_id()
+        self.edits = 0
+
+    async def edit(self, **kwargs) -> "FakeMessage":
+        self.edits += 1
+        return self
+
+    async def delete(self):
+        pass
+
+    async def add_reaction(self, emoji: str):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.sent = 0
+        self._ids = 0
+
+    def next_id(self) -> int:
+        self._ids += 1
+        return self._ids
+
+    async def send(self, content: str | None = None, **kwargs) -> FakeMessage:
+        self.sent += 1
+        return FakeMessage(self)
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild: "FakeGuild"):
+        self.id = guild.id + 1
+        self.name = "bench"
+        self.guild = guild
+        # Un oyente humano, para que no salte la desconexión por inactividad
+        self.members = [types.SimpleNamespace(bot=False)]
+
+    async def connect(self, *, cls) -> Any:
+        player = cls(self.guild.bot, self)
+        player._connected = True
+        player._voice_state = {"voice": {"session_id": "bench", "token": "bench", "endpoint": "bench"}}
+        player.node._players[self.guild.id] = player
+        self.guild.voice_client = player
+        return player
+
+
+class FakeGuild:
+    def __init__(self, bot: "FakeBot", guild_id: int):
+        self.bot = bot
+        self.id = guild_id
+        self.voice_client = None
+        self.voice_channel = FakeVoiceChannel(self)
+
+    def get_channel(self, channel_id: int) -> FakeVoiceChannel | None:
+        return self.voice_channel if channel_id == self.voice_channel.id else None
+
+    async def change_voice_state(self, **kwargs):
+        self.voice_client = None
+
+
+class FakeContext:
+    def __init__(self, guild: FakeGuild):
+        self.guild = guild
+        self.channel = FakeChannel(guild.id + 2)
+        self.author = types.SimpleNamespace(id=guild.id + 3, voice=types.SimpleNamespace(channel=guild.voice_channel))
+        self.message = FakeMessage(self.channel)
+
+    async def send(self, content: str | None = None, **kwargs) -> FakeMessage:
+        return await self.channel.send(content, **kwargs)
+
+
+class FakeBot:
+    """Cliente mínimo: reparte los eventos de wavelink a los listeners del cog"""
+
+    def __init__(self):
+        from utils.http import HTTPClient
+        from utils.scheduler import TimerWheel
+
+        self.user = types.SimpleNamespace(id=1)
+        self.http_client = HTTPClient()
+        self.scheduler = TimerWheel()
+        self.guilds: dict[int, FakeGuild] = {}
+        self.cog: Any = None
+        self._waiters: dict[int, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def voice_clients(self) -> list:
+        return [g.voice_client for g in self.guilds.values() if g.voice_client]
+
+    def get_guild(self, guild_id: int) -> FakeGuild | None:
+        return self.guilds.get(guild_id)
+
+    def guild(self, guild_id: int) -> FakeGuild:
+        guild = self.guilds[guild_id] = FakeGuild(self, guild_id)
+        return guild
+
+    def expect_start(self, guild_id: int) -> asyncio.Future:
+        """Futuro con el instante (perf_counter) del próximo TrackStartEvent del servidor"""
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[guild_id] = fut
+        return fut
+
+    def dispatch(self, event: str, *args: Any, **kwargs: Any):
+        if event == "wavelink_track_start":
+            player = args[0].player
+            fut = self._waiters.pop(player.guild.id, None) if player and player.guild else None
+            if fut and not fut.done():
+                fut.set_result(time.perf_counter())
+        handler = getattr(self.cog, f"on_{event}", None)
+        if handler is not None:
+            task = asyncio.create_task(handler(*args, **kwargs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+
+# --- Escenarios ------------------------------------------------------------------
+
+class MusicBench:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.lavalink = FakeLavalink(latency_ms=args.latency, jitter_ms=args.jitter, miss_rate=args.miss,
+                                     start_latency_ms=args.start_latency, load_fail_rate=args.load_fail,
+                                     seed=args.seed)
+        self.spotify = FakeSpotify(latency_ms=args.spotify_latency, jitter_ms=args.jitter, seed=args.seed)
+        self.bot: FakeBot | None = None
+        self.cog: Any = None
+        self._next_guild = 1000
+        self._tag = 0
+
+    def _new_guild(self) -> FakeGuild:
+        self._next_guild += 10
+        return self.bot.guild(self._next_guild)
+
+    def _unique(self) -> int:
+        # Etiqueta por ejecución: consultas nuevas, sin aciertos de la caché de pistas
+        self._tag += 1
+        return self._tag
+
+    async def setup(self, cache_dir: str):
+        await self.lavalink.start()
+        await self.spotify.start()
+        # La configuración del cog se lee de variables de entorno al importarlo
+        os.environ.update({
+            "CACHE_DIR": cache_dir,
+            "LAVALINK_NODES": json.dumps([{"identifier": "bench", "uri": self.lavalink.url, "password": "bench"}]),
+            "SPOTIFY_CLIENT_ID": "bench",
+            "SPOTIFY_CLIENT_SECRET": "bench",
+            "SPOTIFY_API_BASE": self.spotify.api_base,
+            "SPOTIFY_AUTH_URL": self.spotify.auth_url,
+            "MUSIC_MAX_IMPORT": str(max(self.args.sizes) + 1),
+        })
+        import wavelink
+        from cogs.music import Music
+
+        self.bot = FakeBot()
+        await self.bot.http_client.start()
+        self.bot.scheduler.start()
+        self.cog = self.bot.cog = Music(self.bot)
+        # Lo que haría bot.add_cog: enlazar los comandos al cog para poder invocarlos
+        for command in self.cog.get_commands():
+            command.cog = self.cog
+        await self.cog.on_ready()
+        deadline = time.monotonic() + EVENT_TIMEOUT
+        while not wavelink.Pool.nodes or any(n.status != wavelink.NodeStatus.CONNECTED
+                                             for n in wavelink.Pool.nodes.values()):
+            if time.monotonic() > deadline:
+                raise RuntimeError("El Lavalink falso no respondió")
+            await asyncio.sleep(0.05)
+
+    async def teardown(self):
+        import wavelink
+
+        await self.cog.cog_unload()
+        await self.bot.scheduler.close()
+        await wavelink.Pool.close()
+        await self.bot.http_client.close()
+        await self.lavalink.stop()
+        await self.spotify.stop()
+
+    async def bench_resolve(self, n: int) -> dict[str, Any]:
+        tag = self._unique()
+        queries = [f"bench {tag} consulta {i}" for i in range(n)]
+        loads, misses = self.lavalink.loads, self.lavalink.misses
+        resolved = 0
+        start = time.perf_counter()
+        async for _, tracks in self.cog._resolve_ordered(queries):
+            resolved += bool(tracks)
+        elapsed = time.perf_counter() - start
+        return {
+            "resolved": resolved,
+            "tracks_per_s": round(n / elapsed, 1),
+            "loadtracks": self.lavalink.loads - loads,
+            "misses": self.lavalink.misses - misses,
+        }
+
+    async def _wait_start(self, fut: asyncio.Future, since: float) -> float | None:
+        try:
+            return (await asyncio.wait_for(fut, EVENT_TIMEOUT) - since) * 1000
+        except asyncio.TimeoutError:
+            return None
+
+    async def bench_play(self, n: int) -> tuple[dict[str, Any], FakeContext | None]:
+        command, first_audio, import_rate = [], [], []
+        last_ctx = None
+        for _ in range(self.args.runs):
+            guild = self._new_guild()
+            ctx = FakeContext(guild)
+            started = self.bot.expect_start(guild.id)
+            t0 = time.perf_counter()
+            await self.cog.play(ctx, query=f"https://open.spotify.com/playlist/{n}-{self._unique()}")
+            command.append((time.perf_counter() - t0) * 1000)
+            ttfa = await self._wait_start(started, t0)
+            if ttfa is not None:
+                first_audio.append(ttfa)
+            imports = list(self.cog.import_tasks.get(guild.id, []))
+            if imports:
+                await asyncio.wait(imports)
+            import_rate.append(n / (time.perf_counter() - t0))
+            if last_ctx:
+                await self._discard(last_ctx)
+            last_ctx = ctx
+        return {
+            "command_ms": summarize(command),
+            "first_audio_ms": summarize(first_audio),
+            "import_tracks_per_s": round(sorted(import_rate)[len(import_rate) // 2], 1),
+        }, last_ctx
+
+    async def bench_edits(self, ctx: FakeContext) -> dict[str, Any]:
+        player = ctx.guild.voice_client
+        shuffle, remove = [], []
+        for _ in range(self.args.runs):
+            if not player.queue:
+                break
+            t0 = time.perf_counter()
+            await self.cog.shuffle(ctx)
+            shuffle.append((time.perf_counter() - t0) * 1000)
+            index = len(player.queue) // 2
+            item = player.queue[index]
+            t0 = time.perf_counter()
+            await self.cog.remove(ctx, position=index + 1)
+            remove.append((time.perf_counter() - t0) * 1000)
+            # Se devuelve a su sitio: la cola conserva el tamaño para las siguientes medidas
+            player.queue.put_at(index, item)
+        return {"shuffle_ms": summarize(shuffle), "remove_ms": summarize(remove)}
+
+    async def bench_track_end(self, ctx: FakeContext) -> dict[str, Any]:
+        player = ctx.guild.voice_client
+        gaps, lost = [], 0
+        for _ in range(self.args.runs):
+            if not player.queue:
+                break
+            # Deja que la precarga trabaje, como cuando la canción dura minutos
+            await asyncio.sleep(self.args.dwell / 1000)
+            started = self.bot.expect_start(ctx.guild.id)
+            t0 = time.perf_counter()
+            if not await self.lavalink.finish(ctx.guild.id):
+                started.cancel()
+                break
+            gap = await self._wait_start(started, t0)
+            if gap is None:
+                lost += 1
+            else:
+                gaps.append(gap)
+        return {"track_end_ms": summarize(gaps), "lost": lost}
+
+    async def _discard(self, ctx: FakeContext):
+        """Deja el servidor de una ejecución anterior sin reproductor ni tareas pendientes"""
+        player = ctx.guild.voice_client
+        self.cog._cancel_import(ctx.guild.id)
+        for key in ("music-np", "music-preload", "music-idle"):
+            self.bot.scheduler.cancel((key, ctx.guild.id))
+        self.cog.np_boards.pop(ctx.guild.id, None)
+        if player:
+            player.queue.clear()
+            self.cog.stop_guard.add(ctx.guild.id)
+            await player.disconnect()
+
+    async def run(self) -> dict[str, Any]:
+        results: dict[str, Any] = {}
+        for n in self.args.sizes:
+            row: dict[str, Any] = {"resolve": await self.bench_resolve(n)}
+            row["play"], ctx = await self.bench_play(n)
+            if ctx:
+                row.update(await self.bench_edits(ctx))
+                row.update(await self.bench_track_end(ctx))
+                await self._discard(ctx)
+            results[str(n)] = row
+        return results
+
+
+# --- Informe y comparación -------------------------------------------------------
+
+def flatten(results: dict[str, Any]) -> dict[str, float]:
+    """Métricas comparables: "tamaño.métrica" -> valor"""
+    flat: dict[str, float] = {}
+    for size, row in results.items():
+        flat[f"{size}.resolve.tracks_per_s"] = row["resolve"]["tracks_per_s"]
+        flat[f"{size}.play.import_tracks_per_s"] = row["play"]["import_tracks_per_s"]
+        for key in ("command_ms", "first_audio_ms"):
+            for p in ("p50", "p95", "p99"):
+                flat[f"{size}.play.{key}.{p}"] = row["play"][key][p]
+        for key in ("shuffle_ms", "remove_ms", "track_end_ms"):
+            if key in row and row[key]["n"]:
+                for p in ("p50", "p95", "p99"):
+                    flat[f"{size}.{key}.{p}"] = row[key][p]
+    return flat
+
+
+def regressions(current: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> list[str]:
+    """Métricas que empeoran más de ``tolerance`` (relativo) respecto a la base"""
+    now, before = flatten(current), flatten(baseline)
+    found = []
+    for key, old in before.items():
+        new = now.get(key)
+        if new is None or old <= 0:
+            continue
+        # Las tasas (por segundo) empeoran al bajar; las latencias, al subir
+        worse = (old - new) / old if key.endswith("_per_s") else (new - old) / old
+        if worse > tolerance:
+            found.append(f"{key}: {old} -> {new} ({worse:+.0%})")
+    return found
+
+
+def report(results: dict[str, Any], args: argparse.Namespace):
+    print(f"Lavalink falso: latencia {args.latency} ms (+{args.jitter}), fallos {args.miss:.0%}, "
+          f"inicio {args.start_latency} ms, pistas rotas {args.load_fail:.0%}; "
+          f"Spotify: {args.spotify_latency} ms; {args.runs} repeticiones")
+    print(f"{'tamaño':>7} {'resueltas/s':>12} {'importadas/s':>13} {'métrica':<16} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for size, row in results.items():
+        lines = [("#play", row["play"]["command_ms"]), ("primer audio", row["play"]["first_audio_ms"])]
+        lines += [(name, row[key]) for name, key in
+                  (("#shuffle", "shuffle_ms"), ("#remove", "remove_ms"), ("track_end", "track_end_ms")) if key in row]
+        # Con una sola canción no queda cola que editar ni siguiente pista
+        lines = [(name, s) for name, s in lines if s["n"]]
+        for i, (name, s) in enumerate(lines):
+            head = (f"{size:>7} {row['resolve']['tracks_per_s']:>12} {row['play']['import_tracks_per_s']:>13}"
+                    if i == 0 else " " * 34)
+            print(f"{head} {name:<16} {s['p50']:>9.2f} {s['p95']:>9.2f} {s['p99']:>9.2f}")
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.music_bench", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=DEFAULT_SIZES,
+                        help="tamaños de playlist separados por comas")
+    parser.add_argument("--runs", type=int, default=10, help="repeticiones de cada comando por tamaño")
+    parser.add_argument("--latency", type=float, default=5.0, help="latencia REST de Lavalink (ms)")
+    parser.add_argument("--jitter", type=float, default=5.0, help="variación aleatoria añadida (ms)")
+    parser.add_argument("--miss", type=float, default=0.05, help="proporción de búsquedas sin resultados")
+    parser.add_argument("--start-latency", type=float, default=20.0, help="del PATCH al TrackStartEvent (ms)")
+    parser.add_argument("--load-fail", type=float, default=0.0, help="proporción de pistas que no cargan")
+    parser.add_argument("--spotify-latency", type=float, default=30.0, help="latencia de la API de Spotify (ms)")
+    parser.add_argument("--dwell", type=float, default=50.0, help="espera entre fines de pista (ms)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    parser.add_argument("--compare", help="resultados anteriores (JSON) con los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="empeoramiento relativo admitido")
+    parser.add_argument("--verbose", action="store_true", help="muestra los mensajes del bot")
+    return parser.parse_args(argv)
+
+
+async def main(argv: list[str]) -> int:
+    args = parse_args(argv)
+    bench = MusicBench(args)
+    with tempfile.TemporaryDirectory(prefix="music-bench-") as cache_dir:
+        await bench.setup(cache_dir)
+        try:
+            # Los prints del cog ("Primer audio en ...") ensucian el informe
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with quiet:
+                results = await bench.run()
+        finally:
+            await bench.teardown()
+    report(results, args)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in {"json", "compare"}},
+                       "results": results}, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+        found = regressions(results, baseline, args.tolerance)
+        if found:
+            print(f"\nRegresiones (> {args.tolerance:.0%}):")
+            for line in found:
+                print(f"  {line}")
+            return 1
+        print(f"\nSin regresiones respecto a {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,87 @@
+"""Microbenchmark de las ediciones de la cola de música.
+
+Compara la reconstrucción anterior (copiar, limpiar y un ``put_wait`` por pista)
+con las operaciones en sitio de ``MusicQueue``.
+
+Uso: python -m bench.queue_bench [tamaño ...]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import wavelink
+
+from cogs.music import MusicQueue
+
+
+def fake_track(i: int) -> wavelink.Playable:
+    return wavelink.Playable({
+        "encoded": f"enc{i}",
+        "info": {
+            "identifier": f"id{i:07d}", "isSeekable": True, "author": "Bench", "length": 180000,
+            "isStream": False, "position": 0, "title": f"Canción {i}", "uri": None, "sourceName": "youtube",
+        },
+        "pluginInfo": {},
+        "userData": {},
+    })
+
+
+def make_queue(n: int) -> MusicQueue:
+    q = MusicQueue()
+    q.put([fake_track(i) for i in range(n)])
+    return q
+
+
+async def legacy_remove(q: MusicQueue, index: int):
+    items = list(q)
+    items.pop(index)
+    q.clear()
+    for t in items:
+        await q.put_wait(t)
+
+
+async def legacy_shuffle(q: MusicQueue):
+    items = list(q)
+    random.shuffle(items)
+    q.clear()
+    for t in items:
+        await q.put_wait(t)
+
+
+def per_op_us(fn, reps: int) -> float:
+    start = time.perf_counter()
+    for _ in range(reps):
+        fn()
+    return (time.perf_counter() - start) / reps * 1e6
+
+
+async def per_op_us_async(fn, reps: int) -> float:
+    start = time.perf_counter()
+    for _ in range(reps):
+        await fn()
+    return (time.perf_counter() - start) / reps * 1e6
+
+
+async def run(sizes: list[int]):
+    print(f"{'tamaño':>8} {'operación':<22} {'µs/op':>12}")
+    for n in sizes:
+        q = make_queue(n)
+        reps = 2000
+        rows = [
+            ("remove_at(medio)", per_op_us(lambda: q.put(q.remove_at(len(q) // 2)), reps)),
+            ("move(0 -> fin)", per_op_us(lambda: q.move(0, len(q) - 1), reps)),
+            ("remove_range(10)", per_op_us(lambda: q.put(q.remove_range(n // 2, n // 2 + 10)), reps)),
+            ("shuffle", per_op_us(q.shuffle, 20)),
+        ]
+        # La versión anterior es O(n) awaits por edición: pocas repeticiones bastan
+        legacy_reps = 3 if n >= 10000 else 20
+        rows.append(("legacy remove", await per_op_us_async(lambda: legacy_remove(q, n // 2), legacy_reps)))
+        rows.append(("legacy shuffle", await per_op_us_async(lambda: legacy_shuffle(q), legacy_reps)))
+        for name, us in rows:
+            print(f"{n:>8} {name:<22} {us:>12.2f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 1000, 10000]
+    asyncio.run(run(sizes))
@@ -0,0 +1,78 @@
+"""Memoria por canción de una cola larga: Playable completos frente a QueuedTrack.
+
+Las pistas se construyen como llegan de Lavalink (cadena codificada de unos cientos de
+bytes, URL, carátula, ISRC...) y se mide con tracemalloc lo que la cola retiene una vez
+liberadas las respuestas originales. También mide el historial tras reproducirlas todas.
+
+Uso: python -m bench.queue_memory [tamaño]
+"""
+import base64
+import gc
+import json
+import random
+import sys
+import tracemalloc
+
+import wavelink
+
+from cogs.music import MusicQueue
+
+AUTHORS = [f"Artista {i}" for i in range(200)]
+
+
+def lavalink_payload(i: int, rng: random.Random) -> dict:
+    """Respuesta de /v4/loadtracks para una pista, con el tamaño típico de YouTube"""
+    identifier = "".join(rng.choices("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-", k=11))
+    encoded = base64.b64encode(rng.randbytes(rng.randint(180, 260))).decode()
+    data = {
+        "encoded": encoded,
+        "info": {
+            "identifier": identifier, "isSeekable": True, "author": rng.choice(AUTHORS),
+            "length": rng.randint(120000, 360000), "isStream": False, "position": 0,
+            "title": f"Canción {i} (Official Video)", "uri": f"https://www.youtube.com/watch?v={identifier}",
+            "artworkUrl": f"https://i.ytimg.com/vi/{identifier}/maxresdefault.jpg", "isrc": None,
+            "sourceName": "youtube",
+        },
+        "pluginInfo": {},
+        "userData": {},
+    }
+    # Como en producción, cada respuesta se decodifica de JSON: nada de cadenas compartidas
+    return json.loads(json.dumps(data))
+
+
+def measure(n: int, compact: bool) -> tuple[float, float]:
+    """Bytes por canción retenidos por la cola y por el historial (tras reproducirlas)"""
+    rng = random.Random(1)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    queue = MusicQueue(compact=compact)
+    queue.put([wavelink.Playable(lavalink_payload(i, rng)) for i in range(n)])
+    gc.collect()
+    in_queue = tracemalloc.get_traced_memory()[0] - base
+
+    # Lo que hace wavelink al reproducir cada canción: la añade al historial
+    while queue:
+        track = queue.get()
+        queue.history.put(track if isinstance(track, wavelink.Playable) else track.playable())
+    gc.collect()
+    in_history = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    del queue
+    return in_queue / n, in_history / n
+
+
+def run(n: int):
+    print(f"{n} canciones")
+    print(f"{'modo':<22} {'bytes/canción en cola':>22} {'tras reproducirlas':>20}")
+    results = {}
+    for name, compact in (("Playable", False), ("QueuedTrack", True)):
+        results[name] = measure(n, compact)
+        per_track, after = results[name]
+        print(f"{name:<22} {per_track:>22.0f} {after:>20.0f}")
+    before, after = results["Playable"][0], results["QueuedTrack"][0]
+    print(f"Reducción en cola: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -1,21 +1,169 @@
 import os
 import discord
 from discord.ext import commands
-import aiohttp
 import asyncio
-from typing import Dict, List
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+
+from utils.cache import cache_path
+from utils.conversations import ConversationStore
+from utils.llm import LLMAuthError, LLMError, LLMTimeout, LLMUnavailable
+from utils.ratelimit import RateLimited, text_tokens
+from utils.response_cache import ResponseCache
+
+# Respuestas en streaming: el mensaje se publica con el primer fragmento y se va editando
+AI_STREAM = os.environ.get("AI_STREAM", "true").lower() == "true"
+# Mínimo entre ediciones en un mismo canal (Discord admite unas 5 cada 5 segundos)
+STREAM_EDIT_INTERVAL = float(os.environ.get("AI_STREAM_EDIT_INTERVAL", "1.2"))
+DISCORD_MESSAGE_LIMIT = 2000
+MAX_TOKENS = 150
+# Plazo de cada respuesta (segundos) una vez que le toca turno, reintentos incluidos
+AI_DEADLINE = 45.0
+# Tokens (estimados) de cada petición contando la respuesta: el historial se recorta para no pasar de aquí
+PROMPT_TOKEN_BUDGET = int(os.environ.get("AI_PROMPT_TOKEN_BUDGET", "2048"))
+# Turnos (pregunta + respuesta) que se recuerdan por usuario
+HISTORY_TURNS = int(os.environ.get("AI_HISTORY_TURNS", "3"))
+
+# Compactación: al pasar de AI_SUMMARY_THRESHOLD tokens, o antes de que el historial lleno
+# descarte un turno sin resumir, los turnos antiguos se resumen en segundo plano y se conservan
+# completos los últimos AI_SUMMARY_KEEP_TURNS. Con la compactación activa el historial guarda al
+# menos AI_SUMMARY_KEEP_TURNS + AI_SUMMARY_BATCH_TURNS turnos, así cada resumen junta varios
+AI_SUMMARY = os.environ.get("AI_SUMMARY", "false").lower() == "true"
+SUMMARY_THRESHOLD = int(os.environ.get("AI_SUMMARY_THRESHOLD", "400"))
+SUMMARY_KEEP_TURNS = int(os.environ.get("AI_SUMMARY_KEEP_TURNS", "2"))
+SUMMARY_BATCH_TURNS = max(1, int(os.environ.get("AI_SUMMARY_BATCH_TURNS", "3")))
+SUMMARY_MAX_TOKENS = 120
+SUMMARY_DEADLINE = 30.0
+SUMMARY_PROMPT = (
+    "Resume en español y en tercera persona la conversación entre un usuario y el asistente, "
+    "en 60 palabras como mucho. Conserva lo que el usuario haya contado de sí mismo (nombre, "
+    "gustos, planes) y los temas que sigan abiertos. Devuelve solo el resumen."
+)
+
+# Caché de respuestas a preguntas sin historial ("hola", "quién eres"...), compartida entre usuarios
+AI_CACHE = os.environ.get("AI_CACHE", "false").lower() == "true"
+AI_CACHE_MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", "500"))
+AI_CACHE_TTL = int(os.environ.get("AI_CACHE_TTL", str(24 * 3600)))
+# Similitud mínima (Jaccard estimada sobre trigramas) para reutilizar la respuesta de otra pregunta
+AI_CACHE_SIMILARITY = float(os.environ.get("AI_CACHE_SIMILARITY", "0.85"))
+STREAM_CURSOR = " ▌"
+
+
+def queue_notice(ahead: int) -> str:
+    """Aviso mientras la petición espera turno en la cola de Groq"""
+    if ahead <= 0:
+        return "⏳ La IA está al límite de peticiones; tu mensaje sale en cuanto haya cupo..."
+    plural = "petición" if ahead == 1 else "peticiones"
+    return f"⏳ La IA está ocupada: hay {ahead} {plural} antes que la tuya. Tu mensaje está en cola..."
+
+
+def rate_limited_text(e: RateLimited) -> str:
+    minutes = max(1, round(e.retry_in / 60))
+    return f"⏳ La IA agotó su cuota por ahora. Intenta de nuevo en unos {minutes} min."
+
+
+class EditPacer:
+    """Reparte los turnos de edición de cada canal: uno cada ``interval`` segundos"""
+
+    def __init__(self, interval: float = STREAM_EDIT_INTERVAL):
+        self.interval = interval
+        self._next: Dict[int, float] = {}
+
+    async def wait(self, channel_id: int):
+        now = time.monotonic()
+        slot = max(now, self._next.get(channel_id, 0.0))
+        self._next[channel_id] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class StreamedReply:
+    """Respuesta que se publica con el primer fragmento y se edita mientras llega el resto.
+
+    Las ediciones se agrupan: como mucho hay una pendiente por mensaje y, cuando le toca
+    turno, muestra todo el texto recibido hasta ese momento.
+    """
+
+    def __init__(self, channel: discord.abc.Messageable, footer: str, pacer: EditPacer):
+        self.channel = channel
+        self.footer = footer
+        self.pacer = pacer
+        self.text = ""
+        self.message: discord.Message | None = None
+        self.edits = 0
+        self.done = False
+        self.queued = False  # el mensaje aún muestra el aviso de cola
+        self._shown = ""
+        self._pending: asyncio.Task | None = None
+
+    def _render(self, final: bool) -> str:
+        body = self.text.strip() if final else self.text.strip() + STREAM_CURSOR
+        limit = DISCORD_MESSAGE_LIMIT - len(self.footer) - 1
+        if len(body) > limit:
+            body = body[:limit - 1] + "…"
+        return f"{body}\n{self.footer}"
+
+    async def notify_queue(self, ahead: int):
+        """Publica (o actualiza) el aviso de cola; la respuesta lo sustituirá"""
+        content = queue_notice(ahead)
+        if self.message is None:
+            self.message = await self.channel.send(content)
+        else:
+            await self.message.edit(content=content)
+        self.queued = True
+
+    async def _publish(self, content: str):
+        if self.message is None:
+            self.message = await self.channel.send(content)
+        else:
+            await self.message.edit(content=content)
+        self._shown = content
+        self.queued = False
+
+    async def feed(self, delta: str):
+        self.text += delta
+        if self.message is None or self.queued:
+            if self.text.strip():
+                await self.pacer.wait(self.channel.id)  # el envío también gasta turno
+                await self._publish(self._render(False))
+            return
+        if self._pending is None or self._pending.done():
+            self._pending = asyncio.create_task(self._edit())
+
+    async def _edit(self):
+        await self.pacer.wait(self.channel.id)
+        # Si la respuesta terminó mientras esperaba turno, esta edición ya es la definitiva
+        content = self._render(self.done)
+        if content == self._shown:
+            return
+        try:
+            await self.message.edit(content=content)
+            self._shown = content
+            self.edits += 1
+        except discord.HTTPException as e:
+            print(f"[WARNING] No se pudo editar la respuesta de la IA: {e}")
+
+    async def finish(self, fallback: str):
+        """Deja el texto completo (o ``fallback`` si no llegó nada)"""
+        self.done = True
+        if self.message is None or self.queued:
+            self.text = self.text or fallback
+            await self._publish(self._render(True))
+            return
+        if self._pending:
+            await self._pending
+        if self._shown != self._render(True):
+            await self._edit()
 
 
 class AIChat(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        # Cambiando a Groq - API gratuita con modelos rápidos
-        self.groq_api_key = os.environ.get("GROQ_API_KEY")
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
-        self.model = "llama-3.1-8b-instant"  # Modelo rápido y gratuito
-        # Historial de conversaciones por usuario (máximo 3 mensajes)
-        self.conversation_history: Dict[int, List[str]] = {}
-        self.max_history = 3
+        # Groq (API gratuita con modelos rápidos) a través del cliente compartido bot.llm
+        # Historial de conversaciones por usuario (máximo 3 turnos, con límite global de memoria)
+        self.max_history = max(HISTORY_TURNS, SUMMARY_KEEP_TURNS + SUMMARY_BATCH_TURNS) if AI_SUMMARY else HISTORY_TURNS
+        self.conversation_history = ConversationStore(self.max_history)
+        self.compaction_tasks: dict[int, asyncio.Task] = {}  # Resúmenes en segundo plano
         
         # IDs específicos donde funciona el comando
         self.allowed_guild_id = 391755494978617344
@@ -23,6 +171,11 @@ class AIChat(commands.Cog):
         
         # Cargar personalidad desde archivo
         self.personality = self._load_personality()
+        self.response_cache: ResponseCache | None = None
+        if AI_CACHE:
+            self.response_cache = ResponseCache(cache_path("ia_responses.json"), AI_CACHE_MAX_ENTRIES, AI_CACHE_TTL,
+                                                AI_CACHE_SIMILARITY, namespace=f"{bot.llm.model}\n{self.personality}")
+        self.edit_pacer = EditPacer()
 
     def _load_personality(self) -> str:
         """Carga la personalidad desde el archivo de configuración"""
@@ -35,91 +188,142 @@ class AIChat(commands.Cog):
             # Personalidad por defecto si falla
             return "Eres Sthashior, un asistente amigable y conversacional. Responde de manera breve y natural."
 
-    async def _query_groq(self, text: str, user_id: int) -> str:
-        """Consulta la API de Groq con Llama 3.1"""
-        if not self.groq_api_key:
-            return "❌ API Key de Groq no configurada. Obtén una gratis en: https://console.groq.com"
-        
-        headers = {
-            "Authorization": f"Bearer {self.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Usar personalidad cargada desde archivo
+    async def cog_unload(self):
+        for task in self.compaction_tasks.values():
+            task.cancel()
+        if self.response_cache is not None:
+            await self.response_cache.flush()
+
+    def _cached_reply(self, text: str, user_id: int) -> str | None:
+        """Respuesta en caché si la pregunta no depende de una conversación previa"""
+        if self.response_cache is None or user_id in self.conversation_history:
+            return None
+        return self.response_cache.get(text)
+
+    def _build_messages(self, text: str, user_id: int) -> List[dict]:
+        # Personalidad, resumen y los turnos más recientes que quepan en el presupuesto
+        return self.conversation_history.messages(user_id, self.personality, text, PROMPT_TOKEN_BUDGET - MAX_TOKENS)
+
+    def _error_text(self, error: Exception, partial: bool = False) -> str:
+        """Mensaje para el canal según el fallo de la llamada a Groq"""
+        if isinstance(error, RateLimited):
+            return rate_limited_text(error)
+        if isinstance(error, LLMUnavailable):
+            return f"🔌 La IA no responde ahora mismo. Intenta de nuevo en unos {max(1, round(error.retry_in))} segundos."
+        if isinstance(error, LLMTimeout):
+            return "\n⏱️ La IA tardó demasiado en responder." if partial else "⏱️ La IA tardó demasiado en responder. Intenta de nuevo."
+        if partial:
+            return f"\n❌ Respuesta interrumpida: {error}"
+        if isinstance(error, LLMAuthError):
+            return "❌ API Key de Groq inválida. Verifica tu clave en https://console.groq.com"
+        if isinstance(error, LLMError) and error.status == 429:
+            return "⏳ Límite de rate alcanzado. Espera un momento e intenta de nuevo."
+        if isinstance(error, LLMError) and error.status:
+            return f"❌ Error {error.status}: {error.detail[:150]}"
+        return f"❌ Error: {str(error)}"
+
+    def _remember(self, user_id: int, text: str, response_text: str):
+        # Actualizar historial (el almacén descarta los turnos y usuarios más antiguos)
+        self.conversation_history.add(user_id, text, response_text)
+        if AI_SUMMARY and user_id not in self.compaction_tasks:
+            folded = self.conversation_history.to_compact(user_id, SUMMARY_THRESHOLD, SUMMARY_KEEP_TURNS,
+                                                          SUMMARY_BATCH_TURNS)
+            if folded:
+                task = asyncio.create_task(self._compact(user_id, folded))
+                self.compaction_tasks[user_id] = task
+                task.add_done_callback(lambda _: self.compaction_tasks.pop(user_id, None))
+
+    async def _compact(self, user_id: int, folded: list):
+        """Resume los turnos ``folded`` junto con el resumen anterior, fuera del camino de la
+        respuesta. Si falla, los turnos siguen ahí y se reintenta con el siguiente mensaje."""
+        previous = self.conversation_history.summary(user_id)
+        lines = [f"Resumen anterior: {previous}", ""] if previous else []
+        for prompt, reply, _ in folded:
+            lines.append(f"Usuario: {prompt}")
+            lines.append(f"Asistente: {reply}")
         messages = [
-            {"role": "system", "content": self.personality}
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": "\n".join(lines)},
         ]
-        
-        # Añadir historial si existe
-        history = self.conversation_history.get(user_id, [])
-        for i in range(0, len(history), 2):
-            if i < len(history):
-                messages.append({"role": "user", "content": history[i]})
-            if i + 1 < len(history):
-                messages.append({"role": "assistant", "content": history[i+1]})
-        
-        # Añadir mensaje actual
-        messages.append({"role": "user", "content": text})
-        
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 150,
-            "top_p": 0.9
-        }
-        
+        started = time.perf_counter()
         try:
-            async with aiohttp.ClientSession() as session:
-                print(f"[DEBUG] URL: {self.api_url}")
-                print(f"[DEBUG] Payload: {payload}")
-                async with session.post(self.api_url, headers=headers, json=payload, timeout=aiohttp.ClientTimeout(total=45)) as response:
-                    # Logs de depuración
-                    print(f"[DEBUG] Status Code: {response.status}")
-                    print(f"[DEBUG] Headers: {dict(response.headers)}")
-                    
-                    if response.status == 401:
-                        error_detail = await response.text()
-                        print(f"[DEBUG] 401 Error: {error_detail}")
-                        return "❌ API Key de Groq inválida. Verifica tu clave en https://console.groq.com"
-                    
-                    if response.status == 429:
-                        error_detail = await response.text()
-                        print(f"[DEBUG] 429 Error: {error_detail}")
-                        return "⏳ Límite de rate alcanzado. Espera un momento e intenta de nuevo."
-                    
-                    if response.status != 200:
-                        error_text = await response.text()
-                        print(f"[DEBUG] Error {response.status}: {error_text}")
-                        return f"❌ Error {response.status}: {error_text[:150]}"
-                    
-                    result = await response.json()
-                    print(f"[DEBUG] Response JSON: {result}")
-                    
-                    # Groq usa formato OpenAI
-                    if "choices" in result and len(result["choices"]) > 0:
-                        response_text = result["choices"][0]["message"]["content"].strip()
-                        
-                        if response_text:
-                            # Actualizar historial
-                            if user_id not in self.conversation_history:
-                                self.conversation_history[user_id] = []
-                            
-                            self.conversation_history[user_id].append(text)
-                            self.conversation_history[user_id].append(response_text)
-                            
-                            # Mantener solo los últimos mensajes
-                            if len(self.conversation_history[user_id]) > self.max_history * 2:
-                                self.conversation_history[user_id] = self.conversation_history[user_id][-(self.max_history * 2):]
-                            
-                            return response_text
-                    
-                    return "🤔 No pude generar una respuesta..."
+            summary = await self.bot.llm.complete(messages, user_id=user_id, max_tokens=SUMMARY_MAX_TOKENS,
+                                                  deadline=SUMMARY_DEADLINE, temperature=0.3)
+        except (LLMError, RateLimited) as e:
+            print(f"[WARNING] No se pudo resumir la conversación: {e!r}")
+            return
+        if not summary:
+            return
+        self.conversation_history.fold(user_id, folded, summary)
+        print(f"[IA] {len(folded)} turnos resumidos en {text_tokens(summary)} tokens "
+              f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+
+    async def _query_groq(self, text: str, user_id: int,
+                          on_wait: Callable[[int], Awaitable[None]] | None = None) -> str:
+        """Consulta la API de Groq con Llama 3.1"""
+        if not self.bot.llm.api_key:
+            return "❌ API Key de Groq no configurada. Obtén una gratis en: https://console.groq.com"
         
-        except asyncio.TimeoutError:
-            return "⏱️ La IA tardó demasiado en responder. Intenta de nuevo."
-        except Exception as e:
-            return f"❌ Error: {str(e)}"
+        cached = self._cached_reply(text, user_id)
+        if cached is not None:
+            self._remember(user_id, text, cached)
+            return cached
+
+        cacheable = self.response_cache is not None and user_id not in self.conversation_history
+        try:
+            response_text = await self.bot.llm.complete(self._build_messages(text, user_id), user_id=user_id,
+                                                        max_tokens=MAX_TOKENS, deadline=AI_DEADLINE, on_wait=on_wait)
+        except (LLMError, RateLimited) as e:
+            return self._error_text(e)
+        if not response_text:
+            return "🤔 No pude generar una respuesta..."
+        self._remember(user_id, text, response_text)
+        if cacheable:
+            self.response_cache.put(text, response_text)
+        return response_text
+
+    async def _stream_groq(self, text: str, user_id: int,
+                           on_wait: Callable[[int], Awaitable[None]] | None = None) -> AsyncIterator[str]:
+        """Igual que _query_groq pero con ``stream: true``: genera los fragmentos de texto a
+        medida que llegan. Los errores se generan como texto, igual que los devuelve _query_groq."""
+        if not self.bot.llm.api_key:
+            yield "❌ API Key de Groq no configurada. Obtén una gratis en: https://console.groq.com"
+            return
+
+        cached = self._cached_reply(text, user_id)
+        if cached is not None:
+            self._remember(user_id, text, cached)
+            yield cached
+            return
+
+        cacheable = self.response_cache is not None and user_id not in self.conversation_history
+        parts: List[str] = []
+        stream = self.bot.llm.stream(self._build_messages(text, user_id), user_id=user_id,
+                                     max_tokens=MAX_TOKENS, deadline=AI_DEADLINE, on_wait=on_wait)
+        try:
+            async for delta in stream:
+                parts.append(delta)
+                yield delta
+        except (LLMError, RateLimited) as e:
+            # Una respuesta cortada no se recuerda ni se guarda en caché
+            yield self._error_text(e, partial=bool(parts))
+            return
+        finally:
+            await stream.aclose()
+
+        response_text = "".join(parts).strip()
+        if not response_text:
+            return
+        self._remember(user_id, text, response_text)
+        if cacheable:
+            self.response_cache.put(text, response_text)
+
+    def latency_summary(self) -> dict:
+        data = {**self.bot.llm.stats(), "groq": self.bot.groq_limiter.stats(),
+                "memory": self.conversation_history.stats()}
+        if self.response_cache is not None:
+            data["cache"] = self.response_cache.stats()
+        return data
 
     @commands.command(name="ia")
     async def ia_chat(self, ctx: commands.Context, *, texto: str = None):
@@ -136,12 +340,41 @@ class AIChat(commands.Cog):
             await ctx.send("❌ Debes escribir algo. Uso: `#ia <tu mensaje>`")
             return
         
-        # Mostrar indicador de escritura
-        async with ctx.typing():
-            response = await self._query_groq(texto, ctx.author.id)
-        
-        # Enviar respuesta sin embed
-        await ctx.send(f"{response}\n-# Conversación con {ctx.author.display_name}")
+        footer = f"-# Conversación con {ctx.author.display_name}"
+        if not AI_STREAM:
+            notice: discord.Message | None = None
+
+            # Si hay que esperar cupo, se avisa de cuántas peticiones van delante
+            async def on_wait(ahead: int):
+                nonlocal notice
+                if notice is None:
+                    notice = await ctx.send(queue_notice(ahead))
+                else:
+                    await notice.edit(content=queue_notice(ahead))
+
+            # Mostrar indicador de escritura
+            async with ctx.typing():
+                response = await self._query_groq(texto, ctx.author.id, on_wait=on_wait)
+            
+            # Enviar respuesta sin embed (sustituyendo el aviso de cola si lo hubo)
+            if notice is not None:
+                await notice.edit(content=f"{response}\n{footer}")
+            else:
+                await ctx.send(f"{response}\n{footer}")
+            return
+
+        # "Escribiendo…" solo hasta el primer fragmento; después se ve el mensaje crecer
+        reply = StreamedReply(ctx.channel, footer, self.edit_pacer)
+        stream = self._stream_groq(texto, ctx.author.id, on_wait=reply.notify_queue)
+        try:
+            async with ctx.typing():
+                first = await anext(stream, "")
+            await reply.feed(first)
+            async for delta in stream:
+                await reply.feed(delta)
+        finally:
+            await stream.aclose()
+        await reply.finish("🤔 No pude generar una respuesta...")
 
     @commands.command(name="ia_reset")
     async def ia_reset(self, ctx: commands.Context):
@@ -153,8 +386,7 @@ class AIChat(commands.Cog):
             await ctx.send("❌ Este comando solo funciona en el canal designado.")
             return
         
-        if ctx.author.id in self.conversation_history:
-            del self.conversation_history[ctx.author.id]
+        if self.conversation_history.reset(ctx.author.id):
             await ctx.send("✅ Historial de conversación reiniciado.")
         else:
             await ctx.send("ℹ️ No tienes historial de conversación.")
@@ -178,8 +410,7 @@ class AIChat(commands.Cog):
             
             # Enviar mensaje de confirmación (se auto-eliminará en 5 segundos)
             confirmation = await ctx.send(f"✅ Se eliminaron {len(deleted)} mensajes del canal.")
-            await asyncio.sleep(5)
-            await confirmation.delete()
+            self.bot.scheduler.call_later(5, confirmation.delete)
             
         except discord.Forbidden:
             await ctx.send("❌ No tengo permisos para eliminar mensajes.")
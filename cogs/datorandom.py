@@ -1,4 +1,3 @@
-import asyncio
 import json
 import os
 import random
@@ -59,8 +58,7 @@ class DatoRandom(commands.Cog):
     def _cooldown_remaining(self, user_id: int) -> int:
         return max(0, int(self._cooldown_until.get(user_id, 0) - self._now()))
 
-    async def _delete_later(self, *messages: discord.Message):
-        await asyncio.sleep(MESSAGE_TTL_SECONDS)
+    async def _delete_messages(self, *messages: discord.Message):
         for m in messages:
             try:
                 await m.delete()
@@ -119,7 +117,7 @@ class DatoRandom(commands.Cog):
         emb = discord.Embed(title="Dato Random", description=text, color=discord.Color.blurple())
         reply = await ctx.send(embed=emb)
         # programar borrado de ambos mensajes
-        asyncio.create_task(self._delete_later(ctx.message, reply))
+        self.bot.scheduler.call_later(MESSAGE_TTL_SECONDS, self._delete_messages, ctx.message, reply)
 
         # actualizar contadores y cooldown
         self._uses_count[user_id] = uses + 1
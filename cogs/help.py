@@ -12,8 +12,8 @@ HELP_MUSICA = (
     "🌸 #stop → Detiene todo y limpia la cola (╥﹏╥).\n\n"
     "🌸 #skip → Salta a la siguiente canción ⏭️.\n\n"
     "📜 Información\n\n"
-    "🌸 #queue → Muestra la lista de canciones en espera (⌒‿⌒).\n\n"
-    "🌸 #nowplaying → Muestra la canción actual con su duración y autor.\n\n"
+    "🌸 #queue → Muestra la lista de canciones en espera, por páginas con botones (⌒‿⌒).\n\n"
+    "🌸 #nowplaying → Trae aquí el mensaje de la canción actual, que se actualiza solo.\n\n"
     "🌸 #lyrics [nombre] → Muestra la letra de la canción actual o la que indiques 🎤.\n\n"
     "🎧 Conexión\n\n"
     "🌸 #join → Hace que el bot entre a tu canal de voz (づ｡◕‿‿◕｡)づ.\n\n"
@@ -22,6 +22,9 @@ HELP_MUSICA = (
     "🌸 #loop [song | queue | off] → Repite una canción o toda la lista ♻️.\n\n"
     "🌸 #shuffle → Mezcla el orden de la cola como un DJ loco (≧▽≦).\n\n"
     "🌸 #remove <posición> → Elimina una canción específica de la cola 🗑️.\n\n"
+    "🌸 #removerange <inicio> <fin> → Elimina varias canciones seguidas de la cola 🧹.\n\n"
+    "🌸 #move <desde> <hasta> → Cambia una canción de posición en la cola ↕️.\n\n"
+    "🌸 #dedupe [on | off] → Omite (o no) las canciones que ya están en la cola 🧩.\n\n"
     "🌸 Disfruta de la música, comparte el ritmo y deja que el bot haga el resto~ (✿◠‿◠)"
 )
 
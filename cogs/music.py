@@ -1,19 +1,581 @@
 import os
-import random
 import asyncio
 import discord
 from discord.ext import commands
 import wavelink
 import aiohttp
 import urllib.parse
+import json
 import re
-import unicodedata
+import sys
+import time
+from collections import Counter, deque
+from typing import AsyncIterator
 
-try:
-    import spotipy
-    from spotipy.oauth2 import SpotifyClientCredentials
-except Exception:
-    spotipy = None
+from utils.cache import PersistentLRU, cache_path
+from utils.lyrics import LyricsEngine, unaccent
+from utils.nodes import NodeBalancer
+from utils.oembed import OEmbedService
+from utils.resolver import HedgedResolver, SearchError
+from utils.spotify import SpotifyClient, SpotifyError
+
+
+# Búsquedas simultáneas al resolver playlists/álbumes de Spotify
+RESOLVE_CONCURRENCY = max(1, int(os.environ.get("MUSIC_RESOLVE_CONCURRENCY", "4")))
+# Intervalo mínimo entre ediciones del mensaje de progreso (segundos)
+PROGRESS_EDIT_INTERVAL = 1.5
+
+# Entradas de la cola que se resuelven por adelantado mientras suena la actual
+PREFETCH_WINDOW = max(1, int(os.environ.get("MUSIC_PREFETCH_WINDOW", "3")))
+# Máximo de canciones importadas de una playlist/álbum de Spotify
+MAX_IMPORT_TRACKS = int(os.environ.get("MUSIC_MAX_IMPORT", "2000"))
+IMPORT_BATCH = 100
+
+# Caché persistente de búsquedas de pistas
+TRACK_CACHE_MAX_ENTRIES = int(os.environ.get("TRACK_CACHE_MAX_ENTRIES", "2000"))
+TRACK_CACHE_TTL = int(os.environ.get("TRACK_CACHE_TTL", str(3 * 24 * 3600)))
+TRACK_CACHE_NEGATIVE_TTL = int(os.environ.get("TRACK_CACHE_NEGATIVE_TTL", "600"))
+# Pistas guardadas por entrada (playlists largas se recortan)
+TRACK_CACHE_MAX_TRACKS = 100
+# Caché persistente de letras
+LYRICS_CACHE_MAX_ENTRIES = int(os.environ.get("LYRICS_CACHE_MAX_ENTRIES", "1000"))
+LYRICS_CACHE_TTL = int(os.environ.get("LYRICS_CACHE_TTL", str(14 * 24 * 3600)))
+LYRICS_CACHE_NEGATIVE_TTL = int(os.environ.get("LYRICS_CACHE_NEGATIVE_TTL", "1800"))
+# Proveedores de búsqueda por texto, en orden de prioridad
+SEARCH_PROVIDERS = ["ytmsearch", "ytsearch", "scsearch"]
+# sequential | hedged | race
+RESOLVER_MODE = os.environ.get("MUSIC_RESOLVER_MODE", "hedged").lower()
+if RESOLVER_MODE not in {"sequential", "hedged", "race"}:
+    RESOLVER_MODE = "hedged"
+RACE_PROVIDERS = [p.strip() for p in os.environ.get("MUSIC_RACE_PROVIDERS", "ytmsearch,ytsearch").split(",") if p.strip()]
+YOUTUBE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+# Antelación con la que se deja lista la siguiente canción antes de que acabe la actual (segundos)
+PRELOAD_LEAD = float(os.environ.get("MUSIC_PRELOAD_LEAD", "20"))
+# Silencio entre canciones a partir del cual se cuenta como hueco lento (ms)
+SLOW_GAP_MS = 1000
+
+# Canciones por página de #queue y tiempo que los botones siguen activos (segundos)
+QUEUE_PAGE_SIZE = 10
+QUEUE_VIEW_TIMEOUT = 180
+
+# Mensaje de "sonando ahora": mínimo entre ediciones (segundos) y tramos de la barra de progreso
+NOWPLAYING_EDIT_INTERVAL = float(os.environ.get("MUSIC_NOWPLAYING_INTERVAL", "10"))
+NOWPLAYING_BAR_SEGMENTS = 12
+
+# Omitir al añadir canciones que ya están en la cola (cada servidor lo cambia con #dedupe)
+DEDUPE_DEFAULT = os.environ.get("MUSIC_DEDUPE", "false").lower() == "true"
+
+# Guardar la cola como QueuedTrack (pista codificada + campos visibles) en vez de Playable
+COMPACT_QUEUE = os.environ.get("MUSIC_COMPACT_QUEUE", "true").lower() == "true"
+# Canciones ya sonadas que conserva el historial de la cola
+QUEUE_HISTORY_MAX = 100
+
+# Tiempo con el canal vacío antes de desconectar (segundos)
+EMPTY_CHANNEL_TIMEOUT = 300
+
+# Cada cuánto se sondean los nodos de Lavalink y cuánto se espera su respuesta (segundos)
+NODE_HEALTH_INTERVAL = float(os.environ.get("LAVALINK_HEALTH_INTERVAL", "10"))
+NODE_STATS_TIMEOUT = 5.0
+# Versión de wavelink con la que se probó la migración entre nodos: _migrate_player usa miembros
+# privados (Player._node, Node._players, _dispatch_voice_update, _last_position, _destroy_player)
+WAVELINK_FAILOVER_VERSION = "3.4.1"
+# Segundos que Lavalink conserva los reproductores de una sesión cortada, a la espera de reanudarla
+LAVALINK_RESUME_TIMEOUT = int(os.environ.get("LAVALINK_RESUME_TIMEOUT", "60"))
+
+# Estado de los reproductores guardado para recuperarlo tras un reinicio
+PLAYER_SNAPSHOT_INTERVAL = float(os.environ.get("MUSIC_SNAPSHOT_INTERVAL", "15"))
+PLAYER_SNAPSHOT_TTL = int(os.environ.get("MUSIC_SNAPSHOT_TTL", str(6 * 3600)))
+PLAYER_SNAPSHOT_SAVE_DELAY = 5
+# Pistas por petición a /v4/decodetracks
+DECODE_BATCH = 500
+
+
+def _youtube_video_id(url: str) -> str | None:
+    """Extrae el ID de un video de YouTube (watch, youtu.be, shorts) si la URL apunta a uno solo"""
+    try:
+        parsed = urllib.parse.urlparse(url)
+    except Exception:
+        return None
+    host = parsed.netloc.lower().split(":")[0]
+    qs = urllib.parse.parse_qs(parsed.query)
+    # Las URLs con lista (salvo "LM", que se descarta) son playlists
+    lst = qs.get("list", [""])[0]
+    if lst and lst.upper() != "LM":
+        return None
+    vid = None
+    if host == "youtu.be":
+        vid = parsed.path.lstrip("/").split("/")[0]
+    elif host.endswith("youtube.com"):
+        if parsed.path == "/watch":
+            vid = qs.get("v", [None])[0]
+        elif parsed.path.startswith("/shorts/"):
+            vid = parsed.path.split("/")[2]
+    if vid and YOUTUBE_ID_RE.match(vid):
+        return vid
+    return None
+
+
+def _wavelink_failover_supported() -> bool:
+    """La versión instalada de wavelink es la probada y conserva los miembros privados de la migración"""
+    if wavelink.__version__ != WAVELINK_FAILOVER_VERSION:
+        return False
+    return hasattr(wavelink.Player, "_dispatch_voice_update") and hasattr(wavelink.Node, "_destroy_player")
+
+
+def _track_cache_key(query: str) -> str:
+    q = query.strip()
+    if q.startswith("http"):
+        vid = _youtube_video_id(q)
+        if vid:
+            return f"yt:{vid}"
+        return f"url:{q}"
+    return "q:" + " ".join(q.casefold().split())
+
+
+class PendingTrack:
+    """Entrada de la cola todavía sin resolver en Lavalink (p. ej. una canción de Spotify)"""
+
+    __slots__ = ("title", "author", "source_id", "task")
+
+    def __init__(self, title: str, author: str, source_id: str | None = None):
+        self.title = title
+        self.author = author
+        self.source_id = source_id
+        self.task: asyncio.Task | None = None
+
+    @property
+    def query(self) -> str:
+        return f"{self.title} {self.author}".strip()
+
+    def __repr__(self) -> str:
+        return f"PendingTrack(title={self.title!r}, author={self.author!r})"
+
+
+class QueuedTrack:
+    """Pista ya resuelta guardada en la cola en forma compacta.
+
+    Solo conserva la pista codificada y los campos que se muestran o sirven para comparar;
+    el ``wavelink.Playable`` se construye con ``playable()`` cuando va a sonar.
+    """
+
+    __slots__ = ("encoded", "identifier", "title", "author", "length", "uri", "source", "is_stream")
+
+    def __init__(self, encoded: str, identifier: str, title: str, author: str, length: int,
+                 uri: str | None, source: str, is_stream: bool):
+        self.encoded = encoded
+        self.identifier = identifier
+        self.title = title
+        self.author = author
+        self.length = length
+        self.uri = uri
+        self.source = source
+        self.is_stream = is_stream
+
+    @classmethod
+    def from_playable(cls, track: wavelink.Playable) -> "QueuedTrack":
+        # Autores y fuentes se repiten mucho en colas largas: se comparte una sola copia
+        return cls(track.encoded, track.identifier, track.title, sys.intern(track.author), track.length,
+                   track.uri, sys.intern(track.source), track.is_stream)
+
+    def playable(self) -> wavelink.Playable:
+        """Playable equivalente (sin los datos de plugins ni la carátula, que el bot no usa)"""
+        return wavelink.Playable({
+            "encoded": self.encoded,
+            "info": {
+                "identifier": self.identifier, "isSeekable": not self.is_stream, "author": self.author,
+                "length": self.length, "isStream": self.is_stream, "position": 0, "title": self.title,
+                "uri": self.uri, "sourceName": self.source,
+            },
+            "pluginInfo": {},
+        })
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (QueuedTrack, wavelink.Playable)):
+            return self.encoded == other.encoded
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.encoded)
+
+    def __repr__(self) -> str:
+        return f"QueuedTrack(title={self.title!r}, identifier={self.identifier!r})"
+
+
+class TrackHistory(wavelink.Queue):
+    """Historial acotado de la cola. wavelink añade cada canción que suena y nunca lo vacía;
+    el bot no lo consulta, así que basta con las últimas QUEUE_HISTORY_MAX en forma compacta."""
+
+    def __init__(self):
+        super().__init__(history=False)
+
+    @staticmethod
+    def _check_compatibility(item: object) -> bool:
+        if not isinstance(item, (wavelink.Playable, QueuedTrack)):
+            raise TypeError("El historial solo admite Playable o QueuedTrack.")
+        return True
+
+    def put(self, item, /, *, atomic: bool = True) -> int:
+        items = item if isinstance(item, list) else [item]
+        self._check_atomic(items)
+        self._items.extend(QueuedTrack.from_playable(t) if isinstance(t, wavelink.Playable) else t for t in items)
+        del self._items[:-QUEUE_HISTORY_MAX]
+        return len(items)
+
+
+class MusicQueue(wavelink.Queue):
+    """Cola del reproductor que además admite entradas PendingTrack.
+
+    Las ediciones (quitar, mover, mezclar) se hacen en sitio sobre la lista interna en
+    una sola operación síncrona: no ceden el event loop, así que on_wavelink_track_end
+    nunca ve la cola a medio reconstruir.
+
+    ``version`` aumenta con cada cambio, para invalidar lo que se haya calculado a partir
+    de la cola (p. ej. las páginas de #queue). El índice de identificadores para descartar
+    duplicados se mantiene en las operaciones habituales y se reconstruye tras las demás.
+
+    Con ``compact`` los Playable que entran se guardan como QueuedTrack.
+    """
+
+    def __init__(self, *, history: bool = True, compact: bool = COMPACT_QUEUE):
+        super().__init__(history=False)
+        self._history = TrackHistory() if history else None
+        self.compact = compact
+        self.version = 0
+        self._index: Counter[str] | None = Counter()
+
+    def _pack(self, item):
+        if self.compact and isinstance(item, wavelink.Playable):
+            return QueuedTrack.from_playable(item)
+        return item
+
+    @staticmethod
+    def track_key(item) -> str:
+        """Identidad de una entrada para detectar duplicados"""
+        if isinstance(item, PendingTrack):
+            return f"spotify:{item.source_id}" if item.source_id else f"q:{item.query.casefold()}"
+        return item.uri or f"{item.source}:{item.identifier}"
+
+    def _get_index(self) -> Counter[str]:
+        if self._index is None:
+            self._index = Counter(self.track_key(i) for i in self._items)
+        return self._index
+
+    def _unindex(self, items):
+        if self._index is not None:
+            for item in items:
+                key = self.track_key(item)
+                self._index[key] -= 1
+                if self._index[key] <= 0:
+                    del self._index[key]
+
+    def _changed(self, reindex: bool = False):
+        self.version += 1
+        if reindex:
+            self._index = None
+
+    def has(self, item) -> bool:
+        """Si ya hay en la cola una entrada con la misma identidad (O(1))"""
+        return self.track_key(item) in self._get_index()
+
+    def __setitem__(self, index, value):
+        self._changed(reindex=True)
+        if isinstance(index, slice):
+            value = [self._pack(v) for v in value]
+        else:
+            value = self._pack(value)
+        super().__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self._changed(reindex=True)
+        super().__delitem__(index)
+
+    def get(self):
+        # En los modos de repetición de wavelink get() no siempre saca la entrada
+        normal = self.mode is wavelink.QueueMode.normal
+        item = super().get()
+        self._changed(reindex=not normal)
+        if normal:
+            self._unindex([item])
+        return item
+
+    def get_at(self, index: int, /):
+        self._changed(reindex=True)
+        return super().get_at(index)
+
+    def put_at(self, index: int, value, /):
+        self._changed(reindex=True)
+        super().put_at(index, self._pack(value))
+
+    def _pack_many(self, item):
+        if isinstance(item, (list, wavelink.Playlist)):
+            return [self._pack(i) for i in item]
+        return self._pack(item)
+
+    def put(self, item, /, *, atomic: bool = True) -> int:
+        self._changed(reindex=True)
+        return super().put(self._pack_many(item), atomic=atomic)
+
+    async def put_wait(self, item, /, *, atomic: bool = True) -> int:
+        # Sin atomic la inserción cede el loop entre pistas: se marca al empezar y al acabar
+        self._changed(reindex=True)
+        try:
+            return await super().put_wait(self._pack_many(item), atomic=atomic)
+        finally:
+            self._changed(reindex=True)
+
+    def extend(self, items: list, *, dedupe: bool = False) -> tuple[list, int]:
+        """Añade un lote en una sola operación. Con ``dedupe`` se omiten las entradas que ya
+        están en la cola o repetidas dentro del lote. Devuelve (añadidas, omitidas)."""
+        self._check_atomic(items)
+        items = [self._pack(i) for i in items]
+        index = self._get_index()
+        if dedupe:
+            added = []
+            for item in items:
+                key = self.track_key(item)
+                if key not in index:
+                    index[key] = 1
+                    added.append(item)
+        else:
+            added = list(items)
+            index.update(self.track_key(i) for i in added)
+        if added:
+            self._items.extend(added)
+            self._changed()
+            self._wakeup_next()
+        return added, len(items) - len(added)
+
+    def delete(self, index: int, /):
+        self._changed(reindex=True)
+        super().delete(index)
+
+    def swap(self, first: int, second: int, /):
+        self._changed()
+        super().swap(first, second)
+
+    def shuffle(self):
+        self._changed()
+        super().shuffle()
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+        self._index = Counter()
+
+    def reset(self):
+        super().reset()
+        self.version += 1
+        self._index = Counter()
+
+    def remove(self, item, /, count: int | None = 1) -> int:
+        self._changed(reindex=True)
+        return super().remove(item, count)
+
+    @staticmethod
+    def _check_compatibility(item: object) -> bool:
+        if not isinstance(item, (wavelink.Playable, QueuedTrack, PendingTrack)):
+            raise TypeError("Esta cola solo admite Playable, QueuedTrack o PendingTrack.")
+        return True
+
+    def replace(self, index: int, old, new) -> bool:
+        """Sustituye la entrada en ``index`` solo si sigue siendo ``old``"""
+        if index < len(self._items) and self._items[index] is old:
+            new = self._pack(new)
+            self._items[index] = new
+            self._unindex([old])
+            if self._index is not None:
+                self._index[self.track_key(new)] += 1
+            self._changed()
+            return True
+        return False
+
+    def remove_at(self, index: int):
+        """Quita y devuelve la entrada en la posición indicada (base 0)"""
+        item = self._items.pop(index)
+        self._unindex([item])
+        self._changed()
+        return item
+
+    def remove_range(self, start: int, stop: int) -> list:
+        """Quita y devuelve las entradas en [start, stop) (base 0)"""
+        removed = self._items[start:stop]
+        del self._items[start:stop]
+        self._unindex(removed)
+        self._changed()
+        return removed
+
+    def move(self, src: int, dst: int):
+        """Mueve la entrada de src a dst (base 0) y la devuelve"""
+        if not (0 <= src < len(self._items)) or not (0 <= dst < len(self._items)):
+            raise IndexError("Posición fuera de la cola")
+        item = self._items.pop(src)
+        self._items.insert(dst, item)
+        self._changed()
+        return item
+
+
+class QueuePageModal(discord.ui.Modal, title="Ir a la página"):
+    page = discord.ui.TextInput(label="Página", placeholder="Número de página", max_length=7)
+
+    def __init__(self, queue_view: "QueueView"):
+        super().__init__()
+        self.queue_view = queue_view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            page = int(str(self.page.value).strip()) - 1
+        except ValueError:
+            await interaction.response.send_message("❌ Escribe un número de página.", ephemeral=True)
+            return
+        self.queue_view.page = page
+        await self.queue_view.refresh(interaction)
+
+
+class QueueView(discord.ui.View):
+    """Vista paginada de la cola.
+
+    Solo se formatea la página visible, a partir de su índice en la lista interna, así que
+    el coste por página no depende del tamaño de la cola. Las páginas ya formateadas se
+    reutilizan mientras ``MusicQueue.version`` no cambie.
+    """
+
+    def __init__(self, cog: "Music", player: wavelink.Player, author_id: int):
+        super().__init__(timeout=QUEUE_VIEW_TIMEOUT)
+        self.cog = cog
+        self.player = player
+        self.author_id = author_id
+        self.page = 0
+        self.message: discord.Message | None = None
+        self._version = -1
+        self._pages: dict[int, str] = {}
+
+    @property
+    def page_count(self) -> int:
+        return max(1, -(-len(self.player.queue) // QUEUE_PAGE_SIZE))
+
+    def _render_page(self, page: int) -> str:
+        queue = self.player.queue
+        version = getattr(queue, "version", None)
+        if version != self._version:
+            self._pages.clear()
+            self._version = version
+        text = self._pages.get(page)
+        if text is None:
+            start = page * QUEUE_PAGE_SIZE
+            lines = []
+            for i, item in enumerate(queue[start:start + QUEUE_PAGE_SIZE], start=start + 1):
+                title = item.title if len(item.title) <= 80 else item.title[:79] + "…"
+                if isinstance(item, PendingTrack):
+                    lines.append(f"{i}. {title} — {item.author}")
+                else:
+                    lines.append(f"{i}. {title} `{self.cog._duration(item.length)}`")
+            text = "\n".join(lines)
+            if version is not None:
+                self._pages[page] = text
+        return text
+
+    def render(self) -> discord.Embed:
+        self.page = min(max(0, self.page), self.page_count - 1)
+        current = self.player.current
+        header = f"▶️ Sonando: **{current.title}**\n\n" if current else ""
+        emb = self.cog._embed("Cola", f"{header}🎶 Lista:\n{self._render_page(self.page) or '📭 Vacía'}",
+                              discord.Color.teal())
+        emb.set_footer(text=f"Página {self.page + 1}/{self.page_count} · {len(self.player.queue)} canciones")
+        last = self.page_count - 1
+        self.first_page.disabled = self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.last_page.disabled = self.page >= last
+        return emb
+
+    async def refresh(self, interaction: discord.Interaction):
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("❌ Solo quien pidió la cola puede moverla.", ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        for item in self.children:
+            item.disabled = True
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = 0
+        await self.refresh(interaction)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.primary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        await self.refresh(interaction)
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.primary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await self.refresh(interaction)
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = self.page_count - 1
+        await self.refresh(interaction)
+
+    @discord.ui.button(label="Ir a…", style=discord.ButtonStyle.secondary)
+    async def jump(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(QueuePageModal(self))
+
+
+class NowPlayingBoard:
+    """Mensaje persistente de "sonando ahora" de un servidor"""
+
+    __slots__ = ("channel", "message", "signature", "last_edit", "edits", "dropped")
+
+    def __init__(self, channel: discord.abc.Messageable):
+        self.channel = channel
+        self.message: discord.Message | None = None
+        self.signature: tuple | None = None
+        self.last_edit = 0.0
+        self.edits = 0
+        self.dropped = 0
+
+
+class GapStats:
+    """Silencio entre el final de una canción y el inicio de la siguiente en un servidor"""
+
+    __slots__ = ("count", "total_ms", "max_ms", "last_ms", "slow")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        self.slow = 0
+
+    def record(self, ms: float):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.last_ms = ms
+        self.slow += int(ms >= SLOW_GAP_MS)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 1),
+            "last_ms": round(self.last_ms, 1),
+            "slow": self.slow,
+        }
+
+
+def _lyrics_key(artist: str, title: str) -> str:
+    norm = lambda s: " ".join(unaccent(s).casefold().split())
+    return f"at:{norm(artist)}|{norm(title)}"
 
 
 def _lavalink_config() -> tuple[str, str]:
@@ -26,19 +588,71 @@ def _lavalink_config() -> tuple[str, str]:
     return uri, password
 
 
+def _lavalink_nodes() -> list[tuple[str, str, str]]:
+    """(identificador, uri, contraseña) de cada nodo.
+
+    ``LAVALINK_NODES`` admite una lista JSON: ``[{"identifier": "eu", "uri": "http://host:2333",
+    "password": "..."}, ...]``. Sin ella se usa el nodo único de ``LAVALINK_HOST``/``LAVALINK_PORT``.
+    """
+    raw = os.environ.get("LAVALINK_NODES", "").strip()
+    if not raw:
+        uri, password = _lavalink_config()
+        return [("main", uri, password)]
+    nodes = []
+    for i, item in enumerate(json.loads(raw), start=1):
+        nodes.append((item.get("identifier") or f"node-{i}", item["uri"].rstrip("/"), item.get("password", "")))
+    return nodes
+
+
 class Music(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.loop_mode: dict[int, str] = {}
-        self.spotify = None
+        self.spotify: SpotifyClient | None = None
         self.stop_guard = set()
-        self.empty_channel_tasks: dict[int, asyncio.Task] = {}  # Tareas de desconexión por inactividad
+        self.import_tasks: dict[int, list[asyncio.Task]] = {}  # Importaciones de Spotify en segundo plano
+        self.first_audio_ms: dict[int, float] = {}  # Último tiempo hasta el primer audio por servidor
+        self.gap_started: dict[int, float] = {}  # Fin de la última canción, mientras llega la siguiente
+        self.gaps: dict[int, GapStats] = {}
+        self.np_boards: dict[int, NowPlayingBoard] = {}
+        self.dedupe_policy: dict[int, bool] = {}  # Política de duplicados por servidor (por defecto DEDUPE_DEFAULT)
+        self.lyrics_engine = LyricsEngine()
+        self.oembed = OEmbedService(bot.http_client)  # Metadatos de YouTube compartidos por búsqueda y letras
+        self.lyrics_cache = PersistentLRU(cache_path("lyrics.json"), LYRICS_CACHE_MAX_ENTRIES, LYRICS_CACHE_TTL)
+        self.resolver = HedgedResolver(SEARCH_PROVIDERS, RESOLVER_MODE, RACE_PROVIDERS)
+        self.track_cache = PersistentLRU(cache_path("tracks.json"), TRACK_CACHE_MAX_ENTRIES, TRACK_CACHE_TTL)
+        self.node_balancer = NodeBalancer()
+        self.node_tasks: dict[str, asyncio.Task] = {}  # Conexiones de nodos en curso
+        self.node_monitor: asyncio.Task | None = None
+        self.failover_supported = _wavelink_failover_supported()
+        if not self.failover_supported:
+            print(f"[WARNING] wavelink {wavelink.__version__} no es la versión probada ({WAVELINK_FAILOVER_VERSION}): "
+                  "los reproductores no se moverán de un nodo caído")
+        # Instantáneas por servidor ("g:<id>") y sesiones de Lavalink por nodo ("node:<id>")
+        self.player_snapshots = PersistentLRU(cache_path("players.json"), 1000, PLAYER_SNAPSHOT_TTL,
+                                              save_delay=PLAYER_SNAPSHOT_SAVE_DELAY)
+        self.snapshotted: set[int] = set()  # Servidores con instantánea vigente
+        self.resumed_nodes: set[str] = set()
+        self.restore_task: asyncio.Task | None = None
+        self.snapshot_task: asyncio.Task | None = None
         cid = os.environ.get("SPOTIFY_CLIENT_ID")
         secret = os.environ.get("SPOTIFY_CLIENT_SECRET")
-        if spotipy and cid and secret:
-            self.spotify = spotipy.Spotify(
-                auth_manager=SpotifyClientCredentials(client_id=cid, client_secret=secret)
-            )
+        if cid and secret:
+            self.spotify = SpotifyClient(cid, secret, http=bot.http_client)
+
+    async def cog_unload(self):
+        for task in (self.node_monitor, self.restore_task, self.snapshot_task):
+            if task:
+                task.cancel()
+        for task in self.node_tasks.values():
+            task.cancel()
+        # Al apagar el bot los reproductores siguen conectados: última instantánea antes de salir
+        self._save_snapshots(prune=False)
+        await self.player_snapshots.flush()
+        await self.track_cache.flush()
+        await self.lyrics_cache.flush()
+        if self.spotify:
+            await self.spotify.close()
 
     def _to_tracks(self, obj) -> list[wavelink.Playable]:
         try:
@@ -58,22 +672,281 @@ class Music(commands.Cog):
 
     @commands.Cog.listener()
     async def on_ready(self):
-        # Conecta a Lavalink si no hay nodos conectados
-        need_connect = True
+        if self.node_monitor is None or self.node_monitor.done():
+            self.node_monitor = asyncio.create_task(self._monitor_nodes())
+        # Conecta los nodos que aún no estén en el Pool (on_ready puede repetirse). Cada nodo va
+        # en su propia tarea: uno inaccesible sigue reintentando sin bloquear a los demás
+        for identifier, uri, password in _lavalink_nodes():
+            if identifier in wavelink.Pool.nodes:
+                continue
+            task = self.node_tasks.get(identifier)
+            if task and not task.done():
+                continue
+            node = wavelink.Node(identifier=identifier, uri=uri, password=password,
+                                 resume_timeout=LAVALINK_RESUME_TIMEOUT)
+            # Si la sesión anterior sigue viva en Lavalink, se reanuda en lugar de empezar otra
+            node._session_id = self.player_snapshots.get(f"node:{identifier}")
+            self.node_tasks[identifier] = asyncio.create_task(wavelink.Pool.connect(nodes=[node], client=self.bot))
+
+    def _connected_nodes(self) -> dict[str, wavelink.Node]:
+        return {i: n for i, n in wavelink.Pool.nodes.items() if n.status == wavelink.NodeStatus.CONNECTED}
+
+    def _best_node(self, exclude: set[str] | None = None) -> wavelink.Node | None:
+        return self.node_balancer.best(self._connected_nodes(), exclude)
+
+    async def _probe_node(self, node: wavelink.Node):
+        """Actualiza la carga y el ping de un nodo; sin conexión o sin respuesta cuenta como fallo"""
+        if node.status != wavelink.NodeStatus.CONNECTED:
+            self.node_balancer.fail(node.identifier)
+            return
+        start = time.monotonic()
         try:
-            nodes_map = getattr(wavelink.Pool, "nodes", {})
-            if nodes_map:
-                # Si todos los nodos no están conectados, necesitamos conectar
-                need_connect = all(getattr(n, "status", None) != wavelink.NodeStatus.CONNECTED for n in nodes_map.values())
-            else:
-                need_connect = True
+            stats = await asyncio.wait_for(node.fetch_stats(), NODE_STATS_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
         except Exception:
-            need_connect = True
+            self.node_balancer.fail(node.identifier)
+            return
+        self.node_balancer.update(node.identifier, stats, time.monotonic() - start)
+
+    async def _monitor_nodes(self):
+        """Sondea los nodos periódicamente y saca a los reproductores de los nodos caídos"""
+        while True:
+            await asyncio.sleep(NODE_HEALTH_INTERVAL)
+            try:
+                await asyncio.gather(*(self._probe_node(n) for n in wavelink.Pool.nodes.values()))
+                await self._failover()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error vigilando los nodos de Lavalink: {e}")
 
-        if need_connect:
-            uri, password = _lavalink_config()
-            nodes = [wavelink.Node(uri=uri, password=password)]
-            await wavelink.Pool.connect(nodes=nodes, client=self.bot)
+    async def _failover(self):
+        for player in list(self.bot.voice_clients):
+            if not isinstance(player, wavelink.Player) or not player.guild:
+                continue
+            node = player.node
+            if node.status == wavelink.NodeStatus.CONNECTED and self.node_balancer.healthy(node.identifier):
+                continue
+            target = self._best_node(exclude={node.identifier})
+            if target is None:
+                # No hay nodo sano al que ir; se reintenta en la siguiente vuelta
+                continue
+            await self._migrate_player(player, target)
+
+    async def _migrate_player(self, player: wavelink.Player, target: wavelink.Node) -> bool:
+        """Mueve un reproductor a otro nodo sin salir del canal de voz.
+
+        Conserva la pista actual, la posición, la pausa, el volumen y la cola (que vive en el
+        propio reproductor, igual que el modo de repetición en el cog).
+        """
+        if not self.failover_supported:
+            return False
+        guild_id = player.guild.id
+        # Última posición que informó el nodo: la estimada seguiría avanzando durante el corte
+        track, position = player.current, player._last_position
+        paused, volume = player.paused, player.volume
+        old = player.node
+        # wavelink no permite cambiar de nodo: se reasigna y se reenvía el estado de voz
+        # (sesión, token y endpoint siguen siendo válidos mientras el bot no salga del canal)
+        old._players.pop(guild_id, None)
+        player._node = target
+        target._players[guild_id] = player
+        try:
+            await player._dispatch_voice_update()
+            if track:
+                await player.play(track, start=position, paused=paused, volume=volume, add_history=False)
+        except Exception as e:
+            self.node_balancer.fail(target.identifier)
+            print(f"No se pudo mover el reproductor de {guild_id} a {target.identifier}: {e}")
+            return False
+        if old is not target and old.session_id:
+            # Si el nodo viejo sigue vivo a medias, que deje de enviar audio
+            asyncio.create_task(self._destroy_remote_player(old, guild_id))
+        print(f"Reproductor de {guild_id} movido de {old.identifier} a {target.identifier}")
+        return True
+
+    @commands.Cog.listener()
+    async def on_wavelink_node_ready(self, payload: wavelink.NodeReadyEventPayload):
+        node = payload.node
+        self.player_snapshots.put(f"node:{node.identifier}", payload.session_id)
+        if payload.resumed:
+            self.resumed_nodes.add(node.identifier)
+        if self.restore_task is None:
+            self.restore_task = asyncio.create_task(self._restore_players())
+        # Un nodo que vuelve con una sesión nueva ha perdido sus reproductores: se reconstruyen
+        if payload.resumed:
+            return
+        for player in list(payload.node.players.values()):
+            await self._migrate_player(player, self._best_node() or payload.node)
+
+    async def _destroy_remote_player(self, node: wavelink.Node, guild_id: int):
+        try:
+            await asyncio.wait_for(node._destroy_player(guild_id), NODE_STATS_TIMEOUT)
+        except Exception:
+            pass
+
+    def _snapshot(self, player: wavelink.Player) -> dict | None:
+        """Estado compacto de un reproductor: pistas codificadas (o título/autor si aún no se
+        resolvieron), posición, pausa, volumen y modo de repetición"""
+        current = player.current
+        if current is None and player.queue.is_empty:
+            return None
+        queue = []
+        for item in player.queue:
+            if isinstance(item, PendingTrack):
+                queue.append([item.title, item.author, item.source_id])
+            else:
+                queue.append(item.encoded)
+        return {
+            "channel": player.channel.id,
+            "node": player.node.identifier,
+            "loop": self.loop_mode.get(player.guild.id, "off"),
+            "current": current.encoded if current else None,
+            "position": player.position,
+            "paused": player.paused,
+            "volume": player.volume,
+            "queue": queue,
+        }
+
+    def _forget_snapshot(self, guild_id: int):
+        self.snapshotted.discard(guild_id)
+        self.player_snapshots.pop(f"g:{guild_id}", None)
+
+    def _save_snapshots(self, prune: bool = True):
+        """Guarda la instantánea de cada reproductor; con ``prune`` borra las de servidores
+        donde el bot ya no suena. La escritura a disco va agrupada y fuera del event loop."""
+        active: set[int] = set()
+        for player in list(self.bot.voice_clients):
+            if not isinstance(player, wavelink.Player) or not player.guild or not player.channel:
+                continue
+            snap = self._snapshot(player)
+            if snap is None:
+                continue
+            gid = player.guild.id
+            active.add(gid)
+            key = f"g:{gid}"
+            if self.player_snapshots.get(key) != snap:
+                self.player_snapshots.put(key, snap)
+        if prune:
+            for gid in self.snapshotted - active:
+                self.player_snapshots.pop(f"g:{gid}", None)
+            self.snapshotted = active
+        else:
+            self.snapshotted |= active
+
+    async def _snapshot_loop(self):
+        while True:
+            await asyncio.sleep(PLAYER_SNAPSHOT_INTERVAL)
+            try:
+                self._save_snapshots()
+            except Exception as e:
+                print(f"Error guardando el estado de los reproductores: {e}")
+
+    async def _decode_tracks(self, node: wavelink.Node, encoded: list[str]) -> list[wavelink.Playable | None]:
+        """Decodifica pistas en bloque con /v4/decodetracks, sin volver a buscarlas.
+
+        Devuelve una lista alineada con ``encoded``; un bloque que falla queda como None.
+        """
+        tracks: list[wavelink.Playable | None] = []
+        for i in range(0, len(encoded), DECODE_BATCH):
+            batch = encoded[i:i + DECODE_BATCH]
+            try:
+                data = await node.send("POST", path="v4/decodetracks", data=batch)
+                decoded = [wavelink.Playable(d) for d in data]
+            except Exception as e:
+                print(f"[WARNING] No se pudieron decodificar {len(batch)} pistas: {e}")
+                decoded = []
+            tracks.extend(decoded if len(decoded) == len(batch) else [None] * len(batch))
+        return tracks
+
+    async def _restore_players(self):
+        """Reconstruye los reproductores guardados antes del último reinicio"""
+        # Un momento para que el resto de nodos termine de conectar (y quizá de reanudar)
+        pending = [t for t in self.node_tasks.values() if not t.done()]
+        if pending:
+            await asyncio.wait(pending, timeout=NODE_STATS_TIMEOUT)
+        try:
+            for key in self.player_snapshots.keys("g:"):
+                snap = self.player_snapshots.get(key)
+                gid = int(key[2:])
+                try:
+                    if snap and await self._restore_player(gid, snap):
+                        self.snapshotted.add(gid)
+                        continue
+                except Exception as e:
+                    print(f"No se pudo restaurar el reproductor de {gid}: {e}")
+                self.player_snapshots.pop(key, None)
+            await self._drop_orphan_players()
+        finally:
+            self.snapshot_task = asyncio.create_task(self._snapshot_loop())
+
+    async def _restore_player(self, guild_id: int, snap: dict) -> bool:
+        guild = self.bot.get_guild(guild_id)
+        channel = guild.get_channel(snap["channel"]) if guild else None
+        if channel is None or guild.voice_client or not (snap["current"] or snap["queue"]):
+            return False
+        # Preferir el nodo de antes si reanudó la sesión: allí el reproductor sigue vivo
+        node = wavelink.Pool.nodes.get(snap.get("node"))
+        remote, fetched = None, 0.0
+        if node and node.identifier in self.resumed_nodes and node.status == wavelink.NodeStatus.CONNECTED:
+            remote = await node.fetch_player_info(guild_id)
+            fetched = time.monotonic()
+        else:
+            node = self._best_node()
+        if node is None:
+            return False
+
+        encoded = [e for e in snap["queue"] if isinstance(e, str)]
+        if snap["current"]:
+            encoded.append(snap["current"])
+        decoded = iter(await self._decode_tracks(node, encoded))
+        queue = []
+        for entry in snap["queue"]:
+            item = next(decoded) if isinstance(entry, str) else PendingTrack(*entry)
+            if item is not None:
+                queue.append(item)
+        current = next(decoded) if snap["current"] else None
+        if current is None and not queue:
+            return False
+
+        player = await channel.connect(cls=wavelink.Player(nodes=[node]))  # type: ignore
+        player.queue = MusicQueue()
+        player.queue.put(queue)
+        self.loop_mode[guild_id] = snap.get("loop", "off")
+        position = snap.get("position", 0)
+        if remote and remote.track and current and remote.track.encoded == current.encoded:
+            # Sesión reanudada y Lavalink sigue con la misma pista: volver a enviarla la reiniciaría
+            # (TrackEnd "replaced"). Con replace=False solo se fija el estado local; la posición
+            # es la del nodo más lo que ha avanzado desde la consulta, para no oír un salto
+            position = remote.state.position
+            if not remote.paused:
+                position += int((time.monotonic() - fetched) * 1000)
+            await player.play(current, replace=False, start=position, paused=remote.paused,
+                              volume=remote.volume, add_history=False)
+        elif current:
+            await player.play(current, start=position, paused=snap.get("paused", False),
+                              volume=snap.get("volume", 100), add_history=False)
+        elif not await self._play_next(player):
+            return False
+        self._prefetch(player)
+        self._check_empty_channel(player)
+        print(f"Reproductor de {guild_id} restaurado ({len(queue)} en cola)")
+        return True
+
+    async def _drop_orphan_players(self):
+        """En los nodos reanudados, destruye los reproductores que nadie ha recuperado"""
+        for identifier in self.resumed_nodes:
+            node = wavelink.Pool.nodes.get(identifier)
+            if node is None:
+                continue
+            try:
+                remote = await node.fetch_players()
+            except Exception:
+                continue
+            for info in remote:
+                if info.guild_id not in node.players:
+                    await self._destroy_remote_player(node, info.guild_id)
 
     def _duration(self, ms: int) -> str:
         s = ms // 1000
@@ -87,29 +960,34 @@ class Music(commands.Cog):
         emb = discord.Embed(title=title, description=description or discord.Embed.Empty, color=color or discord.Color.blurple())
         return emb
 
+    async def _reply(self, ctx: commands.Context, message: discord.Message | None, emb: discord.Embed) -> discord.Message:
+        """Edita el mensaje de progreso con el resultado final, o envía uno nuevo"""
+        if message:
+            try:
+                return await message.edit(content=None, embed=emb)
+            except discord.HTTPException:
+                pass
+        return await ctx.send(embed=emb)
+
+    def _cancel_import(self, guild_id: int):
+        for task in self.import_tasks.pop(guild_id, []):
+            task.cancel()
+
     def _cancel_empty_task(self, guild_id: int):
-        """Cancela la tarea de desconexión automática si existe"""
-        if guild_id in self.empty_channel_tasks:
-            self.empty_channel_tasks[guild_id].cancel()
-            del self.empty_channel_tasks[guild_id]
+        """Cancela la desconexión automática si está programada"""
+        self.bot.scheduler.cancel(("music-idle", guild_id))
 
     async def _auto_disconnect_if_empty(self, player: wavelink.Player, guild_id: int):
-        """Desconecta el bot después de 5 minutos si el canal está vacío"""
-        try:
-            await asyncio.sleep(300)  # 5 minutos = 300 segundos
-            # Verificar si el canal sigue vacío
-            if player.channel and len([m for m in player.channel.members if not m.bot]) == 0:
-                if player.queue and not player.queue.is_empty:
-                    player.queue.clear()
-                await player.stop()
-                await player.disconnect()
-                print(f"Bot desconectado automáticamente del servidor {guild_id} por inactividad")
-        except asyncio.CancelledError:
-            # La tarea fue cancelada porque alguien se unió al canal
-            pass
-        finally:
-            if guild_id in self.empty_channel_tasks:
-                del self.empty_channel_tasks[guild_id]
+        """Desconecta el bot si el canal sigue vacío (se programa a los 5 minutos)"""
+        if player.channel and len([m for m in player.channel.members if not m.bot]) == 0:
+            self._cancel_import(guild_id)
+            self._forget_snapshot(guild_id)
+            await self._np_close(guild_id, "💤 Desconectado por inactividad.")
+            if player.queue and not player.queue.is_empty:
+                player.queue.clear()
+            await player.stop()
+            await player.disconnect()
+            print(f"Bot desconectado automáticamente del servidor {guild_id} por inactividad")
 
     def _check_empty_channel(self, player: wavelink.Player):
         """Verifica si el canal está vacío y programa desconexión automática"""
@@ -121,10 +999,12 @@ class Music(commands.Cog):
         human_members = [m for m in player.channel.members if not m.bot]
         
         if len(human_members) == 0:
-            # Canal vacío, programar desconexión si no existe ya
-            if guild_id not in self.empty_channel_tasks:
-                task = asyncio.create_task(self._auto_disconnect_if_empty(player, guild_id))
-                self.empty_channel_tasks[guild_id] = task
+            # Canal vacío, programar desconexión si no existe ya. No se ejecuta al apagar
+            # el bot: el reproductor debe sobrevivir al reinicio
+            key = ("music-idle", guild_id)
+            if key not in self.bot.scheduler:
+                self.bot.scheduler.call_later(EMPTY_CHANNEL_TIMEOUT, self._auto_disconnect_if_empty,
+                                              player, guild_id, key=key, flush=False)
         else:
             # Hay gente en el canal, cancelar desconexión automática
             self._cancel_empty_task(guild_id)
@@ -142,11 +1022,40 @@ class Music(commands.Cog):
                 await ctx.send("❌ Debes estar en un canal de voz.")
                 return None
             channel = author.voice.channel
-            player = await channel.connect(cls=wavelink.Player)  # type: ignore
+            # El reproductor nuevo va al nodo con mejor puntuación
+            node = self._best_node()
+            player = await channel.connect(cls=wavelink.Player(nodes=[node]) if node else wavelink.Player)  # type: ignore
+            player.queue = MusicQueue()
             return player
         return None
 
     async def _search_tracks(self, query: str) -> list[wavelink.Playable]:
+        """Busca pistas pasando primero por la caché persistente"""
+        key = _track_cache_key(query)
+        found, payloads = self.track_cache.lookup(key)
+        if found:
+            if payloads is None:
+                return []
+            try:
+                return [wavelink.Playable(data) for data in payloads]
+            except Exception:
+                # Entrada con un formato que ya no entendemos: se descarta y se busca de nuevo
+                self.track_cache.pop(key, None)
+
+        try:
+            tracks = await self._lookup_tracks(query)
+        except SearchError as e:
+            # Fallo de los proveedores, no ausencia de resultados: no se guarda para reintentarlo
+            print(f"[WARNING] Búsqueda fallida para '{query}': {e}")
+            return []
+        if not tracks:
+            self.track_cache.put(key, None, ttl=TRACK_CACHE_NEGATIVE_TTL)
+        elif not any(getattr(t, "is_stream", False) for t in tracks):
+            # Los directos no se guardan: su contenido cambia
+            self.track_cache.put(key, [t.raw_data for t in tracks[:TRACK_CACHE_MAX_TRACKS]])
+        return tracks
+
+    async def _lookup_tracks(self, query: str) -> list[wavelink.Playable]:
         q = query.strip()
         # Si es URL, normalizamos dominios de YouTube Music y limpiamos 'list=LM'
         if q.startswith("http"):
@@ -165,93 +1074,376 @@ class Music(commands.Cog):
             except Exception:
                 q_norm = q
 
+            # Un paso que falla no equivale a "sin resultados": se anota para no cachear el vacío
+            failed: list[str] = []
+
+            async def attempt(label: str, coro) -> list[wavelink.Playable]:
+                try:
+                    return self._to_tracks(await coro)
+                except SearchError:
+                    failed.append(label)
+                    return []
+                except Exception as e:
+                    failed.append(f"{label}: {e}")
+                    return []
+
             # 1) Intento con Playable.search
-            results = await wavelink.Playable.search(q_norm)
-            tracks = self._to_tracks(results)
+            tracks = await attempt("search", wavelink.Playable.search(q_norm))
             if tracks:
                 return tracks
             # 2) Fallback con Pool.fetch_tracks (acepta URLs directamente)
-            try:
-                fetched = await wavelink.Pool.fetch_tracks(q_norm)
-                tracks = self._to_tracks(fetched)
-                if tracks:
-                    return tracks
-            except Exception:
-                pass
+            tracks = await attempt("fetch_tracks", wavelink.Pool.fetch_tracks(q_norm))
+            if tracks:
+                return tracks
             # Fallback: si aún no hay resultados y era URL de YouTube con watch, intenta sin parámetros extra
             try:
                 parsed = urllib.parse.urlparse(q_norm)
-                if parsed.path == "/watch":
-                    qs = urllib.parse.parse_qs(parsed.query)
-                    v = qs.get("v", [None])[0]
-                    if v:
-                        simple = f"https://www.youtube.com/watch?v={v}"
-                        res2 = await wavelink.Playable.search(simple)
-                        t2 = self._to_tracks(res2)
-                        if t2:
-                            return t2
-                        # Como último recurso, usa ytsearch con el ID
-                        res3 = await wavelink.Playable.search(f"ytsearch:{v}")
-                        t3 = self._to_tracks(res3)
-                        if t3:
-                            return t3
-                        # Extra: intenta obtener el título vía oEmbed y buscar por nombre
-                        try:
-                            async with aiohttp.ClientSession() as session:
-                                oembed = f"https://www.youtube.com/oembed?url={urllib.parse.quote(simple)}&format=json"
-                                async with session.get(oembed) as r:
-                                    if r.status == 200:
-                                        data = await r.json()
-                                        title = data.get("title")
-                                        if title:
-                                            for prov in ("ytmsearch", "ytsearch", "scsearch"):
-                                                res4 = await wavelink.Playable.search(f"{prov}:{title}")
-                                                if res4:
-                                                    return list(res4)
-                        except Exception:
-                            pass
-            except Exception:
-                pass
+                v = urllib.parse.parse_qs(parsed.query).get("v", [None])[0] if parsed.path == "/watch" else None
+            except ValueError:
+                v = None
+            if v:
+                simple = f"https://www.youtube.com/watch?v={v}"
+                t2 = await attempt("watch", wavelink.Playable.search(simple))
+                if t2:
+                    return t2
+                # Como último recurso, usa ytsearch con el ID
+                t3 = await attempt("ytsearch", wavelink.Playable.search(f"ytsearch:{v}"))
+                if t3:
+                    return t3
+                # Extra: intenta obtener el título vía oEmbed y buscar por nombre
+                try:
+                    meta = await self.oembed.fetch(v)
+                except Exception as e:
+                    failed.append(f"oembed: {e}")
+                    meta = None
+                if meta and meta["title"]:
+                    res4 = await attempt("oembed", self.resolver.resolve(meta["title"], self._provider_search))
+                    if res4:
+                        return res4
+            if failed:
+                raise SearchError(f"fallaron {', '.join(failed)}")
             return []
-        # No es URL: prueba varios proveedores en orden
-        for prov in ("ytmsearch", "ytsearch", "scsearch"):
-            results = await wavelink.Playable.search(f"{prov}:{q}")
-            tracks = self._to_tracks(results)
-            if tracks:
-                return tracks
+        # No es URL: consulta los proveedores según el modo del resolvedor (secuencial, cobertura o carrera)
+        return await self.resolver.resolve(q, self._provider_search)
+
+    async def _provider_search(self, provider: str, query: str) -> list[wavelink.Playable]:
+        # Pool.fetch_tracks respeta el prefijo; Playable.search le antepondría "ytmsearch:" otra vez
+        return self._to_tracks(await wavelink.Pool.fetch_tracks(f"{provider}:{query}"))
+
+    async def _resolve_ordered(self, queries: list[str]) -> AsyncIterator[tuple[int, list[wavelink.Playable]]]:
+        """Resuelve las consultas en paralelo (ventana acotada) y las entrega en el orden original"""
+        pending: deque[asyncio.Task] = deque()
+        it = iter(queries)
+
+        def _fill():
+            while len(pending) < RESOLVE_CONCURRENCY:
+                q = next(it, None)
+                if q is None:
+                    return
+                pending.append(asyncio.create_task(self._search_tracks(q)))
+
+        _fill()
+        index = 0
         try:
-            fetched = await wavelink.Pool.fetch_tracks(f"ytsearch:{q}")
-            tracks = self._to_tracks(fetched)
-            if tracks:
-                return tracks
-        except Exception:
-            pass
-        return []
+            while pending:
+                task = pending.popleft()
+                try:
+                    tracks = await task
+                except Exception:
+                    tracks = []
+                _fill()
+                yield index, tracks
+                index += 1
+        finally:
+            # Si el comando se interrumpe, no dejamos búsquedas huérfanas
+            for task in pending:
+                task.cancel()
 
-    async def _from_spotify(self, query: str) -> list[str]:
-        MAX_SPOTIFY_TRACKS = 20
-        if not self.spotify:
-            return [query]
+    async def _spotify_entries(self, query: str) -> AsyncIterator[PendingTrack]:
+        """Genera entradas pendientes de un enlace de Spotify; las páginas se piden bajo demanda"""
         if "open.spotify.com/track" in query:
             tid = query.split("/")[-1].split("?")[0]
-            tr = self.spotify.track(tid)
-            return [f"{tr['name']} {tr['artists'][0]['name']}"]
+            tr = await self.spotify.track(tid)
+            yield PendingTrack(tr["name"], tr["artists"][0]["name"], tr.get("id"))
+            return
         if "open.spotify.com/album" in query:
             aid = query.split("/")[-1].split("?")[0]
-            items = self.spotify.album_tracks(aid)["items"]
-            # Limitar a MAX_SPOTIFY_TRACKS
-            items = items[:MAX_SPOTIFY_TRACKS]
-            return [f"{it['name']} {it['artists'][0]['name']}" for it in items]
-        if "open.spotify.com/playlist" in query:
+            items = self.spotify.album_tracks(aid)
+        elif "open.spotify.com/playlist" in query:
             pid = query.split("/")[-1].split("?")[0]
-            items = self.spotify.playlist_tracks(pid)["items"]
-            out = []
-            for it in items[:MAX_SPOTIFY_TRACKS]:  # Limitar a MAX_SPOTIFY_TRACKS
-                tr = it.get("track")
-                if tr:
-                    out.append(f"{tr['name']} {tr['artists'][0]['name']}")
-            return out
-        return [query]
+            items = self.spotify.playlist_tracks(pid)
+        else:
+            return
+        try:
+            async for tr in items:
+                if tr.get("artists"):
+                    yield PendingTrack(tr["name"], tr["artists"][0]["name"], tr.get("id"))
+        finally:
+            await items.aclose()
+
+    async def _resolve_pending(self, entry: PendingTrack) -> wavelink.Playable | None:
+        tracks = await self._search_tracks(entry.query)
+        return tracks[0] if tracks else None
+
+    async def _materialize(self, item) -> wavelink.Playable | None:
+        """Convierte una entrada de la cola en algo reproducible (None si no se encontró)"""
+        if isinstance(item, QueuedTrack):
+            return item.playable()
+        if not isinstance(item, PendingTrack):
+            return item
+        if item.task is None:
+            item.task = asyncio.create_task(self._resolve_pending(item))
+        try:
+            return await item.task
+        except Exception:
+            return None
+
+    def _prefetch(self, player: wavelink.Player):
+        """Empieza a resolver las próximas PREFETCH_WINDOW entradas pendientes de la cola"""
+        if not player.queue:
+            return
+        for item in player.queue[:PREFETCH_WINDOW]:
+            if isinstance(item, PendingTrack) and item.task is None:
+                item.task = asyncio.create_task(self._resolve_pending(item))
+
+    def _np_signature(self, player: wavelink.Player) -> tuple:
+        """Lo que se ve en el mensaje; si no cambia, no hace falta editarlo. La posición solo
+        cuenta por tramos de la barra de progreso."""
+        queue = player.queue
+        nxt = queue[0].title if queue else None
+        t = player.current
+        if t is None:
+            return ("idle", len(queue), nxt)
+        step = t.length // NOWPLAYING_BAR_SEGMENTS if not t.is_stream else 0
+        segment = player.position // step if step else 0
+        return (t.identifier, t.title, player.paused, self.loop_mode.get(player.guild.id, "off"),
+                segment, len(queue), nxt)
+
+    def _np_embed(self, player: wavelink.Player) -> discord.Embed:
+        t = player.current
+        if t is None:
+            return self._embed("Sonando ahora", "⏹️ No hay nada sonando.", discord.Color.dark_grey())
+        if t.is_stream:
+            progress = "🔴 En directo"
+        else:
+            done = min(NOWPLAYING_BAR_SEGMENTS, player.position * NOWPLAYING_BAR_SEGMENTS // max(1, t.length))
+            bar = "▬" * done + "🔘" + "▬" * (NOWPLAYING_BAR_SEGMENTS - done)
+            progress = f"{bar} `{self._duration(player.position)} / {self._duration(t.length)}`"
+        emb = self._embed("Sonando ahora", f"🎵 **{t.title}** — {t.author}\n{progress}", discord.Color.green())
+        emb.add_field(name="Estado", value="⏸️ Pausado" if player.paused else "▶️ Sonando")
+        emb.add_field(name="Loop", value=self.loop_mode.get(player.guild.id, "off"))
+        emb.add_field(name="En cola", value=str(len(player.queue)))
+        if player.queue:
+            emb.add_field(name="Siguiente", value=player.queue[0].title, inline=False)
+        return emb
+
+    def _np_attach(self, guild_id: int, channel: discord.abc.Messageable, repost: bool = False) -> NowPlayingBoard:
+        """Asocia el mensaje de "sonando ahora" a un canal; con ``repost`` se vuelve a publicar abajo"""
+        board = self.np_boards.get(guild_id)
+        if board is None:
+            board = self.np_boards[guild_id] = NowPlayingBoard(channel)
+        elif repost or board.channel.id != channel.id:
+            if board.message:
+                asyncio.create_task(self._delete_quietly(board.message))
+            # Mensaje nuevo: no espera al intervalo, que solo limita las ediciones posteriores
+            self.bot.scheduler.cancel(("music-np", guild_id))
+            board.channel, board.message, board.signature = channel, None, None
+            board.last_edit = 0.0
+        return board
+
+    async def _delete_quietly(self, message: discord.Message):
+        try:
+            await message.delete()
+        except discord.HTTPException:
+            pass
+
+    def _np_request(self, player: wavelink.Player):
+        """Pide actualizar el mensaje. Las peticiones se agrupan: como mucho una edición cada
+        NOWPLAYING_EDIT_INTERVAL segundos, y ninguna si no cambia nada visible."""
+        if not player or not player.guild:
+            return
+        gid = player.guild.id
+        board = self.np_boards.get(gid)
+        if board is None:
+            return
+        key = ("music-np", gid)
+        if key in self.bot.scheduler:
+            return  # ya hay una edición pendiente: mostrará el estado más reciente
+        if self._np_signature(player) == board.signature:
+            board.dropped += 1
+            return
+        delay = max(0.0, board.last_edit + NOWPLAYING_EDIT_INTERVAL - time.monotonic())
+        self.bot.scheduler.call_later(delay, self._np_flush, player, key=key, flush=False)
+
+    async def _np_flush(self, player: wavelink.Player):
+        board = self.np_boards.get(player.guild.id) if player.guild else None
+        if board is None:
+            return
+        signature = self._np_signature(player)
+        if signature == board.signature:
+            board.dropped += 1
+            return
+        board.signature = signature
+        board.last_edit = time.monotonic()
+        emb = self._np_embed(player)
+        if board.message:
+            try:
+                await board.message.edit(embed=emb)
+                board.edits += 1
+                return
+            except discord.NotFound:
+                board.message = None
+            except discord.HTTPException:
+                board.signature = None  # se reintentará con el siguiente evento
+                return
+        try:
+            board.message = await board.channel.send(embed=emb)
+            board.edits += 1
+        except discord.HTTPException:
+            board.signature = None
+
+    async def _np_close(self, guild_id: int, text: str):
+        """Deja el mensaje con un estado final y deja de actualizarlo"""
+        self.bot.scheduler.cancel(("music-np", guild_id))
+        board = self.np_boards.pop(guild_id, None)
+        if board and board.message:
+            try:
+                await board.message.edit(embed=self._embed("Sonando ahora", text, discord.Color.dark_grey()))
+            except discord.HTTPException:
+                pass
+
+    def nowplaying_summary(self) -> dict[str, dict]:
+        return {str(gid): {"edits": b.edits, "dropped": b.dropped} for gid, b in self.np_boards.items()}
+
+    def _dedupe_enabled(self, guild_id: int) -> bool:
+        return self.dedupe_policy.get(guild_id, DEDUPE_DEFAULT)
+
+    def gap_summary(self) -> dict[str, dict]:
+        return {str(gid): g.as_dict() for gid, g in self.gaps.items()}
+
+    def _schedule_preload(self, player: wavelink.Player):
+        """Programa la preparación de la siguiente canción para PRELOAD_LEAD segundos antes del final"""
+        self._prefetch(player)
+        current = player.current
+        if not player.guild or current is None or current.is_stream:
+            return
+        remaining = max(0, current.length - player.position) / 1000
+        self.bot.scheduler.call_later(max(0.0, remaining - PRELOAD_LEAD), self._warm_next, player,
+                                      key=("music-preload", player.guild.id), flush=False)
+
+    async def _is_playable(self, track: wavelink.Playable) -> bool:
+        """Comprueba que Lavalink aún puede cargar la pista (vídeos borrados, privados o bloqueados
+        fallan). Ante errores de red se da por buena: no se descartan canciones por un fallo pasajero."""
+        if track.is_stream or not track.uri:
+            return True
+        try:
+            return bool(self._to_tracks(await wavelink.Pool.fetch_tracks(track.uri)))
+        except wavelink.LavalinkLoadException:
+            return False
+        except Exception:
+            return True
+
+    async def _warm_next(self, player: wavelink.Player):
+        """Deja la siguiente entrada de la cola resuelta y comprobada antes de que acabe la actual.
+
+        Una entrada muerta se sustituye por otra búsqueda del mismo título o se quita ya, en vez
+        de descubrirlo cuando debería empezar a sonar.
+        """
+        while player.connected and player.queue and not player.queue.is_empty:
+            item = player.queue[0]
+            track = await self._materialize(item)
+            if track is not None and await self._is_playable(track):
+                if isinstance(item, PendingTrack):
+                    player.queue.replace(0, item, track)
+                return
+            replacement = None
+            if isinstance(item, PendingTrack):
+                # El resultado guardado en caché ya no sirve
+                self.track_cache.pop(_track_cache_key(item.query), None)
+                query = item.query
+            else:
+                query = f"{item.title} {item.author}"
+            dead = track.identifier if track is not None else None
+            try:
+                candidates = await self._lookup_tracks(query)
+            except SearchError as e:
+                print(f"[WARNING] No se pudo buscar un sustituto para '{query}': {e}")
+                candidates = []
+            for candidate in candidates:
+                if candidate.identifier != dead:
+                    replacement = candidate
+                    break
+            if replacement is not None:
+                if player.queue.replace(0, item, replacement):
+                    print(f"[MUSIC] Sustituida una canción no disponible en {player.guild.id}: {query}")
+                return
+            if player.queue and player.queue[0] is item:
+                player.queue.remove_at(0)
+                print(f"[MUSIC] Quitada de la cola una canción no disponible en {player.guild.id}: {query}")
+
+    async def _play_next(self, player: wavelink.Player) -> bool:
+        """Reproduce la siguiente entrada de la cola saltando las que no se resuelven"""
+        while player.queue and not player.queue.is_empty:
+            track = await self._materialize(player.queue.get())
+            if track is None:
+                continue
+            # on_wavelink_track_start programa la preparación de la siguiente
+            await player.play(track)
+            return True
+        return False
+
+    async def _import_rest(self, player: wavelink.Player, entries: AsyncIterator[PendingTrack], already: int,
+                           message: discord.Message | None, emb: discord.Embed, after: asyncio.Task | None = None):
+        """Añade a la cola, por lotes y sin resolverlas, el resto de una importación de Spotify"""
+        gid = player.guild.id
+        added = 0
+        skipped = 0
+        batch: list[PendingTrack] = []
+
+        async def _flush():
+            nonlocal added, skipped, batch
+            if not batch or not player.connected:
+                return
+            new, dropped = player.queue.extend(batch, dedupe=self._dedupe_enabled(gid))
+            added += len(new)
+            skipped += dropped
+            batch = []
+            if not player.playing:
+                await self._play_next(player)
+            else:
+                self._schedule_preload(player)
+                self._np_request(player)
+
+        try:
+            if after:
+                # Una importación anterior sigue en curso: respetamos el orden de los comandos
+                await asyncio.wait([after])
+            async for entry in entries:
+                batch.append(entry)
+                if len(batch) >= IMPORT_BATCH:
+                    await _flush()
+                if already + added + skipped + len(batch) >= MAX_IMPORT_TRACKS or not player.connected:
+                    break
+            await _flush()
+        except (SpotifyError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"[WARNING] Spotify: {e}")
+            await _flush()
+        finally:
+            await entries.aclose()
+            tasks = self.import_tasks.get(gid, [])
+            if asyncio.current_task() in tasks:
+                tasks.remove(asyncio.current_task())
+            if not tasks:
+                self.import_tasks.pop(gid, None)
+        if message and (added or skipped):
+            if added:
+                emb.description = f"{emb.description}\n📥 {added} canciones más de Spotify en la cola"
+            if skipped:
+                emb.description = f"{emb.description}\n♻️ {skipped} repetidas omitidas"
+            try:
+                await message.edit(embed=emb)
+            except discord.HTTPException:
+                pass
 
     @commands.command(name="join")
     async def join(self, ctx: commands.Context):
@@ -269,6 +1461,9 @@ class Music(commands.Cog):
             return
         # Cancelar tarea de desconexión automática
         self._cancel_empty_task(ctx.guild.id)
+        self._cancel_import(ctx.guild.id)
+        self._forget_snapshot(ctx.guild.id)
+        await self._np_close(ctx.guild.id, "👋 Desconectado.")
         if player.queue and not player.queue.is_empty:
             player.queue.clear()
         await player.stop()
@@ -280,73 +1475,136 @@ class Music(commands.Cog):
         player = await self._ensure_player_ctx(ctx, join=True)
         if not player:
             return
+        if ctx.guild:
+            self._np_attach(ctx.guild.id, ctx.channel)
         
         # Límite de canciones por playlist
         MAX_PLAYLIST_TRACKS = 20
         
+        # Con Spotify solo se buscan ahora las primeras canciones; el resto entra
+        # en la cola como PendingTrack y se resuelve justo antes de sonar
+        entries: AsyncIterator[PendingTrack] | None = None
+        from_spotify = False
         queries: list[str]
-        if query.startswith("http") and "open.spotify.com" in query:
-            queries = await self._from_spotify(query)
+        if query.startswith("http") and "open.spotify.com" in query and self.spotify:
+            from_spotify = True
+            entries = self._spotify_entries(query)
+            head: list[PendingTrack] = []
+            try:
+                async for entry in entries:
+                    head.append(entry)
+                    if len(head) >= PREFETCH_WINDOW:
+                        break
+            except (SpotifyError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"[WARNING] Spotify: {e}")
+            if len(head) < PREFETCH_WINDOW:
+                # No quedan más entradas (o falló la lectura)
+                await entries.aclose()
+                entries = None
+            queries = [e.query for e in head]
         else:
             queries = [query]
         
         queued = 0
+        skipped = 0
         first_title = None
         added_titles: list[str] = []
-        is_playlist = False
-        
-        for i, q in enumerate(queries):
-            tracks = await self._search_tracks(q)
+        batch: list[wavelink.Playable] = []
+        is_playlist = entries is not None
+        started = time.perf_counter()
+
+        # Para importaciones de varias canciones mostramos el progreso en un solo mensaje
+        progress: discord.Message | None = None
+        last_edit = 0.0
+        if len(queries) > 1:
+            progress = await ctx.send(f"⏳ Buscando canciones… 0/{len(queries)}")
+            last_edit = time.monotonic()
+
+        async for i, tracks in self._resolve_ordered(queries):
+            if progress and time.monotonic() - last_edit >= PROGRESS_EDIT_INTERVAL:
+                last_edit = time.monotonic()
+                try:
+                    await progress.edit(content=f"⏳ Buscando canciones… {i + 1}/{len(queries)} (en cola: {len(batch)})")
+                except discord.HTTPException:
+                    pass
             if not tracks:
                 continue
             
+            if from_spotify:
+                # Cada consulta de Spotify es una sola canción: nos quedamos con el mejor resultado
+                tracks = tracks[:1]
             # Detectar si es una playlist (más de 1 track)
-            if len(tracks) > 1:
+            elif len(tracks) > 1:
                 is_playlist = True
                 # Limitar a MAX_PLAYLIST_TRACKS
                 tracks = tracks[:MAX_PLAYLIST_TRACKS]
             
             # Procesar todas las tracks encontradas
-            for track_idx, track in enumerate(tracks):
-                # La primera canción se reproduce directamente si no hay nada sonando
-                if not player.playing and i == 0 and track_idx == 0:
+            for track in tracks:
+                # La primera canción resuelta se reproduce en cuanto llega si no hay nada sonando
+                if not player.playing and first_title is None and not batch:
                     await player.play(track)
                     first_title = track.title
+                    if ctx.guild:
+                        elapsed_ms = (time.perf_counter() - started) * 1000
+                        self.first_audio_ms[ctx.guild.id] = elapsed_ms
+                        print(f"[MUSIC] Primer audio en {elapsed_ms:.0f} ms ({len(queries)} consultas) en {ctx.guild.id}")
                 else:
-                    await player.queue.put_wait(track)
-                    queued += 1
-                    if len(added_titles) < 3:  # Guardamos solo los primeros 3 títulos para mostrar
-                        added_titles.append(track.title)
-        
+                    batch.append(track)
+
+        # Todo lo resuelto entra en la cola de una vez
+        if batch:
+            dedupe = self._dedupe_enabled(ctx.guild.id if ctx.guild else 0)
+            before = len(batch)
+            if dedupe and player.current and first_title is None:
+                # Tampoco se repite la canción que ya está sonando
+                current_key = MusicQueue.track_key(player.current)
+                batch = [t for t in batch if MusicQueue.track_key(t) != current_key]
+            added, skipped = player.queue.extend(batch, dedupe=dedupe)
+            skipped += before - len(batch)
+            queued = len(added)
+            added_titles = [t.title for t in added[:3]]  # Solo los primeros 3 títulos para mostrar
+
         # Cancelar desconexión automática al reproducir música
         if ctx.guild:
             self._cancel_empty_task(ctx.guild.id)
         
         # Mensajes de respuesta
-        if first_title and queued == 0:
+        if first_title and queued == 0 and not entries:
             emb = self._embed("Reproduciendo", f"▶️ **{first_title}**", discord.Color.green())
-            await ctx.send(embed=emb)
-        elif first_title and queued > 0:
+        elif first_title:
             if is_playlist:
                 emb = self._embed("Playlist añadida", f"▶️ **{first_title}**\n➕ Añadidas {queued} canciones más a la cola", discord.Color.green())
             else:
                 emb = self._embed("Reproduciendo", f"▶️ **{first_title}**\n➕ Añadidas {queued} a la cola", discord.Color.green())
-            await ctx.send(embed=emb)
         elif queued > 0:
             # Ya había reproducción activa; reportamos lo añadido
-            if queued == 1:
+            if queued == 1 and not entries:
                 emb = self._embed("Añadido a la cola", f"➕ **{added_titles[0]}**", discord.Color.blurple())
-                await ctx.send(embed=emb)
             else:
                 shown = added_titles[0] if added_titles else "canciones"
                 if is_playlist:
                     emb = self._embed("Playlist añadida a la cola", f"➕ {queued} canciones. Primera: **{shown}**", discord.Color.blurple())
                 else:
                     emb = self._embed("Añadidas a la cola", f"➕ {queued} pistas. Primera: **{shown}**", discord.Color.blurple())
-                await ctx.send(embed=emb)
+        elif entries:
+            emb = self._embed("Playlist añadida", "📥 Importando canciones de Spotify…", discord.Color.blurple())
+        elif skipped:
+            emb = self._embed("Ya en la cola", "♻️ Esas canciones ya estaban en la cola.", discord.Color.orange())
         else:
             emb = self._embed("Sin resultados", "❌ No se encontraron resultados.", discord.Color.red())
-            await ctx.send(embed=emb)
+        if skipped and (first_title or queued or entries):
+            emb.description = f"{emb.description}\n♻️ {skipped} repetidas omitidas"
+        message = await self._reply(ctx, progress, emb)
+
+        if entries and ctx.guild:
+            tasks = self.import_tasks.setdefault(ctx.guild.id, [])
+            tasks.append(asyncio.create_task(
+                self._import_rest(player, entries, len(queries), message, emb, tasks[-1] if tasks else None)
+            ))
+        elif player.playing:
+            self._schedule_preload(player)
+            self._np_request(player)
 
     @commands.command(name="pause")
     async def pause(self, ctx: commands.Context):
@@ -355,7 +1613,8 @@ class Music(commands.Cog):
             await ctx.send("⏸️ No hay nada sonando.")
             return
         await player.pause(True)
-        await ctx.send("⏸️ Pausado.")
+        self._np_request(player)
+        await ctx.message.add_reaction("⏸️")
 
     @commands.command(name="resume")
     async def resume(self, ctx: commands.Context):
@@ -364,7 +1623,8 @@ class Music(commands.Cog):
             await ctx.send("❌ No estoy en ningún canal.")
             return
         await player.pause(False)
-        await ctx.send("▶️ Reanudado.")
+        self._np_request(player)
+        await ctx.message.add_reaction("▶️")
 
     @commands.command(name="stop")
     async def stop(self, ctx: commands.Context):
@@ -376,6 +1636,9 @@ class Music(commands.Cog):
         if ctx.guild:
             self.loop_mode[ctx.guild.id] = "off"
             self.stop_guard.add(ctx.guild.id)
+            self._cancel_import(ctx.guild.id)
+            self._forget_snapshot(ctx.guild.id)
+            await self._np_close(ctx.guild.id, "🛑 Reproducción detenida.")
         if player.queue and not player.queue.is_empty:
             player.queue.clear()
         await player.stop()
@@ -388,7 +1651,8 @@ class Music(commands.Cog):
             await ctx.send("⏭️ No hay nada para saltar.")
             return
         await player.skip()
-        await ctx.send("⏭️ Canción saltada.")
+        # El mensaje de "sonando ahora" mostrará la siguiente
+        await ctx.message.add_reaction("⏭️")
 
     @commands.command(name="queue")
     async def queue(self, ctx: commands.Context):
@@ -397,13 +1661,12 @@ class Music(commands.Cog):
             emb = self._embed("Cola", "📭 La cola está vacía.", discord.Color.orange())
             await ctx.send(embed=emb)
             return
-        items = list(player.queue)
-        lines = [f"{i}. {t.title}" for i, t in enumerate(items, start=1)]
-        txt = "\n".join(lines)
-        if len(txt) > 1900:
-            txt = txt[:1900] + "\n…"
-        emb = self._embed("Cola", f"🎶 Lista:\n{txt}", discord.Color.teal())
-        await ctx.send(embed=emb)
+        view = QueueView(self, player, ctx.author.id)
+        emb = view.render()
+        if view.page_count == 1:
+            await ctx.send(embed=emb)
+            return
+        view.message = await ctx.send(embed=emb, view=view)
 
     @commands.command(name="nowplaying")
     async def nowplaying(self, ctx: commands.Context):
@@ -412,10 +1675,9 @@ class Music(commands.Cog):
             emb = self._embed("Now Playing", "❌ No hay nada reproduciéndose.", discord.Color.red())
             await ctx.send(embed=emb)
             return
-        t = player.current
-        duration = self._duration(getattr(t, "length", 0))
-        emb = self._embed("Now Playing", f"🎵 **{t.title}** — {duration}", discord.Color.green())
-        await ctx.send(embed=emb)
+        # Un solo mensaje por servidor: se vuelve a publicar aquí al momento y se sigue actualizando
+        self._np_attach(ctx.guild.id, ctx.channel, repost=True)
+        await self._np_flush(player)
 
     @commands.command(name="loop")
     async def loop(self, ctx: commands.Context, mode: str | None = None):
@@ -429,19 +1691,33 @@ class Music(commands.Cog):
             return
         if ctx.guild:
             self.loop_mode[ctx.guild.id] = mode
+            if isinstance(ctx.guild.voice_client, wavelink.Player):
+                self._np_request(ctx.guild.voice_client)
         await ctx.send(f"🔁 Loop: {mode}")
 
+    @commands.command(name="dedupe")
+    async def dedupe(self, ctx: commands.Context, mode: str | None = None):
+        if not ctx.guild:
+            return
+        if mode is None:
+            enabled = not self._dedupe_enabled(ctx.guild.id)
+        elif mode.lower() in {"on", "off"}:
+            enabled = mode.lower() == "on"
+        else:
+            await ctx.send("Usa: on | off")
+            return
+        self.dedupe_policy[ctx.guild.id] = enabled
+        await ctx.send("♻️ Duplicados: se omiten." if enabled else "♻️ Duplicados: se permiten.")
+
     @commands.command(name="shuffle")
     async def shuffle(self, ctx: commands.Context):
         player = await self._ensure_player_ctx(ctx)
         if not player or not player.queue or player.queue.is_empty:
             await ctx.send("📭 La cola está vacía.")
             return
-        items = list(player.queue)
-        random.shuffle(items)
-        player.queue.clear()
-        for t in items:
-            await player.queue.put_wait(t)
+        player.queue.shuffle()
+        self._schedule_preload(player)
+        self._np_request(player)
         await ctx.send("🔀 Cola mezclada.")
 
     @commands.command(name="remove")
@@ -450,16 +1726,42 @@ class Music(commands.Cog):
         if not player or not player.queue or player.queue.is_empty:
             await ctx.send("📭 La cola está vacía.")
             return
-        items = list(player.queue)
-        if position < 1 or position > len(items):
+        if position < 1 or position > len(player.queue):
             await ctx.send("❌ Posición inválida.")
             return
-        removed = items.pop(position - 1)
-        player.queue.clear()
-        for t in items:
-            await player.queue.put_wait(t)
+        removed = player.queue.remove_at(position - 1)
+        self._schedule_preload(player)
+        self._np_request(player)
         await ctx.send(f"🗑️ Eliminado: **{removed.title}**")
 
+    @commands.command(name="removerange")
+    async def removerange(self, ctx: commands.Context, start: int, end: int):
+        player = await self._ensure_player_ctx(ctx)
+        if not player or not player.queue or player.queue.is_empty:
+            await ctx.send("📭 La cola está vacía.")
+            return
+        if start < 1 or end < start or end > len(player.queue):
+            await ctx.send("❌ Rango inválido.")
+            return
+        removed = player.queue.remove_range(start - 1, end)
+        self._schedule_preload(player)
+        self._np_request(player)
+        await ctx.send(f"🗑️ Eliminadas {len(removed)} canciones ({start}–{end}).")
+
+    @commands.command(name="move")
+    async def move(self, ctx: commands.Context, src: int, dst: int):
+        player = await self._ensure_player_ctx(ctx)
+        if not player or not player.queue or player.queue.is_empty:
+            await ctx.send("📭 La cola está vacía.")
+            return
+        if not (1 <= src <= len(player.queue)) or not (1 <= dst <= len(player.queue)):
+            await ctx.send("❌ Posición inválida.")
+            return
+        moved = player.queue.move(src - 1, dst - 1)
+        self._schedule_preload(player)
+        self._np_request(player)
+        await ctx.send(f"↕️ **{moved.title}** movida a la posición {dst}.")
+
     @commands.command(name="lyrics")
     async def lyrics(self, ctx: commands.Context, *, name: str | None = None):
         def _clean(s: str) -> str:
@@ -467,9 +1769,6 @@ class Music(commands.Cog):
             s = re.sub(r"\s+", " ", s).strip()
             return s
 
-        def _unaccent(s: str) -> str:
-            return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
-
         def _first_artist(s: str) -> str:
             # divide por conectores comunes y toma el primero
             parts = re.split(r"\s*(?:,| y | & | and | feat\.? | ft\.? | x )\s*", s, flags=re.IGNORECASE)
@@ -528,139 +1827,93 @@ class Music(commands.Cog):
                 candidates.append((author_guess, title_guess))
                 candidates.append(("", title_guess))
 
-        # Intentos con y sin acentos
-        async with aiohttp.ClientSession() as session:
-            # Enriquecimiento: si no se entregó nombre y la pista es de YouTube, usa oEmbed para obtener el título completo
-            try:
-                if not name and 't' in locals():
-                    uri = getattr(t, 'uri', '')
-                    if isinstance(uri, str) and 'youtube.com' in uri:
-                        # Normaliza a forma simple watch?v=ID
-                        parsed = urllib.parse.urlparse(uri)
-                        if parsed.path == '/watch':
-                            qs = urllib.parse.parse_qs(parsed.query)
-                            v = qs.get('v', [None])[0]
-                            if v:
-                                simple = f"https://www.youtube.com/watch?v={v}"
-                                oembed = f"https://www.youtube.com/oembed?url={urllib.parse.quote(simple)}&format=json"
-                                async with session.get(oembed) as r:
-                                    if r.status == 200:
-                                        data = await r.json()
-                                        full_title = data.get('title', '')
-                                        if ' - ' in full_title:
-                                            a_part, t_part = full_title.split(' - ', 1)
-                                            a_part = _clean(a_part)
-                                            t_part = _clean(t_part)
-                                            arts = [x.strip() for x in re.split(r"\s*(?:,| y | & | and | feat\.? | ft\.? | x )\s*", a_part, flags=re.IGNORECASE) if x.strip()]
-                                            if arts:
-                                                # añade candidatos de oEmbed al inicio para priorizarlos
-                                                candidates.insert(0, (a_part, t_part))
-                                                for art in arts:
-                                                    candidates.insert(0, (art, t_part))
-                                                candidates.insert(0, ("", t_part))
-            except Exception:
-                pass
-            # 1) Intentos con lyrics.ovh
-            for artist, title in candidates:
-                for an, tn in [(artist, title), (_unaccent(artist), _unaccent(title))]:
-                    a_enc = urllib.parse.quote(an)
-                    t_enc = urllib.parse.quote(tn)
-                    url = f"https://api.lyrics.ovh/v1/{a_enc}/{t_enc}" if an else f"https://api.lyrics.ovh/v1//{t_enc}"
-                    try:
-                        async with session.get(url) as resp:
-                            if resp.status == 200:
-                                data = await resp.json()
-                                text = data.get("lyrics") or "❌ No se encontraron letras."
-                                text = "\n".join([ln for ln in text.splitlines() if ln.strip()])
-                                if len(text) > 1900:
-                                    text = text[:1900] + "\n…"
-                                emb = self._embed(f"Letras de {tn}", text, discord.Color.purple())
-                                await ctx.send(embed=emb)
-                                return
-                    except Exception:
-                        pass
-
-            # 2) Fallback con SomeRandomAPI por título (mejor para consultas sin artista)
-            title_only = None
-            if name:
-                title_only = _clean(name)
-            else:
-                # si veníamos de pista actual
-                title_only = candidates[0][1] if candidates else None
+        # Caché: por URI de la pista actual y por (artista, título) normalizados
+        cache_keys: list[str] = []
+        if not name and getattr(t, "uri", None):
+            cache_keys.append(f"uri:{t.uri}")
+        if candidates:
+            cache_keys.append(_lyrics_key(*candidates[0]))
+        for key in cache_keys:
+            found, cached = self.lyrics_cache.lookup(key)
+            if found:
+                await ctx.send(embed=self._lyrics_embed(cached))
+                return
 
-            if title_only:
-                try:
-                    # Intenta primero solo el título y luego título + artista principal
-                    primary_artist = None
-                    if candidates:
-                        primary_artist = candidates[0][0] or None
-                        if primary_artist:
-                            primary_artist = _first_artist(primary_artist)
-
-                    titles_to_try = [title_only]
-                    if primary_artist and f"{title_only} {primary_artist}" not in titles_to_try:
-                        titles_to_try.append(f"{title_only} {primary_artist}")
-                    # Si el título original tenía múltiples artistas, intenta "título + todos los artistas"
-                    try:
-                        # Reconstruye posibles artistas desde candidates que tengan el mismo título
-                        multi = [a for a, t in candidates if t.lower() == title_only.lower() and a]
-                        # Mantén únicos, combinación corta "A B" si hay 2 primeros
-                        if multi:
-                            joined = " ".join(sorted({ _first_artist(a) for a in multi }))
-                            if joined and f"{title_only} {joined}" not in titles_to_try:
-                                titles_to_try.append(f"{title_only} {joined}")
-                    except Exception:
-                        pass
-
-                    # Añade variantes sin acentos
-                    more = []
-                    for q in list(titles_to_try):
-                        uq = _unaccent(q)
-                        if uq != q:
-                            more.append(uq)
-                    titles_to_try.extend(more)
-
-                    for qtitle in titles_to_try:
-                        api_url = f"https://some-random-api.com/lyrics?title={urllib.parse.quote(qtitle)}"
-                        async with session.get(api_url) as resp:
-                            if resp.status == 200:
-                                data = await resp.json()
-                                text = data.get("lyrics")
-                                tn = data.get("title", qtitle)
-                                if text:
-                                    text = "\n".join([ln for ln in text.splitlines() if ln.strip()])
-                                    if len(text) > 1900:
-                                        text = text[:1900] + "\n…"
-                                    emb = self._embed(f"Letras de {tn}", text, discord.Color.purple())
-                                    await ctx.send(embed=emb)
-                                    return
-                except Exception:
-                    pass
+        # Enriquecimiento: si no se entregó nombre y la pista es de YouTube, usa oEmbed para obtener el título completo
+        try:
+            vid = _youtube_video_id(getattr(t, "uri", "") or "") if not name else None
+            meta = await self.oembed.fetch(vid) if vid else None
+            full_title = meta["title"] if meta else ""
+            if " - " in full_title:
+                a_part, t_part = full_title.split(" - ", 1)
+                a_part = _clean(a_part)
+                t_part = _clean(t_part)
+                arts = [x.strip() for x in re.split(r"\s*(?:,| y | & | and | feat\.? | ft\.? | x )\s*", a_part, flags=re.IGNORECASE) if x.strip()]
+                if arts:
+                    # añade candidatos de oEmbed al inicio para priorizarlos
+                    candidates.insert(0, (a_part, t_part))
+                    for art in arts:
+                        candidates.insert(0, (art, t_part))
+                    candidates.insert(0, ("", t_part))
+        except Exception:
+            pass
+        # Títulos para some-random-api (mejor para consultas sin artista)
+        titles_to_try: list[str] = []
+        title_only = _clean(name) if name else (candidates[0][1] if candidates else None)
+        if title_only:
+            # Intenta primero solo el título y luego título + artista principal
+            titles_to_try.append(title_only)
+            primary_artist = candidates[0][0] if candidates else ""
+            if primary_artist:
+                primary_artist = _first_artist(primary_artist)
+                if f"{title_only} {primary_artist}" not in titles_to_try:
+                    titles_to_try.append(f"{title_only} {primary_artist}")
+            # Si el título original tenía múltiples artistas, intenta "título + todos los artistas"
+            multi = [a for a, t in candidates if t.lower() == title_only.lower() and a]
+            if multi:
+                joined = " ".join(sorted({_first_artist(a) for a in multi}))
+                if joined and f"{title_only} {joined}" not in titles_to_try:
+                    titles_to_try.append(f"{title_only} {joined}")
+            # Añade variantes sin acentos
+            titles_to_try.extend([unaccent(q) for q in list(titles_to_try) if unaccent(q) != q])
 
-            # 3) Fallback con LRCLib (búsqueda por título y artista)
-            try:
-                for artist, title in candidates:
-                    an, tn = _unaccent(artist), _unaccent(title)
-                    q = f"https://lrclib.net/api/search?track_name={urllib.parse.quote(tn)}&artist_name={urllib.parse.quote(an)}&limit=1"
-                    async with session.get(q) as resp:
-                        if resp.status == 200:
-                            arr = await resp.json()
-                            if isinstance(arr, list) and arr:
-                                item = arr[0]
-                                text = item.get("plainLyrics") or item.get("syncedLyrics")
-                                if text:
-                                    text = "\n".join([ln for ln in text.splitlines() if ln.strip()])
-                                    if len(text) > 1900:
-                                        text = text[:1900] + "\n…"
-                                    show_title = item.get("trackName", title)
-                                    emb = self._embed(f"Letras de {show_title}", text, discord.Color.purple())
-                                    await ctx.send(embed=emb)
-                                    return
-            except Exception:
-                pass
+        # lyrics.ovh, some-random-api y LRCLib en paralelo, con plazo global
+        result, definitive = await self.lyrics_engine.find(self.bot.http_client, candidates, titles_to_try)
 
-        emb = self._embed("Letras", "❌ No encontré la letra.", discord.Color.red())
-        await ctx.send(embed=emb)
+        entry = None
+        if result:
+            text = "\n".join([ln for ln in result.text.splitlines() if ln.strip()])
+            if len(text) > 1900:
+                text = text[:1900] + "\n…"
+            entry = {"title": result.title, "text": text, "provider": result.provider}
+        # Un "no encontrado" solo se recuerda si todos los proveedores respondieron
+        if entry or definitive:
+            for key in cache_keys:
+                self.lyrics_cache.put(key, entry, ttl=None if entry else LYRICS_CACHE_NEGATIVE_TTL)
+        await ctx.send(embed=self._lyrics_embed(entry))
+
+    def _lyrics_embed(self, entry: dict | None) -> discord.Embed:
+        if not entry:
+            return self._embed("Letras", "❌ No encontré la letra.", discord.Color.red())
+        return self._embed(f"Letras de {entry['title']}", entry["text"], discord.Color.purple())
+
+    @commands.Cog.listener()
+    async def on_wavelink_track_start(self, payload: wavelink.TrackStartEventPayload):
+        player: wavelink.Player = payload.player
+        if not player or not player.guild:
+            return
+        gid = player.guild.id
+        started = self.gap_started.pop(gid, None)
+        if started is not None:
+            self.gaps.setdefault(gid, GapStats()).record((time.monotonic() - started) * 1000)
+        self._schedule_preload(player)
+        self._np_request(player)
+
+    @commands.Cog.listener()
+    async def on_wavelink_player_update(self, payload: wavelink.PlayerUpdateEventPayload):
+        # Llega cada pocos segundos por reproductor; casi siempre se descarta por no cambiar nada
+        if payload.player:
+            self._np_request(payload.player)
 
     @commands.Cog.listener()
     async def on_wavelink_track_end(self, payload: wavelink.TrackEndEventPayload):
@@ -668,21 +1921,27 @@ class Music(commands.Cog):
         if not player or not getattr(player, "connected", False):
             return
         gid = player.guild.id
+        if payload.reason == "replaced":
+            # Otra pista ocupó su lugar (play sobre una que sonaba): quien la reemplazó ya decidió qué suena
+            return
         # Si venimos de un stop manual, ignorar este evento
         if gid in self.stop_guard:
             self.stop_guard.discard(gid)
+            self.gap_started.pop(gid, None)
             return
+        if payload.reason in ("finished", "loadFailed"):
+            # El hueco se mide desde la primera canción que terminó (una que no carga lo alarga)
+            self.gap_started.setdefault(gid, time.monotonic())
         mode = self.loop_mode.get(gid, "off")
         last = getattr(payload, "track", None)
         if mode == "song" and last:
             await player.play(last)
             return
         if mode == "queue" and last:
-            await player.queue.put_wait(last)
-        if hasattr(player, "queue") and player.queue and not player.queue.is_empty:
-            nxt = player.queue.get()
-            await player.play(nxt)
-        else:
+            player.queue.extend([last])
+        if not await self._play_next(player):
+            self.gap_started.pop(gid, None)
+            self._np_request(player)
             # Si no hay más canciones, verificar si el canal está vacío
             self._check_empty_channel(player)
 
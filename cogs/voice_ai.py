@@ -1,12 +1,18 @@
 import os
 import discord
 from discord.ext import commands
-import asyncio
 from gtts import gTTS
 import tempfile
 from pathlib import Path
-import aiohttp
-from typing import Dict, List
+
+from utils.conversations import ConversationStore
+from utils.llm import LLMError
+from utils.ratelimit import RateLimited
+
+MAX_TOKENS = 80  # Límite bajo para respuestas cortas
+# Prompt más corto que en #ia: menos tokens de entrada, respuesta antes
+PROMPT_TOKEN_BUDGET = 1024
+VOICE_DEADLINE = 10.0
 
 
 class VoiceAI(commands.Cog):
@@ -17,14 +23,9 @@ class VoiceAI(commands.Cog):
         self.temp_dir = Path(tempfile.gettempdir()) / "sthashior_tts"
         self.temp_dir.mkdir(exist_ok=True)
         
-        # Configuración de IA (igual que ai_chat.py)
-        self.groq_api_key = os.environ.get("GROQ_API_KEY")
-        self.api_url = "https://api.groq.com/openai/v1/chat/completions"
-        self.model = "llama-3.1-8b-instant"
-        
         # Historial de conversación por voz (por usuario)
-        self.voice_conversation_history: Dict[int, List[str]] = {}
         self.max_history = 2  # Solo 2 mensajes de historial para respuestas rápidas
+        self.voice_conversation_history = ConversationStore(self.max_history)
         
         # Cargar personalidad desde archivo
         self.personality = self._load_personality()
@@ -53,66 +54,27 @@ INSTRUCCIONES ESPECIALES PARA VOZ:
 
     async def _query_groq_voice(self, text: str, user_id: int) -> str:
         """Consulta la API de Groq para obtener respuesta de IA (versión voz)"""
-        if not self.groq_api_key:
+        if not self.bot.llm.api_key:
             return "No tengo configurada mi clave de IA."
         
-        headers = {
-            "Authorization": f"Bearer {self.groq_api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Construir mensajes con personalidad
-        messages = [
-            {"role": "system", "content": self.personality}
-        ]
-        
-        # Añadir historial si existe (solo últimos 2 mensajes)
-        history = self.voice_conversation_history.get(user_id, [])
-        for i in range(0, len(history), 2):
-            if i < len(history):
-                messages.append({"role": "user", "content": history[i]})
-            if i + 1 < len(history):
-                messages.append({"role": "assistant", "content": history[i+1]})
-        
-        # Añadir mensaje actual
-        messages.append({"role": "user", "content": text})
-        
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": 0.7,
-            "max_tokens": 80,  # Límite bajo para respuestas cortas
-            "top_p": 0.9
-        }
-        
+        # Personalidad y los turnos recientes que quepan en el presupuesto (solo 2 como mucho)
+        messages = self.voice_conversation_history.messages(user_id, self.personality, text,
+                                                            PROMPT_TOKEN_BUDGET - MAX_TOKENS)
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(self.api_url, headers=headers, json=payload, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                    if response.status != 200:
-                        return "Lo siento, tuve un problema al pensar en una respuesta."
-                    
-                    result = await response.json()
-                    
-                    if "choices" in result and len(result["choices"]) > 0:
-                        response_text = result["choices"][0]["message"]["content"].strip()
-                        
-                        # Actualizar historial
-                        if user_id not in self.voice_conversation_history:
-                            self.voice_conversation_history[user_id] = []
-                        
-                        self.voice_conversation_history[user_id].append(text)
-                        self.voice_conversation_history[user_id].append(response_text)
-                        
-                        # Mantener solo últimos mensajes
-                        if len(self.voice_conversation_history[user_id]) > self.max_history * 2:
-                            self.voice_conversation_history[user_id] = self.voice_conversation_history[user_id][-(self.max_history * 2):]
-                        
-                        return response_text
-                    
-                    return "No se me ocurre qué decir."
-        except Exception as e:
-            print(f"[ERROR] Groq Voice: {e}")
-            return "Tuve un error al procesar tu mensaje."
+            # Plazo corto: en voz una respuesta tardía no sirve; comparte cola y circuito con #ia
+            response_text = await self.bot.llm.complete(messages, user_id=user_id, max_tokens=MAX_TOKENS,
+                                                        deadline=VOICE_DEADLINE)
+        except RateLimited:
+            return "Estoy hablando con demasiada gente ahora mismo, prueba en un rato."
+        except LLMError as e:
+            print(f"[ERROR] Groq Voice: {e!r}")
+            return "Lo siento, tuve un problema al pensar en una respuesta."
+        if not response_text:
+            return "No se me ocurre qué decir."
+        
+        # Actualizar historial
+        self.voice_conversation_history.add(user_id, text, response_text)
+        return response_text
 
     @commands.command(name="voz")
     async def voice_tts(self, ctx: commands.Context, *, mensaje: str = None):
@@ -149,19 +111,21 @@ INSTRUCCIONES ESPECIALES PARA VOZ:
         
         return audio_file
 
-    async def _cleanup_audio(self, audio_file: Path, voice_client, ctx):
-        """Limpia el archivo de audio y desconecta del canal"""
-        await asyncio.sleep(1)
-        
+    def _cleanup_audio(self, audio_file: Path, voice_client, ctx):
+        """Programa la limpieza del archivo de audio y la desconexión del canal"""
+        self.bot.scheduler.call_later(1, self._delete_audio, audio_file)
+        # Desconectar después de 3 segundos de inactividad (un audio nuevo reprograma la salida)
+        self.bot.scheduler.call_later(4, self._disconnect_if_idle, voice_client, key=("voz", ctx.guild.id))
+
+    def _delete_audio(self, audio_file: Path):
         # Eliminar archivo temporal
         try:
             if audio_file.exists():
                 audio_file.unlink()
         except Exception as e:
             print(f"[WARNING] No se pudo eliminar {audio_file}: {e}")
-        
-        # Desconectar después de 3 segundos de inactividad
-        await asyncio.sleep(3)
+
+    async def _disconnect_if_idle(self, voice_client):
         if voice_client and not voice_client.is_playing():
             await voice_client.disconnect()
 
@@ -5,14 +5,34 @@ import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
+# Antes de importar utils: varios módulos leen su configuración del entorno al importarse
 load_dotenv()
+
+from utils.http import HTTPClient
+from utils.llm import LLMClient
+from utils.ratelimit import RateLimitScheduler
+from utils.scheduler import TimerWheel
+
 intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
 intents.guilds = True
 
 class SthashiorBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Cliente HTTP compartido por todos los cogs (conexiones persistentes y límites por host)
+        self.http_client = HTTPClient()
+        # Tareas diferidas (borrados, desconexiones por inactividad...) sin una tarea por cada una
+        self.scheduler = TimerWheel()
+        # Cola y cupo compartidos por los cogs que llaman a Groq (#ia y voz)
+        self.groq_limiter = RateLimitScheduler()
+        # Cliente de Groq de ambos cogs: plazos, reintentos y circuito compartidos
+        self.llm = LLMClient(self.http_client, self.groq_limiter, os.environ.get("GROQ_API_KEY"))
+
     async def setup_hook(self) -> None:
+        await self.http_client.start()
+        self.scheduler.start()
         await self.load_extension("cogs.music")
         await self.load_extension("cogs.help")
         await self.load_extension("cogs.datorandom")
@@ -23,8 +43,22 @@ class SthashiorBot(commands.Bot):
         async def handle_root(request: web.Request) -> web.Response:
             return web.Response(text="OK", status=200)
 
+        # Contadores del cliente HTTP, del planificador, de los nodos de Lavalink, huecos entre canciones, latencia y cola de la IA
+        async def handle_stats(request: web.Request) -> web.Response:
+            data = {"http": self.http_client.stats(), "scheduler": self.scheduler.stats()}
+            music = self.get_cog("Music")
+            if music:
+                data["lavalink"] = music.node_balancer.summary()
+                data["gaps"] = music.gap_summary()
+                data["nowplaying"] = music.nowplaying_summary()
+            ai = self.get_cog("AIChat")
+            if ai:
+                data["ia"] = ai.latency_summary()
+            return web.json_response(data)
+
         app = web.Application()
         app.router.add_get("/", handle_root)
+        app.router.add_get("/stats", handle_stats)
 
         port = int(os.environ.get("PORT", "3000"))
         runner = web.AppRunner(app)
@@ -32,6 +66,12 @@ class SthashiorBot(commands.Bot):
         site = web.TCPSite(runner, host="0.0.0.0", port=port)
         await site.start()
 
+    async def close(self) -> None:
+        # Primero las acciones pendientes, mientras la conexión con Discord sigue abierta
+        await self.scheduler.close()
+        await super().close()
+        await self.http_client.close()
+
 bot = SthashiorBot(command_prefix="#", intents=intents, help_command=None, case_insensitive=True)
 
 @bot.event
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+CACHE_DIR = os.environ.get(
+    "CACHE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "cache")
+)
+
+# Espera antes de escribir a disco tras un cambio (agrupa varias escrituras en una)
+SAVE_DELAY_SECONDS = 30
+
+_MISSING = object()
+
+
+def cache_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, name)
+
+
+class PersistentLRU:
+    """Caché LRU con TTL por entrada y copia opcional en un archivo JSON local.
+
+    Los valores deben ser serializables a JSON. ``None`` se usa como resultado
+    negativo ("no hay resultados") y normalmente se guarda con un TTL más corto.
+    """
+
+    def __init__(self, path: str | None, max_entries: int, ttl: float, save_delay: float = SAVE_DELAY_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.save_delay = save_delay
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._dirty = False
+        self._save_handle: asyncio.TimerHandle | None = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def lookup(self, key: str) -> tuple[bool, Any]:
+        """Devuelve (encontrado, valor); las entradas caducadas cuentan como fallo"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            self._dirty = True
+            self.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        found, value = self.lookup(key)
+        return value if found else default
+
+    def put(self, key: str, value: Any, ttl: float | None = None):
+        self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+        self._mark_dirty()
+
+    def pop(self, key: str, default: Any = _MISSING) -> Any:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            if default is _MISSING:
+                raise KeyError(key)
+            return default
+        self._mark_dirty()
+        return entry[1]
+
+    def keys(self, prefix: str = "") -> list[str]:
+        """Claves vigentes que empiezan por ``prefix`` (no cuenta como acierto ni fallo)"""
+        now = time.time()
+        return [k for k, (exp, _) in self._data.items() if exp > now and k.startswith(prefix)]
+
+    def clear(self):
+        self._data.clear()
+        self._mark_dirty()
+
+    def stats(self) -> dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+    def _mark_dirty(self):
+        self._dirty = True
+        if not self.path or self._save_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._save_handle = loop.call_later(self.save_delay, lambda: asyncio.ensure_future(self.flush()))
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"[WARNING] No se pudo leer la caché {self.path}: {e}")
+            return
+        now = time.time()
+        # El archivo se guarda del menos al más reciente, así se conserva el orden LRU
+        for key, (expires_at, value) in raw:
+            if expires_at > now:
+                self._data[key] = (expires_at, value)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def _snapshot(self) -> list:
+        now = time.time()
+        self._dirty = False
+        return [[k, [exp, v]] for k, (exp, v) in self._data.items() if exp > now]
+
+    def _write(self, snapshot: list):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def save(self):
+        """Escribe la caché a disco de forma atómica (bloqueante)"""
+        if self.path:
+            self._write(self._snapshot())
+
+    async def flush(self):
+        """Escribe la caché fuera del event loop si hay cambios pendientes"""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if not self._dirty or not self.path:
+            return
+        # La copia se toma en el loop; solo la escritura va a otro hilo
+        snapshot = self._snapshot()
+        try:
+            await asyncio.to_thread(self._write, snapshot)
+        except Exception as e:
+            self._dirty = True
+            print(f"[WARNING] No se pudo guardar la caché {self.path}: {e}")
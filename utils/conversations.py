@@ -0,0 +1,187 @@
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any
+
+from utils.ratelimit import text_tokens
+
+# Límites globales del historial de cada cog de IA (entre todos los usuarios)
+MEMORY_MAX_USERS = int(os.environ.get("AI_MEMORY_MAX_USERS", "1000"))
+MEMORY_MAX_TOKENS = int(os.environ.get("AI_MEMORY_MAX_TOKENS", "200000"))
+# Segundos sin hablar con la IA tras los que se olvida la conversación
+MEMORY_IDLE_TTL = int(os.environ.get("AI_MEMORY_IDLE_TTL", str(2 * 3600)))
+
+
+class _Conversation:
+    __slots__ = ("turns", "tokens", "summary", "summary_tokens", "last_used")
+
+    def __init__(self, max_turns: int):
+        # Cada turno es (pregunta, respuesta, tokens de ambas)
+        self.turns: deque[tuple[str, str, int]] = deque(maxlen=max_turns)
+        self.tokens = 0  # turnos + resumen
+        self.summary = ""
+        self.summary_tokens = 0
+        self.last_used = time.monotonic()
+
+
+class ConversationStore:
+    """Historial de conversación por usuario con memoria acotada.
+
+    - Cada usuario guarda como mucho ``max_turns`` turnos (pregunta + respuesta) en un
+      búfer circular: el turno nuevo desplaza al más antiguo.
+    - Entre todos no se pasa de ``max_users`` conversaciones ni de ``max_tokens`` tokens
+      estimados; al llenarse se olvida primero la conversación usada hace más tiempo.
+    - Las conversaciones sin actividad durante ``idle_ttl`` segundos se descartan.
+    - Opcionalmente los turnos antiguos se resumen (``to_compact`` + ``fold``) y solo se
+      conserva un resumen corto de ellos.
+    """
+
+    def __init__(self, max_turns: int, max_users: int = MEMORY_MAX_USERS,
+                 max_tokens: int = MEMORY_MAX_TOKENS, idle_ttl: float = MEMORY_IDLE_TTL):
+        self.max_turns = max_turns
+        self.max_users = max_users
+        self.max_tokens = max_tokens
+        self.idle_ttl = idle_ttl
+        self._users: OrderedDict[int, _Conversation] = OrderedDict()  # de la menos a la más reciente
+        self.total_tokens = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        self._expire()
+        return len(self._users)
+
+    def __contains__(self, user_id: int) -> bool:
+        self._expire()
+        return user_id in self._users
+
+    def _drop(self, user_id: int) -> _Conversation | None:
+        conversation = self._users.pop(user_id, None)
+        if conversation is not None:
+            self.total_tokens -= conversation.tokens
+        return conversation
+
+    def _expire(self):
+        # El orden LRU es también el de inactividad: basta mirar el principio
+        deadline = time.monotonic() - self.idle_ttl
+        while self._users:
+            user_id, conversation = next(iter(self._users.items()))
+            if conversation.last_used > deadline:
+                break
+            self._drop(user_id)
+            self.expired += 1
+
+    def turns(self, user_id: int, budget: int | None = None) -> list[tuple[str, str]]:
+        """Turnos más recientes (en orden cronológico) que caben en ``budget`` tokens"""
+        self._expire()
+        conversation = self._users.get(user_id)
+        if conversation is None:
+            return []
+        conversation.last_used = time.monotonic()
+        self._users.move_to_end(user_id)
+        selected: list[tuple[str, str]] = []
+        spent = 0
+        for prompt, reply, tokens in reversed(conversation.turns):
+            if budget is not None and spent + tokens > budget:
+                break
+            spent += tokens
+            selected.append((prompt, reply))
+        selected.reverse()
+        return selected
+
+    def messages(self, user_id: int, system: str, text: str, budget: int) -> list[dict[str, str]]:
+        """Mensajes para la API de chat: instrucciones, resumen, los turnos más recientes que
+        quepan en ``budget`` tokens (contando todo lo demás) y el mensaje nuevo"""
+        messages = [{"role": "system", "content": system}]
+        summary = self.summary(user_id)
+        if summary:
+            messages.append({"role": "system", "content": f"Resumen de la conversación hasta ahora: {summary}"})
+        budget -= text_tokens(system) + text_tokens(summary) + text_tokens(text)
+        for prompt, reply in self.turns(user_id, max(0, budget)):
+            messages.append({"role": "user", "content": prompt})
+            messages.append({"role": "assistant", "content": reply})
+        messages.append({"role": "user", "content": text})
+        return messages
+
+    def summary(self, user_id: int) -> str:
+        """Resumen de los turnos ya compactados ("" si no hay)"""
+        conversation = self._users.get(user_id)
+        return conversation.summary if conversation is not None else ""
+
+    def to_compact(self, user_id: int, threshold: int, keep: int, batch: int = 1) -> list[tuple[str, str, int]]:
+        """Turnos a resumir (todos menos los ``keep`` últimos) si los de ``user_id`` pasan de
+        ``threshold`` tokens, o si el búfer está lleno y el siguiente turno desplazaría uno sin
+        resumir. En ese segundo caso se esperan al menos ``batch`` turnos, para no pedir un
+        resumen con cada respuesta: el búfer debe tener sitio para ``keep + batch``."""
+        conversation = self._users.get(user_id)
+        if conversation is None or len(conversation.turns) <= keep:
+            return []
+        folded = list(conversation.turns)[:len(conversation.turns) - keep]
+        if conversation.tokens - conversation.summary_tokens > threshold:
+            return folded
+        if len(conversation.turns) == conversation.turns.maxlen and len(folded) >= batch:
+            return folded
+        return []
+
+    def fold(self, user_id: int, folded: list[tuple[str, str, int]], summary: str):
+        """Sustituye los turnos ``folded`` (de ``to_compact``) por ``summary``. Los que ya se
+        hayan descartado mientras se generaba el resumen simplemente no están."""
+        conversation = self._users.get(user_id)
+        if conversation is None:
+            return  # reiniciada o caducada entretanto
+        pending = {id(turn) for turn in folded}
+        while conversation.turns and id(conversation.turns[0]) in pending:
+            self._forget_oldest(conversation)
+        tokens = text_tokens(summary)
+        delta = tokens - conversation.summary_tokens
+        conversation.summary = summary
+        conversation.summary_tokens = tokens
+        conversation.tokens += delta
+        self.total_tokens += delta
+
+    def add(self, user_id: int, prompt: str, reply: str):
+        self._expire()
+        conversation = self._users.get(user_id)
+        if conversation is None:
+            conversation = self._users[user_id] = _Conversation(self.max_turns)
+        self._users.move_to_end(user_id)
+        conversation.last_used = time.monotonic()
+        if len(conversation.turns) == conversation.turns.maxlen:
+            self._forget_oldest(conversation)
+        tokens = text_tokens(prompt) + text_tokens(reply)
+        conversation.turns.append((prompt, reply, tokens))
+        conversation.tokens += tokens
+        self.total_tokens += tokens
+
+        while len(self._users) > self.max_users or self.total_tokens > self.max_tokens:
+            oldest = next(iter(self._users))
+            if oldest != user_id:
+                self._drop(oldest)
+                self.evicted += 1
+            elif len(conversation.turns) > 1:
+                # Solo queda esta conversación y aún no cabe: se recorta por el principio
+                self._forget_oldest(conversation)
+            else:
+                break
+
+    def _forget_oldest(self, conversation: _Conversation):
+        tokens = conversation.turns.popleft()[2]
+        conversation.tokens -= tokens
+        self.total_tokens -= tokens
+
+    def reset(self, user_id: int) -> bool:
+        """Olvida la conversación del usuario; False si no tenía"""
+        self._expire()
+        return self._drop(user_id) is not None
+
+    def stats(self) -> dict[str, Any]:
+        self._expire()
+        return {
+            "users": len(self._users),
+            "tokens": self.total_tokens,
+            "summaries": sum(1 for c in self._users.values() if c.summary),
+            "max_users": self.max_users,
+            "max_tokens": self.max_tokens,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
@@ -0,0 +1,159 @@
+import asyncio
+import contextlib
+import time
+import urllib.parse
+from collections import Counter
+from typing import Any, AsyncIterator
+
+import aiohttp
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15, connect=5)
+CONNECTION_LIMIT = 100
+DNS_CACHE_SECONDS = 300
+KEEPALIVE_SECONDS = 30
+
+# Presupuesto por host: (peticiones simultáneas, peticiones por segundo o None)
+HOST_BUDGETS: dict[str, tuple[int, float | None]] = {
+    "api.groq.com": (4, None),
+    "www.youtube.com": (4, 5.0),
+    "api.lyrics.ovh": (4, None),
+    "some-random-api.com": (2, 2.0),
+    "lrclib.net": (3, None),
+    "api.spotify.com": (8, None),
+    "accounts.spotify.com": (2, None),
+}
+DEFAULT_BUDGET: tuple[int, float | None] = (8, None)
+
+
+class HostBudget:
+    """Límite de concurrencia más un token bucket opcional para un host"""
+
+    def __init__(self, concurrency: int, rate: float | None = None):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate = rate
+        self.burst = max(1.0, rate or 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def _take_token(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def acquire(self):
+        await self.semaphore.acquire()
+        if self.rate:
+            try:
+                await self._take_token()
+            except BaseException:
+                self.semaphore.release()
+                raise
+
+    def release(self):
+        self.semaphore.release()
+
+
+class HostStats:
+    __slots__ = ("requests", "errors", "in_flight", "wait_s", "latency_s", "statuses")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.wait_s = 0.0
+        self.latency_s = 0.0
+        self.statuses: Counter[int] = Counter()
+
+    def as_dict(self) -> dict[str, Any]:
+        done = max(1, self.requests - self.in_flight)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_wait_ms": round(self.wait_s / max(1, self.requests) * 1000, 1),
+            "avg_latency_ms": round(self.latency_s / done * 1000, 1),
+            "statuses": dict(self.statuses),
+        }
+
+
+class HTTPClient:
+    """Cliente HTTP compartido por todo el bot.
+
+    Una sola ``aiohttp.ClientSession`` con conexiones persistentes y caché de DNS,
+    presupuestos de concurrencia/ritmo por host, timeouts por defecto y contadores.
+    Uso: ``async with bot.http_client.get(url) as resp: ...``
+    """
+
+    def __init__(self, *, timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+                 budgets: dict[str, tuple[int, float | None]] | None = None):
+        self.timeout = timeout
+        self._budget_config = dict(HOST_BUDGETS if budgets is None else budgets)
+        self._budgets: dict[str, HostBudget] = {}
+        self._stats: dict[str, HostStats] = {}
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=CONNECTION_LIMIT, ttl_dns_cache=DNS_CACHE_SECONDS, keepalive_timeout=KEEPALIVE_SECONDS
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            raise RuntimeError("HTTPClient no iniciado: llama a start() primero")
+        return self._session
+
+    def _budget(self, host: str) -> HostBudget:
+        budget = self._budgets.get(host)
+        if budget is None:
+            budget = HostBudget(*self._budget_config.get(host, DEFAULT_BUDGET))
+            self._budgets[host] = budget
+        return budget
+
+    @contextlib.asynccontextmanager
+    async def request(self, method: str, url: str, **kwargs: Any) -> AsyncIterator[aiohttp.ClientResponse]:
+        if self._session is None or self._session.closed:
+            await self.start()
+        host = urllib.parse.urlsplit(url).hostname or ""
+        stats = self._stats.setdefault(host, HostStats())
+        budget = self._budget(host)
+        queued_at = time.monotonic()
+        await budget.acquire()
+        started = time.monotonic()
+        stats.wait_s += started - queued_at
+        stats.requests += 1
+        stats.in_flight += 1
+        try:
+            async with self.session.request(method, url, **kwargs) as resp:
+                stats.latency_s += time.monotonic() - started
+                stats.statuses[resp.status] += 1
+                yield resp
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            budget.release()
+
+    def get(self, url: str, **kwargs: Any):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {host: s.as_dict() for host, s in self._stats.items()}
@@ -0,0 +1,335 @@
+import asyncio
+import contextlib
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+import aiohttp
+
+from utils.http import HTTPClient
+from utils.ratelimit import RATE_LIMIT_RETRIES, RateLimitScheduler, estimate_tokens
+
+GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+# Reintentos ante errores transitorios (5xx, timeouts, conexión); los 429 van aparte
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 4.0
+# Estados HTTP que merece la pena reintentar
+RETRYABLE_STATUS = frozenset({500, 502, 503, 504})
+# Fallos seguidos que abren el circuito y segundos que permanece abierto
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+
+class LLMError(Exception):
+    """Fallo de la API de chat; ``status`` es el código HTTP si lo hubo"""
+
+    def __init__(self, detail: str, status: int | None = None):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+class LLMAuthError(LLMError):
+    """API key ausente o rechazada (no se reintenta)"""
+
+
+class LLMTimeout(LLMError):
+    """Se agotó el plazo de la llamada"""
+
+
+class LLMUnavailable(LLMError):
+    """Circuito abierto: la API está fallando y no se le envían peticiones"""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"API no disponible durante {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Deja de llamar a la API tras ``threshold`` fallos seguidos.
+
+    Abierto durante ``cooldown`` segundos todas las llamadas fallan al instante; después
+    se deja pasar una sola de prueba (semiabierto) y su resultado lo cierra o lo reabre.
+    """
+
+    __slots__ = ("threshold", "cooldown", "failures", "opened_at", "probing", "opened")
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def before_call(self):
+        """Lanza LLMUnavailable si la llamada no debe salir"""
+        state = self.state
+        if state == "open":
+            raise LLMUnavailable(self.cooldown - (time.monotonic() - self.opened_at))
+        if state == "half-open":
+            if self.probing:
+                raise LLMUnavailable(1.0)
+            self.probing = True
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            if self.opened_at is None or self.probing:
+                self.opened += 1
+                print(f"[WARNING] API de IA fallando ({self.failures} errores seguidos): circuito abierto {self.cooldown:.0f}s")
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+    def release(self):
+        """La llamada de prueba terminó sin veredicto (p. ej. la canceló el usuario)"""
+        self.probing = False
+
+
+class LLMStats:
+    """Latencia (primer token y total) y errores de las llamadas a la API"""
+
+    __slots__ = ("count", "ttft_total", "ttft_max", "total_sum", "total_max", "last_ttft", "last_total",
+                 "retries", "errors")
+
+    def __init__(self):
+        self.count = 0
+        self.ttft_total = 0.0
+        self.ttft_max = 0.0
+        self.total_sum = 0.0
+        self.total_max = 0.0
+        self.last_ttft = 0.0
+        self.last_total = 0.0
+        self.retries = 0
+        self.errors: Counter[str] = Counter()
+
+    def record(self, ttft_ms: float, total_ms: float):
+        self.count += 1
+        self.ttft_total += ttft_ms
+        self.ttft_max = max(self.ttft_max, ttft_ms)
+        self.total_sum += total_ms
+        self.total_max = max(self.total_max, total_ms)
+        self.last_ttft = ttft_ms
+        self.last_total = total_ms
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "count": self.count,
+            "ttft_avg_ms": round(self.ttft_total / self.count, 1) if self.count else 0.0,
+            "ttft_max_ms": round(self.ttft_max, 1),
+            "total_avg_ms": round(self.total_sum / self.count, 1) if self.count else 0.0,
+            "total_max_ms": round(self.total_max, 1),
+            "last_ttft_ms": round(self.last_ttft, 1),
+            "last_total_ms": round(self.last_total, 1),
+            "retries": self.retries,
+            "errors": dict(self.errors),
+        }
+
+
+class LLMClient:
+    """Cliente de chat (formato OpenAI) compartido por los cogs de IA.
+
+    Cada llamada pasa por la cola de ``RateLimitScheduler`` y tiene un plazo total
+    (``deadline``) que empieza a contar al conseguir turno y cubre intentos y esperas. Los
+    errores transitorios se reintentan con espera exponencial con jitter; los 401/4xx no.
+    Tras varios fallos seguidos el circuito se abre y las llamadas fallan al instante en
+    lugar de agotar el plazo mientras la API está caída.
+    """
+
+    def __init__(self, http: HTTPClient, limiter: RateLimitScheduler, api_key: str | None,
+                 api_url: str = GROQ_API_URL, model: str = DEFAULT_MODEL):
+        self.http = http
+        self.limiter = limiter
+        self.api_key = api_key
+        self.api_url = api_url
+        self.model = model
+        self.breaker = CircuitBreaker()
+        self.latency = LLMStats()
+
+    def _payload(self, messages: list[dict], max_tokens: int, temperature: float, top_p: float,
+                 stream: bool) -> dict:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": top_p,
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+
+    def _fail(self, error: LLMError, kind: str) -> LLMError:
+        self.latency.errors[kind] += 1
+        return error
+
+    @contextlib.asynccontextmanager
+    async def _response(self, payload: dict, user_id: int, deadline: float,
+                        on_wait: Callable[[int], Awaitable[None]] | None) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Respuesta 200 de la API tras los reintentos necesarios"""
+        if not self.api_key:
+            raise self._fail(LLMAuthError("API key no configurada"), "auth")
+        self.breaker.before_call()
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        cost = estimate_tokens(payload)
+        streaming = bool(payload.get("stream"))
+        expires: float | None = None
+        attempt = throttled = 0
+        delivered = False
+        try:
+            while True:
+                async with self.limiter.turn(user_id, cost, retry=attempt + throttled > 0, on_wait=on_wait) as turn:
+                    now = time.monotonic()
+                    if expires is None:
+                        expires = now + deadline
+                    remaining = expires - now
+                    if remaining <= 0:
+                        raise self._fail(LLMTimeout("plazo agotado"), "timeout")
+                    # El plazo se reparte entre los intentos que quedan
+                    per_attempt = remaining / (MAX_RETRIES - attempt + 1)
+                    if streaming:
+                        # Tras el primer fragmento no hay reintento: el resto del plazo es para leer
+                        timeout = aiohttp.ClientTimeout(total=remaining, sock_connect=per_attempt, sock_read=per_attempt)
+                    else:
+                        timeout = aiohttp.ClientTimeout(total=per_attempt)
+                    error: LLMError | None = None
+                    try:
+                        async with self.http.post(self.api_url, headers=headers, json=payload, timeout=timeout) as response:
+                            turn.observe(response.status, response.headers)
+                            if response.status == 200:
+                                delivered = True
+                                yield response
+                                self.breaker.success()
+                                return
+                            detail = await response.text()
+                            print(f"[DEBUG] Error {response.status}: {detail[:300]}")
+                            if response.status in (401, 403):
+                                # La API responde: no es una caída
+                                self.breaker.success()
+                                raise self._fail(LLMAuthError(detail, response.status), "auth")
+                            if response.status == 429:
+                                if throttled < RATE_LIMIT_RETRIES:
+                                    throttled += 1
+                                    self.latency.retries += 1
+                                    continue
+                                self.breaker.success()
+                                raise self._fail(LLMError(detail, 429), "rate_limit")
+                            if response.status not in RETRYABLE_STATUS:
+                                self.breaker.success()
+                                raise self._fail(LLMError(detail, response.status), "http")
+                            error = self._fail(LLMError(detail, response.status), "server")
+                    except asyncio.TimeoutError:
+                        if delivered:
+                            raise
+                        error = self._fail(LLMTimeout("la API tardó demasiado"), "timeout")
+                    except aiohttp.ClientError as e:
+                        if delivered:
+                            raise
+                        error = self._fail(LLMError(str(e)), "connection")
+
+                # Error transitorio: cuenta para el circuito y se reintenta si queda plazo
+                self.breaker.failure()
+                if self.breaker.state != "closed" or attempt >= MAX_RETRIES:
+                    raise error
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                if time.monotonic() + delay >= expires:
+                    raise error
+                attempt += 1
+                self.latency.retries += 1
+                print(f"[IA] {error.detail[:80]!r}: reintento {attempt}/{MAX_RETRIES} en {delay:.1f}s")
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            if delivered and isinstance(e, (asyncio.TimeoutError, aiohttp.ClientError)):
+                # Cortada a mitad de respuesta
+                self.breaker.failure()
+                self.latency.errors["timeout" if isinstance(e, asyncio.TimeoutError) else "connection"] += 1
+            else:
+                self.breaker.release()
+            raise
+
+    async def complete(self, messages: list[dict], *, user_id: int, max_tokens: int, deadline: float,
+                       temperature: float = 0.7, top_p: float = 0.9,
+                       on_wait: Callable[[int], Awaitable[None]] | None = None) -> str:
+        """Respuesta completa ("" si la API no devolvió texto)"""
+        payload = self._payload(messages, max_tokens, temperature, top_p, stream=False)
+        started = time.perf_counter()
+        try:
+            async with self._response(payload, user_id, deadline, on_wait) as response:
+                result = await response.json()
+        except asyncio.TimeoutError:
+            raise LLMTimeout("la API tardó demasiado") from None
+        except aiohttp.ClientError as e:
+            raise LLMError(str(e)) from None
+        choices = result.get("choices") or []
+        text = ((choices[0].get("message") or {}).get("content") or "").strip() if choices else ""
+        if text:
+            # Sin streaming el primer token llega con la respuesta completa
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.latency.record(elapsed_ms, elapsed_ms)
+        return text
+
+    async def stream(self, messages: list[dict], *, user_id: int, max_tokens: int, deadline: float,
+                     temperature: float = 0.7, top_p: float = 0.9,
+                     on_wait: Callable[[int], Awaitable[None]] | None = None) -> AsyncIterator[str]:
+        """Genera los fragmentos de la respuesta a medida que llegan (eventos SSE). Si la
+        respuesta se corta a medias lanza LLMError/LLMTimeout tras los fragmentos ya dados."""
+        payload = self._payload(messages, max_tokens, temperature, top_p, stream=True)
+        started = time.perf_counter()
+        first_token: float | None = None
+        try:
+            async with self._response(payload, user_id, deadline, on_wait) as response:
+                # Cada evento es una línea "data: {...}"; el último es "data: [DONE]"
+                async for raw in response.content:
+                    line = raw.decode("utf-8").strip()
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    if chunk.get("error"):
+                        self.latency.errors["stream"] += 1
+                        raise LLMError(str(chunk["error"]))
+                    choices = chunk.get("choices") or []
+                    delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if not delta:
+                        continue
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    yield delta
+                else:
+                    self.latency.errors["stream"] += 1
+                    raise LLMError("respuesta incompleta")
+        except asyncio.TimeoutError:
+            raise LLMTimeout("la API tardó demasiado") from None
+        except aiohttp.ClientError as e:
+            raise LLMError(str(e)) from None
+        if first_token is not None:
+            total_ms = (time.perf_counter() - started) * 1000
+            ttft_ms = (first_token - started) * 1000
+            self.latency.record(ttft_ms, total_ms)
+            print(f"[IA] Primer token en {ttft_ms:.0f} ms, respuesta completa en {total_ms:.0f} ms")
+
+    def stats(self) -> dict[str, Any]:
+        return {**self.latency.as_dict(), "circuit": self.breaker.state, "circuit_opened": self.breaker.opened}
@@ -0,0 +1,169 @@
+import asyncio
+import os
+import unicodedata
+import urllib.parse
+from typing import Awaitable, Callable
+
+import aiohttp
+
+from utils.http import HTTPClient
+
+# Tiempo máximo total de una búsqueda de letras y de cada petición individual (segundos)
+LYRICS_DEADLINE = float(os.environ.get("LYRICS_DEADLINE", "8"))
+LYRICS_REQUEST_TIMEOUT = float(os.environ.get("LYRICS_REQUEST_TIMEOUT", "4"))
+
+
+def unaccent(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+
+class LyricsResult:
+    __slots__ = ("title", "text", "provider")
+
+    def __init__(self, title: str, text: str, provider: str):
+        self.title = title
+        self.text = text
+        self.provider = provider
+
+
+def _answered(resp: aiohttp.ClientResponse) -> bool:
+    """True si hay que leer la letra; False si el proveedor dice que no la tiene (404).
+    Cualquier otro estado (429, 5xx...) es un fallo, no una respuesta, y se lanza."""
+    if resp.status == 404:
+        return False
+    if resp.status != 200:
+        raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status,
+                                          message=resp.reason or "", headers=resp.headers)
+    return True
+
+
+Attempt = tuple[str, Callable[[HTTPClient, aiohttp.ClientTimeout], Awaitable["LyricsResult | None"]]]
+
+
+def _ovh(artist: str, title: str) -> Attempt:
+    a_enc = urllib.parse.quote(artist)
+    t_enc = urllib.parse.quote(title)
+    url = f"https://api.lyrics.ovh/v1/{a_enc}/{t_enc}" if artist else f"https://api.lyrics.ovh/v1//{t_enc}"
+
+    async def run(http: HTTPClient, timeout: aiohttp.ClientTimeout) -> LyricsResult | None:
+        async with http.get(url, timeout=timeout) as resp:
+            if not _answered(resp):
+                return None
+            data = await resp.json()
+            text = data.get("lyrics")
+            return LyricsResult(title, text, "lyrics.ovh") if text else None
+
+    return url, run
+
+
+def _some_random_api(qtitle: str) -> Attempt:
+    url = f"https://some-random-api.com/lyrics?title={urllib.parse.quote(qtitle)}"
+
+    async def run(http: HTTPClient, timeout: aiohttp.ClientTimeout) -> LyricsResult | None:
+        async with http.get(url, timeout=timeout) as resp:
+            if not _answered(resp):
+                return None
+            data = await resp.json()
+            text = data.get("lyrics")
+            return LyricsResult(data.get("title", qtitle), text, "some-random-api") if text else None
+
+    return url, run
+
+
+def _lrclib(artist: str, title: str) -> Attempt:
+    an, tn = unaccent(artist), unaccent(title)
+    url = f"https://lrclib.net/api/search?track_name={urllib.parse.quote(tn)}&artist_name={urllib.parse.quote(an)}&limit=1"
+
+    async def run(http: HTTPClient, timeout: aiohttp.ClientTimeout) -> LyricsResult | None:
+        async with http.get(url, timeout=timeout) as resp:
+            if not _answered(resp):
+                return None
+            arr = await resp.json()
+            if not isinstance(arr, list) or not arr:
+                return None
+            item = arr[0]
+            text = item.get("plainLyrics") or item.get("syncedLyrics")
+            return LyricsResult(item.get("trackName", title), text, "lrclib") if text else None
+
+    return url, run
+
+
+class LyricsEngine:
+    """Consulta los proveedores de letras en paralelo con un plazo global.
+
+    Cada intento tiene un rango (el orden de la antigua cascada: lyrics.ovh, some-random-api
+    y LRCLib). Se acepta el acierto de menor rango en cuanto todos los intentos anteriores
+    han terminado sin éxito; al vencer el plazo se devuelve el mejor acierto disponible.
+
+    ``find`` devuelve también si un fallo es definitivo (todos los proveedores respondieron
+    200 sin letra o 404, sin errores ni plazo vencido), para poder guardarlo en caché con seguridad.
+    """
+
+    def __init__(self, deadline: float = LYRICS_DEADLINE, request_timeout: float = LYRICS_REQUEST_TIMEOUT):
+        self.deadline = deadline
+        self.timeout = aiohttp.ClientTimeout(total=request_timeout)
+
+    def plan(self, candidates: list[tuple[str, str]], titles: list[str]) -> list[tuple[str, Attempt]]:
+        """Lista ordenada (proveedor, intento) sin URLs repetidas"""
+        attempts: list[tuple[str, Attempt]] = []
+        for artist, title in candidates:
+            for an, tn in [(artist, title), (unaccent(artist), unaccent(title))]:
+                attempts.append(("lyrics.ovh", _ovh(an, tn)))
+        for qtitle in titles:
+            attempts.append(("some-random-api", _some_random_api(qtitle)))
+        for artist, title in candidates:
+            attempts.append(("lrclib", _lrclib(artist, title)))
+        seen: set[str] = set()
+        unique = []
+        for provider, (url, run) in attempts:
+            if url not in seen:
+                seen.add(url)
+                unique.append((provider, (url, run)))
+        return unique
+
+    async def _run(self, http: HTTPClient, attempt: Attempt) -> tuple[LyricsResult | None, bool]:
+        # La concurrencia por proveedor la limita el presupuesto por host de HTTPClient
+        _, run = attempt
+        try:
+            return await run(http, self.timeout), True
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return None, False
+
+    async def find(self, http: HTTPClient, candidates: list[tuple[str, str]],
+                   titles: list[str]) -> tuple[LyricsResult | None, bool]:
+        plan = self.plan(candidates, titles)
+        if not plan:
+            return None, True
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        tasks = {asyncio.create_task(self._run(http, attempt)): rank for rank, (_, attempt) in enumerate(plan)}
+        finished: set[int] = set()
+        hits: dict[int, LyricsResult] = {}
+        failed = False
+        pending = set(tasks)
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    rank = tasks[t]
+                    finished.add(rank)
+                    result, ok = t.result()
+                    failed = failed or not ok
+                    if result:
+                        hits[rank] = result
+                if hits:
+                    best = min(hits)
+                    if all(r in finished for r in range(best)):
+                        return hits[best], True
+            if hits:
+                return hits[min(hits)], True
+            return None, not pending and not failed
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
@@ -0,0 +1,106 @@
+import math
+import time
+from typing import Any
+
+# Fallos seguidos (sin respuesta a /v4/stats) para dar un nodo por caído
+NODE_MAX_FAILURES = 3
+# Frames de audio que envía un reproductor por minuto (50 por segundo)
+FRAMES_PER_MINUTE = 3000
+MAX_FRAMES = 2 * FRAMES_PER_MINUTE
+
+
+class NodeHealth:
+    """Última carga conocida de un nodo de Lavalink y su puntuación (menor es mejor)"""
+
+    __slots__ = ("players", "playing", "system_load", "deficit", "nulled", "ping_ms", "failures", "updated")
+
+    def __init__(self):
+        self.players = 0
+        self.playing = 0
+        self.system_load = 0.0
+        self.deficit = 0
+        self.nulled = 0
+        self.ping_ms = 0.0
+        self.failures = 0
+        self.updated = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return self.failures < NODE_MAX_FAILURES
+
+    def score(self, local_players: int = 0) -> float:
+        """``local_players``: reproductores que este bot ya tiene en el nodo, por si las
+        estadísticas aún no los reflejan"""
+        if not self.healthy:
+            return math.inf
+        # Penalizaciones al estilo de los clientes de Lavalink: crecen de forma exponencial
+        # con la CPU y con los frames perdidos, que es cuando el audio empieza a cortarse
+        # (se acotan los frames para no desbordar el exponente)
+        cpu = 1.05 ** (100 * self.system_load) * 10 - 10
+        deficit = 1.03 ** (500 * min(self.deficit, MAX_FRAMES) / FRAMES_PER_MINUTE) * 600 - 600 if self.deficit > 0 else 0.0
+        nulled = (1.03 ** (500 * min(self.nulled, MAX_FRAMES) / FRAMES_PER_MINUTE) * 300 - 300) * 2 if self.nulled > 0 else 0.0
+        return max(self.playing, local_players) + cpu + deficit + nulled + self.ping_ms / 10
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "players": self.players,
+            "playing": self.playing,
+            "system_load": round(self.system_load, 3),
+            "deficit": self.deficit,
+            "nulled": self.nulled,
+            "ping_ms": round(self.ping_ms, 1),
+            "failures": self.failures,
+            "score": round(self.score(), 2) if self.healthy else None,
+        }
+
+
+class NodeBalancer:
+    """Elige el nodo de Lavalink con menos carga para los reproductores nuevos.
+
+    Las estadísticas las aporta quien sondea los nodos (``update``/``fail``); un nodo sin datos
+    puntúa como vacío, así que los nodos recién conectados reciben tráfico enseguida.
+    """
+
+    def __init__(self):
+        self.health: dict[str, NodeHealth] = {}
+
+    def _get(self, identifier: str) -> NodeHealth:
+        health = self.health.get(identifier)
+        if health is None:
+            health = self.health[identifier] = NodeHealth()
+        return health
+
+    def update(self, identifier: str, stats: Any, ping: float):
+        """Guarda un ``StatsResponsePayload`` de wavelink y el tiempo que tardó en llegar (segundos)"""
+        health = self._get(identifier)
+        health.players = stats.players
+        health.playing = stats.playing
+        health.system_load = stats.cpu.system_load
+        health.deficit = stats.frames.deficit if stats.frames else 0
+        health.nulled = stats.frames.nulled if stats.frames else 0
+        health.ping_ms = ping * 1000
+        health.failures = 0
+        health.updated = time.monotonic()
+
+    def fail(self, identifier: str):
+        self._get(identifier).failures += 1
+
+    def forget(self, identifier: str):
+        self.health.pop(identifier, None)
+
+    def healthy(self, identifier: str) -> bool:
+        return self._get(identifier).healthy
+
+    def best(self, candidates: dict[str, Any], exclude: set[str] | None = None) -> Any | None:
+        """El candidato sano (identificador -> nodo) con mejor puntuación, o None"""
+        best, best_score = None, math.inf
+        for identifier, node in candidates.items():
+            if exclude and identifier in exclude:
+                continue
+            score = self._get(identifier).score(len(getattr(node, "players", ())))
+            if score < best_score:
+                best, best_score = node, score
+        return best
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        return {identifier: h.as_dict() for identifier, h in self.health.items()}
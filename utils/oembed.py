@@ -0,0 +1,57 @@
+import asyncio
+import urllib.parse
+from typing import Any
+
+from utils.cache import PersistentLRU
+from utils.http import HTTPClient
+
+OEMBED_URL = "https://www.youtube.com/oembed"
+OEMBED_TTL = 6 * 3600
+OEMBED_NEGATIVE_TTL = 300
+# Estados con los que YouTube indica que el video no existe o no es público
+OEMBED_MISSING_STATUS = {401, 403, 404}
+OEMBED_MAX_ENTRIES = 2000
+
+
+class OEmbedService:
+    """Metadatos de videos de YouTube (título y autor) vía oEmbed, memorizados por ID.
+
+    Las peticiones simultáneas para el mismo ID comparten una sola descarga.
+    """
+
+    def __init__(self, http: HTTPClient, ttl: float = OEMBED_TTL, max_entries: int = OEMBED_MAX_ENTRIES):
+        self.http = http
+        self._cache = PersistentLRU(None, max_entries, ttl)
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def _download(self, video_id: str) -> dict[str, Any] | None:
+        watch = f"https://www.youtube.com/watch?v={video_id}"
+        url = f"{OEMBED_URL}?url={urllib.parse.quote(watch)}&format=json"
+        # Los fallos de red se propagan: no se confunden con un video inexistente ni se guardan
+        async with self.http.get(url) as r:
+            if r.status in OEMBED_MISSING_STATUS:
+                # Video privado o inexistente: se recuerda poco tiempo
+                self._cache.put(video_id, None, ttl=OEMBED_NEGATIVE_TTL)
+                return None
+            # 429, 5xx...: fallo pasajero, se lanza sin guardarlo
+            r.raise_for_status()
+            data = await r.json()
+        meta = {"title": data.get("title", ""), "author": data.get("author_name", "")}
+        self._cache.put(video_id, meta)
+        return meta
+
+    async def fetch(self, video_id: str) -> dict[str, Any] | None:
+        """None si el video no existe o es privado; los fallos de red y de YouTube se propagan"""
+        found, meta = self._cache.lookup(video_id)
+        if found:
+            return meta
+        task = self._inflight.get(video_id)
+        if task is None:
+            task = asyncio.create_task(self._download(video_id))
+            self._inflight[video_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(video_id, None))
+        # shield: si quien espera se cancela, la descarga sigue para los demás
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, Any]:
+        return {**self._cache.stats(), "in_flight": len(self._inflight)}
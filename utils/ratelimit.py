@@ -0,0 +1,309 @@
+import asyncio
+import contextlib
+import os
+import re
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Mapping
+
+# Concurrencia máxima hacia la API (además del presupuesto por host de HTTPClient)
+MAX_CONCURRENCY = 4
+# Espera máxima en cola antes de rendirse (segundos); p. ej. con la cuota diaria agotada
+MAX_QUEUE_WAIT = float(os.environ.get("GROQ_MAX_QUEUE_WAIT", "90"))
+# Espera tras un 429 sin cabecera retry-after (segundos)
+DEFAULT_RETRY_AFTER = 2.0
+# Reintentos tras un 429 antes de dar la petición por perdida
+RATE_LIMIT_RETRIES = 3
+# Estimación de tokens sin tokenizador (suficiente para repartir el cupo)
+CHARS_PER_TOKEN = 4
+# Ventana supuesta cuando las cabeceras no dicen cuándo se repone el cupo (segundos)
+DEFAULT_WINDOW = 60.0
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str | None) -> float | None:
+    """Convierte "2m59.56s", "7.66s", "450ms" o "12" a segundos"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNITS[unit] for n, unit in parts)
+
+
+def text_tokens(text: str) -> int:
+    """Tokens aproximados de un texto (~4 caracteres por token, sin tokenizador)"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_tokens(payload: Mapping[str, Any]) -> int:
+    """Tokens que gastará una petición de chat: el texto enviado más la respuesta máxima"""
+    sent = sum(text_tokens(m.get("content") or "") for m in payload.get("messages", ()))
+    return sent + int(payload.get("max_tokens") or 0)
+
+
+class RateLimited(Exception):
+    """El cupo no se repone antes de ``MAX_QUEUE_WAIT``"""
+
+    def __init__(self, retry_in: float):
+        super().__init__(f"cupo agotado durante {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """Cupo de la API (peticiones o tokens) sincronizado con las cabeceras de cada respuesta.
+
+    Mientras no haya cabeceras el cupo se considera ilimitado. Entre respuestas se repone
+    de forma lineal hasta ``limit`` al ritmo que marcan ``remaining`` y ``reset``.
+    """
+
+    __slots__ = ("limit", "level", "rate", "updated")
+
+    def __init__(self):
+        self.limit: float | None = None
+        self.level = 0.0
+        self.rate = 0.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if self.limit is not None:
+            self.level = min(self.limit, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos hasta que haya ``amount`` disponible (0 si ya lo hay)"""
+        if self.limit is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.limit)  # una petición enorme no debe esperar para siempre
+        if self.level >= amount:
+            return 0.0
+        if self.rate <= 0:
+            return DEFAULT_WINDOW
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        if self.limit is not None:
+            self._refill(now)
+            self.level -= min(amount, self.limit)
+
+    def sync(self, limit: float, remaining: float, reset: float | None, now: float):
+        self.limit = limit
+        self.level = remaining
+        self.updated = now
+        window = reset if reset and reset > 0 else DEFAULT_WINDOW
+        # Lo gastado vuelve a estar disponible cuando se cumple ``reset``
+        self.rate = max(limit - remaining, 1.0) / window
+
+    def as_dict(self) -> dict[str, Any]:
+        if self.limit is None:
+            return {"limit": None}
+        self._refill(time.monotonic())
+        return {"limit": self.limit, "available": round(self.level, 1), "per_s": round(self.rate, 3)}
+
+
+class _Waiter:
+    __slots__ = ("user", "tokens", "future", "enqueued")
+
+    def __init__(self, user: int, tokens: float, future: asyncio.Future):
+        self.user = user
+        self.tokens = tokens
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class Turn:
+    """Permiso para hacer una petición; ``observe`` aprende de su respuesta"""
+
+    __slots__ = ("limiter",)
+
+    def __init__(self, limiter: "RateLimitScheduler"):
+        self.limiter = limiter
+
+    def observe(self, status: int, headers: Mapping[str, str]) -> float | None:
+        """Actualiza el cupo con las cabeceras ``x-ratelimit-*``. Ante un 429 pausa las
+        peticiones lo que diga ``retry-after`` y devuelve esa espera (si no, None)."""
+        return self.limiter.observe(status, headers)
+
+
+class RateLimitScheduler:
+    """Cola delante de una API con límites por petición y por token (Groq/OpenAI).
+
+    - Dos cupos (peticiones y tokens) que se sincronizan con las cabeceras de cada respuesta.
+    - Las peticiones en espera se atienden por turnos entre usuarios: uno que manda muchas
+      no retrasa a los demás más que una petición por ronda.
+    - Tras un 429 se espera ``retry-after`` y se reintenta en lugar de descartar la petición.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_wait: float = MAX_QUEUE_WAIT):
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.requests = TokenBucket()
+        self.tokens = TokenBucket()
+        self.blocked_until = 0.0
+        self.active = 0
+        self._queues: dict[int, deque[_Waiter]] = {}
+        self._order: deque[int] = deque()  # usuarios con peticiones en espera, por turno
+        self._wakeup: asyncio.TimerHandle | None = None
+        self.granted = 0
+        self.queued = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+
+    @property
+    def depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _ahead(self, waiter: _Waiter) -> int:
+        """Peticiones que se atenderán antes (aprox.: una por usuario y ronda)"""
+        queue = self._queues.get(waiter.user)
+        if not queue or waiter not in queue:
+            return 0
+        rounds = queue.index(waiter) + 1
+        others = sum(min(len(q), rounds) for user, q in self._queues.items() if user != waiter.user)
+        return others + rounds - 1
+
+    def _schedule_wakeup(self, delay: float):
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._wakeup is not None and not self._wakeup.cancelled() and self._wakeup.when() <= when:
+            return
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = loop.call_at(when, self._pump)
+
+    def _pump(self):
+        """Concede turnos mientras haya cupo y concurrencia libre"""
+        self._wakeup = None
+        while self._order and self.active < self.max_concurrency:
+            now = time.monotonic()
+            user = self._order[0]
+            queue = self._queues[user]
+            waiter = queue[0]
+            if waiter.future.done():  # cancelada mientras esperaba
+                self._pop(user)
+                continue
+            delay = max(self.blocked_until - now, self.requests.wait_time(1, now),
+                        self.tokens.wait_time(waiter.tokens, now))
+            if delay > 0:
+                if now - waiter.enqueued + delay > self.max_wait:
+                    self._pop(user)
+                    self.rejected += 1
+                    waiter.future.set_exception(RateLimited(delay))
+                    continue
+                self._schedule_wakeup(delay)
+                return
+            self._pop(user)
+            self.requests.take(1, now)
+            self.tokens.take(waiter.tokens, now)
+            self.active += 1
+            self.granted += 1
+            self.wait_total += now - waiter.enqueued
+            waiter.future.set_result(None)
+
+    def _pop(self, user: int):
+        queue = self._queues[user]
+        queue.popleft()
+        self._order.popleft()
+        if queue:
+            self._order.append(user)  # siguiente ronda
+        else:
+            del self._queues[user]
+
+    def _enqueue(self, waiter: _Waiter, retry: bool):
+        queue = self._queues.get(waiter.user)
+        if queue is None:
+            queue = self._queues[waiter.user] = deque()
+        if retry:
+            # Un reintento no vuelve al final: ya esperó su turno
+            queue.appendleft(waiter)
+            if waiter.user in self._order:
+                self._order.remove(waiter.user)
+            self._order.appendleft(waiter.user)
+        else:
+            queue.append(waiter)
+            if waiter.user not in self._order:
+                self._order.append(waiter.user)
+
+    def _discard(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.user)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.user]
+                self._order.remove(waiter.user)
+
+    @contextlib.asynccontextmanager
+    async def turn(self, user_id: int, tokens: float = 0, *, retry: bool = False,
+                   on_wait: Callable[[int], Awaitable[None]] | None = None) -> AsyncIterator[Turn]:
+        """Espera turno para una petición que gastará unos ``tokens``. Si hay que esperar se
+        llama una vez a ``on_wait`` con las peticiones que van por delante."""
+        waiter = _Waiter(user_id, tokens, asyncio.get_running_loop().create_future())
+        self._enqueue(waiter, retry)
+        self._pump()
+        if not waiter.future.done():
+            self.queued += 1
+            try:
+                if on_wait is not None:
+                    try:
+                        await on_wait(self._ahead(waiter))
+                    except Exception as e:
+                        print(f"[WARNING] Aviso de cola fallido: {e}")
+                await waiter.future
+            except BaseException:
+                # También si se cancela durante on_wait: no puede quedar en la cola ni con el turno
+                if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                    # Se concedió justo cuando se cancelaba: se devuelve el turno
+                    self.active -= 1
+                    self._pump()
+                else:
+                    self._discard(waiter)
+                raise
+        else:
+            waiter.future.result()  # RateLimited si se rechazó en el acto
+        try:
+            yield Turn(self)
+        finally:
+            self.active -= 1
+            self._pump()
+
+    def observe(self, status: int, headers: Mapping[str, str]) -> float | None:
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = headers.get(f"x-ratelimit-limit-{kind}")
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if limit is None or remaining is None:
+                continue
+            try:
+                bucket.sync(float(limit), float(remaining), parse_duration(headers.get(f"x-ratelimit-reset-{kind}")), now)
+            except ValueError:
+                continue
+        if status != 429:
+            return None
+        self.throttled += 1
+        retry_after = parse_duration(headers.get("retry-after")) or DEFAULT_RETRY_AFTER
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+        return retry_after
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "waiting": self.depth,
+            "users_waiting": len(self._queues),
+            "active": self.active,
+            "granted": self.granted,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.wait_total / self.granted * 1000, 1) if self.granted else 0.0,
+            "blocked_for_s": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+            "requests": self.requests.as_dict(),
+            "tokens": self.tokens.as_dict(),
+        }
@@ -0,0 +1,188 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+# Límites del retraso de cobertura (segundos)
+HEDGE_MIN_DELAY = 0.15
+HEDGE_MAX_DELAY = 3.0
+# Retraso usado mientras un proveedor no tiene suficientes muestras
+HEDGE_DEFAULT_DELAY = 0.8
+MIN_SAMPLES = 5
+
+SearchFn = Callable[[str, str], Awaitable[list]]
+
+
+class SearchError(Exception):
+    """Ningún proveedor pudo responder: el resultado vacío no es definitivo"""
+
+
+class ProviderStats:
+    """Latencia (media móvil y desviación, como el RTO de TCP) y tasa de aciertos de un proveedor"""
+
+    __slots__ = ("samples", "hits", "cut", "srtt", "rttvar", "hit_rate")
+
+    def __init__(self):
+        self.samples = 0
+        self.hits = 0
+        self.cut = 0  # búsquedas canceladas antes de responder
+        self.srtt = 0.0
+        self.rttvar = 0.0
+        self.hit_rate = 1.0
+
+    def _latency(self, latency: float):
+        if self.samples == 0:
+            self.srtt = latency
+            self.rttvar = latency / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - latency)
+            self.srtt = 0.875 * self.srtt + 0.125 * latency
+        self.samples += 1
+
+    def record(self, latency: float, hit: bool):
+        self._latency(latency)
+        self.hits += int(hit)
+        self.hit_rate = 0.9 * self.hit_rate + 0.1 * (1.0 if hit else 0.0)
+
+    def record_cut(self, elapsed: float, late: bool):
+        """Búsqueda cancelada antes de responder: solo se sabe que iba a tardar al menos
+        ``elapsed``. Cuenta como muestra (si supera la media, con ese valor) para que un
+        proveedor lento no quede medido solo por sus respuestas rápidas; si ya había pasado
+        su retraso de cobertura (``late``) cuenta además como respuesta que no llegó a tiempo."""
+        self.cut += 1
+        if self.samples == 0 or elapsed > self.srtt:
+            self._latency(elapsed)
+        else:
+            self.samples += 1
+        if late:
+            self.hit_rate = 0.9 * self.hit_rate
+
+    def hedge_delay(self) -> float:
+        """Tiempo que se espera a este proveedor antes de lanzar el siguiente"""
+        if self.samples < MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        # Un proveedor que casi nunca acierta no merece que lo esperemos
+        delay = (self.srtt + 2 * self.rttvar) * max(self.hit_rate, 0.1)
+        return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, delay))
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "hits": self.hits,
+            "cut": self.cut,
+            "latency_ms": round(self.srtt * 1000, 1),
+            "hit_rate": round(self.hit_rate, 3),
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+        }
+
+
+class HedgedResolver:
+    """Consulta varios proveedores de búsqueda por orden de prioridad.
+
+    Modos:
+    - ``sequential``: uno tras otro, como antes.
+    - ``hedged``: si un proveedor tarda más que su retraso de cobertura se lanza el siguiente
+      sin cancelar el anterior.
+    - ``race``: los proveedores de ``race`` arrancan a la vez; el resto queda como respaldo.
+
+    Gana el resultado no vacío de mayor prioridad; un proveedor más prioritario solo se espera
+    mientras no haya superado su retraso de cobertura. Los demás se cancelan.
+    """
+
+    def __init__(self, providers: list[str], mode: str = "hedged", race: list[str] | None = None):
+        if mode not in {"sequential", "hedged", "race"}:
+            raise ValueError(f"Modo de resolución desconocido: {mode}")
+        self.providers = list(providers)
+        self.mode = mode
+        self.race = [p for p in (race or self.providers) if p in self.providers]
+        self.stats: dict[str, ProviderStats] = {p: ProviderStats() for p in self.providers}
+
+    async def _timed(self, search: SearchFn, provider: str, query: str) -> list | None:
+        """Devuelve None si el proveedor falló, para distinguirlo de una búsqueda sin resultados"""
+        stats = self.stats[provider]
+        start, delay = time.monotonic(), stats.hedge_delay()
+        try:
+            result = await search(provider, query)
+        except asyncio.CancelledError:
+            elapsed = time.monotonic() - start
+            stats.record_cut(elapsed, elapsed >= delay)
+            raise
+        except Exception as e:
+            print(f"[WARNING] Proveedor {provider} falló buscando '{query}': {e}")
+            result = None
+        stats.record(time.monotonic() - start, bool(result))
+        return result
+
+    async def resolve(self, query: str, search: SearchFn) -> list:
+        """Lanza SearchError si todos los proveedores fallaron en lugar de responder"""
+        if self.mode == "sequential":
+            answered = False
+            for prov in self.providers:
+                result = await self._timed(search, prov, query)
+                if result:
+                    return result
+                answered = answered or result is not None
+            if not answered:
+                raise SearchError(f"ningún proveedor respondió para '{query}'")
+            return []
+
+        loop = asyncio.get_running_loop()
+        order = {p: i for i, p in enumerate(self.providers)}
+        if self.mode == "race":
+            first = sorted(self.race, key=order.__getitem__) or self.providers[:1]
+            backlog = [p for p in self.providers if p not in first]
+        else:
+            first, backlog = self.providers[:1], self.providers[1:]
+
+        tasks: dict[asyncio.Task, str] = {}
+        deadline: dict[str, float] = {}  # hasta cuándo se prefiere esperar a cada proveedor
+        results: dict[str, list] = {}
+        finished: set[str] = set()
+        answered = False  # algún proveedor respondió, aunque fuera sin resultados
+
+        def launch(prov: str):
+            now = loop.time()
+            deadline[prov] = now + self.stats[prov].hedge_delay()
+            tasks[asyncio.create_task(self._timed(search, prov, query))] = prov
+
+        for prov in first:
+            launch(prov)
+        try:
+            while True:
+                now = loop.time()
+                # ¿Hay un ganador? El mejor resultado cuyos superiores ya terminaron o van tarde
+                for prov in sorted(results, key=order.__getitem__):
+                    higher = self.providers[: order[prov]]
+                    if all(h in finished or h not in deadline or deadline[h] <= now for h in higher):
+                        return results[prov]
+                    break
+
+                pending = [t for t in tasks if not t.done()]
+                # Se lanza el siguiente proveedor cuando todos los activos van tarde o ya terminaron
+                if backlog and all(deadline[tasks[t]] <= now for t in pending):
+                    launch(backlog.pop(0))
+                    continue
+                if not pending:
+                    if backlog:
+                        launch(backlog.pop(0))
+                        continue
+                    if not answered:
+                        raise SearchError(f"ningún proveedor respondió para '{query}'")
+                    return []
+
+                upcoming = [deadline[tasks[t]] for t in pending if deadline[tasks[t]] > now]
+                timeout = (min(upcoming) - now) if upcoming else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    prov = tasks[t]
+                    finished.add(prov)
+                    result = t.result()
+                    answered = answered or result is not None
+                    if result:
+                        results[prov] = result
+        finally:
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+    def summary(self) -> dict[str, dict[str, Any]]:
+        return {p: s.as_dict() for p, s in self.stats.items()}
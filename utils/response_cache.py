@@ -0,0 +1,163 @@
+import hashlib
+import re
+import unicodedata
+from typing import Any
+
+from utils.cache import PersistentLRU
+
+# Firmas MinHash: NUM_PERM = BANDS * ROWS. Con 8 bandas de 4 filas, dos preguntas con
+# similitud 0.85 comparten alguna banda el ~99% de las veces y con 0.5 solo el ~40%
+# (esas se descartan luego al comparar la firma completa)
+BANDS = 8
+ROWS = 4
+NUM_PERM = BANDS * ROWS
+SHINGLE_SIZE = 3
+# Por debajo de esta longitud (ya normalizada) solo se busca la pregunta exacta
+MIN_FUZZY_LENGTH = 8
+
+_PRIME = (1 << 61) - 1
+# Coeficientes fijos: las firmas son iguales entre reinicios
+_PERMUTATIONS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _PRIME | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _PRIME)
+    for i in range(NUM_PERM)
+]
+_NON_WORD_RE = re.compile(r"[^\w]+")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Minúsculas, sin tildes ni signos y con un solo espacio: "¿Quién eres?" -> "quien eres" """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_NON_WORD_RE.sub(" ", text).split())
+
+
+def minhash(text: str) -> tuple[int, ...]:
+    """Firma MinHash de los n-gramas de caracteres de ``text``"""
+    padded = f" {text} "
+    shingles = {padded[i:i + SHINGLE_SIZE] for i in range(max(1, len(padded) - SHINGLE_SIZE + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in shingles]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimación de la similitud de Jaccard entre dos firmas"""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+class ResponseCache:
+    """Respuestas de la IA a preguntas sin contexto, reutilizables entre usuarios.
+
+    La clave es el hash de la personalidad (y del modelo) más la pregunta normalizada, así
+    que cambiar ``ai_personality.txt`` invalida todo lo anterior. Si no hay coincidencia
+    exacta se busca una pregunta casi igual con MinHash + LSH (bandas de la firma) y se
+    acepta si la similitud estimada llega a ``threshold`` y los números coinciden
+    ("cuánto es 2+2" no debe responder a "cuánto es 2+3").
+    """
+
+    def __init__(self, path: str | None, max_entries: int, ttl: float, threshold: float, namespace: str):
+        self.threshold = threshold
+        self.prefix = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:12] + ":"
+        self._store = PersistentLRU(path, max_entries, ttl)
+        self._signatures: dict[str, tuple[int, ...]] = {}
+        self._bands: dict[tuple[int, tuple[int, ...]], set[str]] = {}
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        # Lo que quedó en disco de otra personalidad ya no sirve
+        for key in self._store.keys():
+            if not key.startswith(self.prefix):
+                self._store.pop(key, None)
+        for key in self._store.keys(self.prefix):
+            self._index(key)
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def _index(self, key: str):
+        prompt = key[len(self.prefix):]
+        if len(prompt) < MIN_FUZZY_LENGTH or key in self._signatures:
+            return
+        signature = minhash(prompt)
+        self._signatures[key] = signature
+        for band in range(BANDS):
+            self._bands.setdefault((band, signature[band * ROWS:(band + 1) * ROWS]), set()).add(key)
+
+    def _unindex(self, key: str):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band in range(BANDS):
+            bucket_key = (band, signature[band * ROWS:(band + 1) * ROWS])
+            bucket = self._bands.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._bands[bucket_key]
+
+    def _nearest(self, prompt: str) -> str | None:
+        """Clave indexada más parecida a ``prompt`` que supere el umbral"""
+        signature = minhash(prompt)
+        numbers = _NUMBER_RE.findall(prompt)
+        candidates: set[str] = set()
+        for band in range(BANDS):
+            candidates |= self._bands.get((band, signature[band * ROWS:(band + 1) * ROWS]), set())
+        best, best_score = None, self.threshold
+        for key in candidates:
+            score = similarity(signature, self._signatures[key])
+            if score >= best_score and _NUMBER_RE.findall(key[len(self.prefix):]) == numbers:
+                best, best_score = key, score
+        return best
+
+    def get(self, text: str) -> str | None:
+        prompt = normalize_prompt(text)
+        if not prompt:
+            return None
+        key = self.prefix + prompt
+        found, value = self._store.lookup(key)
+        if found:
+            self.exact_hits += 1
+            return value
+        self._unindex(key)  # caducada o expulsada por el LRU
+        if len(prompt) >= MIN_FUZZY_LENGTH:
+            while (near := self._nearest(prompt)) is not None:
+                found, value = self._store.lookup(near)
+                if found:
+                    self.near_hits += 1
+                    return value
+                self._unindex(near)
+        self.misses += 1
+        return None
+
+    def put(self, text: str, response: str):
+        prompt = normalize_prompt(text)
+        if not prompt:
+            return
+        key = self.prefix + prompt
+        self._store.put(key, response)
+        self._index(key)
+        # El LRU expulsa sin avisar: se limpia el índice cuando crece de más
+        if len(self._signatures) > 2 * self._store.max_entries:
+            alive = set(self._store.keys(self.prefix))
+            for stale in [k for k in self._signatures if k not in alive]:
+                self._unindex(stale)
+
+    def clear(self):
+        self._store.clear()
+        self._signatures.clear()
+        self._bands.clear()
+
+    async def flush(self):
+        await self._store.flush()
+
+    def stats(self) -> dict[str, Any]:
+        total = self.exact_hits + self.near_hits + self.misses
+        return {
+            "entries": len(self._store),
+            "indexed": len(self._signatures),
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": ((self.exact_hits + self.near_hits) / total) if total else 0.0,
+        }
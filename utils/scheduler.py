@@ -0,0 +1,167 @@
+import asyncio
+import inspect
+import math
+import time
+from typing import Any, Callable, Hashable
+
+# Resolución del reloj (segundos) y número de casillas de la rueda (una vuelta = 256 s)
+WHEEL_TICK = 0.25
+WHEEL_SLOTS = 1024
+# Tiempo máximo para que terminen las acciones pendientes al cerrar
+SHUTDOWN_TIMEOUT = 10.0
+
+
+class Timer:
+    __slots__ = ("key", "callback", "args", "deadline", "rounds", "slot", "flush", "cancelled")
+
+    def __init__(self, key: Hashable | None, callback: Callable, args: tuple, deadline: float, flush: bool):
+        self.key = key
+        self.callback = callback
+        self.args = args
+        self.deadline = deadline
+        self.rounds = 0
+        self.slot = 0
+        self.flush = flush
+        self.cancelled = False
+
+
+class TimerWheel:
+    """Planificador de tareas diferidas compartido por todo el bot (rueda de temporización).
+
+    Programar y cancelar cuestan O(1): cada temporizador cae en una casilla según su plazo y
+    guarda cuántas vueltas le faltan, así que los plazos largos no necesitan más niveles.
+    Una sola tarea avanza la rueda, y solo mientras haya temporizadores pendientes.
+
+    Con ``key`` un temporizador sustituye al anterior con la misma clave (p. ej. el de
+    inactividad de cada servidor). ``callback`` puede ser una función o una corrutina.
+    Al cerrar, las acciones pendientes con ``flush=True`` se ejecutan en el acto.
+    """
+
+    def __init__(self, tick: float = WHEEL_TICK, slots: int = WHEEL_SLOTS):
+        self.tick = tick
+        self._slots: list[set[Timer]] = [set() for _ in range(slots)]
+        self._keys: dict[Hashable, Timer] = {}
+        self._count = 0
+        self._cursor = 0  # último tick procesado
+        self._origin = time.monotonic()
+        self._wakeup: asyncio.Event | None = None
+        self._runner: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self._closed = False
+        self.fired = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._keys
+
+    def start(self):
+        if self._runner is None or self._runner.done():
+            self._closed = False
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.create_task(self._run())
+
+    def call_later(self, delay: float, callback: Callable, *args: Any,
+                   key: Hashable | None = None, flush: bool = True) -> Timer:
+        """Ejecuta ``callback(*args)`` dentro de ``delay`` segundos (redondeado al tick)"""
+        if self._closed:
+            raise RuntimeError("El planificador está cerrado")
+        if key is not None:
+            self.cancel(key)
+        now_tick = (time.monotonic() - self._origin) / self.tick
+        if self._count == 0:
+            # Rueda vacía: se adelanta el cursor para no recorrer las casillas del tiempo en reposo
+            self._cursor = max(self._cursor, int(now_tick))
+        ticks = max(1, math.ceil(now_tick + delay / self.tick) - self._cursor)
+        timer = Timer(key, callback, args, time.monotonic() + delay, flush)
+        timer.slot = (self._cursor + ticks) % len(self._slots)
+        timer.rounds = (ticks - 1) // len(self._slots)
+        self._slots[timer.slot].add(timer)
+        self._count += 1
+        if key is not None:
+            self._keys[key] = timer
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return timer
+
+    def cancel(self, key_or_timer: Hashable | Timer) -> bool:
+        timer = key_or_timer if isinstance(key_or_timer, Timer) else self._keys.get(key_or_timer)
+        if timer is None or timer.cancelled:
+            return False
+        self._remove(timer)
+        self.cancelled += 1
+        return True
+
+    def _remove(self, timer: Timer):
+        timer.cancelled = True
+        self._slots[timer.slot].discard(timer)
+        self._count -= 1
+        if timer.key is not None and self._keys.get(timer.key) is timer:
+            del self._keys[timer.key]
+
+    def _fire(self, timer: Timer):
+        self._remove(timer)
+        self.fired += 1
+        try:
+            result = timer.callback(*timer.args)
+        except Exception as e:
+            self.errors += 1
+            print(f"[WARNING] Tarea programada falló: {e}")
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._running.add(task)
+            task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            print(f"[WARNING] Tarea programada falló: {task.exception()}")
+
+    async def _run(self):
+        while not self._closed:
+            if self._count == 0:
+                # Nada pendiente: se duerme hasta el próximo call_later
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await asyncio.sleep(self.tick)
+            target = int((time.monotonic() - self._origin) / self.tick)
+            while self._cursor < target:
+                self._cursor += 1
+                bucket = self._slots[self._cursor % len(self._slots)]
+                for timer in list(bucket):
+                    if timer.rounds > 0:
+                        timer.rounds -= 1
+                    else:
+                        self._fire(timer)
+
+    async def close(self, timeout: float = SHUTDOWN_TIMEOUT):
+        """Detiene la rueda, ejecuta ya las acciones pendientes marcadas con ``flush`` y
+        espera (hasta ``timeout``) a las que estén en curso"""
+        self._closed = True
+        if self._runner:
+            self._runner.cancel()
+            self._runner = None
+        pending = sorted((t for bucket in self._slots for t in bucket), key=lambda t: t.deadline)
+        for timer in pending:
+            if timer.flush:
+                self._fire(timer)
+            else:
+                self._remove(timer)
+        if self._running:
+            await asyncio.wait(list(self._running), timeout=timeout)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pending": self._count,
+            "keyed": len(self._keys),
+            "running": len(self._running),
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+            "errors": self.errors,
+        }
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator
+
+import aiohttp
+
+from utils.http import HTTPClient
+
+SPOTIFY_API_BASE = os.environ.get("SPOTIFY_API_BASE", "https://api.spotify.com/v1")
+SPOTIFY_AUTH_URL = os.environ.get("SPOTIFY_AUTH_URL", "https://accounts.spotify.com/api/token")
+# Margen para renovar el token antes de que caduque (segundos)
+TOKEN_REFRESH_MARGIN = 60
+MAX_RETRIES = 3
+
+
+class SpotifyError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Spotify {status}: {message}")
+        self.status = status
+
+
+class SpotifyClient:
+    """Cliente asíncrono de metadatos de Spotify (client credentials).
+
+    Reutiliza el token hasta que caduca, usa el cliente HTTP compartido del bot (o uno
+    propio si no se le pasa) y recorre la paginación bajo demanda con generadores asíncronos.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        *,
+        http: HTTPClient | None = None,
+        api_base: str = SPOTIFY_API_BASE,
+        auth_url: str = SPOTIFY_AUTH_URL,
+    ):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_base = api_base.rstrip("/")
+        self.auth_url = auth_url
+        self._http = http or HTTPClient()
+        self._owns_http = http is None
+        self._token: str | None = None
+        self._token_expires = 0.0
+        self._token_lock = asyncio.Lock()
+
+    async def close(self):
+        if self._owns_http:
+            await self._http.close()
+
+    async def _get_token(self) -> str:
+        if self._token and time.monotonic() < self._token_expires:
+            return self._token
+        async with self._token_lock:
+            # Otra corrutina pudo renovarlo mientras esperábamos
+            if self._token and time.monotonic() < self._token_expires:
+                return self._token
+            auth = aiohttp.BasicAuth(self.client_id, self.client_secret)
+            async with self._http.post(
+                self.auth_url, data={"grant_type": "client_credentials"}, auth=auth
+            ) as r:
+                if r.status != 200:
+                    raise SpotifyError(r.status, await r.text())
+                data = await r.json()
+            self._token = data["access_token"]
+            expires_in = int(data.get("expires_in", 3600))
+            self._token_expires = time.monotonic() + max(0, expires_in - TOKEN_REFRESH_MARGIN)
+            return self._token
+
+    async def _get(self, url: str, params: dict[str, Any] | None = None) -> dict[str, Any]:
+        if not url.startswith("http"):
+            url = f"{self.api_base}/{url.lstrip('/')}"
+        for attempt in range(MAX_RETRIES):
+            token = await self._get_token()
+            headers = {"Authorization": f"Bearer {token}"}
+            async with self._http.get(url, params=params, headers=headers) as r:
+                if r.status == 200:
+                    return await r.json()
+                if r.status == 401 and attempt < MAX_RETRIES - 1:
+                    # Token revocado o caducado antes de tiempo: forzar renovación
+                    self._token = None
+                    continue
+                if r.status == 429 and attempt < MAX_RETRIES - 1:
+                    await asyncio.sleep(float(r.headers.get("Retry-After", "1")))
+                    continue
+                raise SpotifyError(r.status, await r.text())
+        raise SpotifyError(0, "demasiados reintentos")
+
+    async def _paginate(self, url: str, params: dict[str, Any]) -> AsyncIterator[dict[str, Any]]:
+        next_url: str | None = url
+        while next_url:
+            page = await self._get(next_url, params)
+            # La URL "next" ya incluye los parámetros
+            params = None
+            for item in page.get("items") or []:
+                yield item
+            next_url = page.get("next")
+
+    async def track(self, track_id: str) -> dict[str, Any]:
+        return await self._get(f"tracks/{track_id}")
+
+    async def album_tracks(self, album_id: str) -> AsyncIterator[dict[str, Any]]:
+        async for item in self._paginate(f"albums/{album_id}/tracks", {"limit": 50}):
+            yield item
+
+    async def playlist_tracks(self, playlist_id: str) -> AsyncIterator[dict[str, Any]]:
+        """Genera las pistas de una playlist (omite episodios y entradas sin pista)"""
+        params = {"limit": 100, "fields": "items(track(id,name,type,artists(name))),next"}
+        async for item in self._paginate(f"playlists/{playlist_id}/tracks", params):
+            tr = item.get("track")
+            if tr and tr.get("type", "track") == "track":
+                yield tr